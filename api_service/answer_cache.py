@@ -0,0 +1,117 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import faiss
+import numpy as np
+
+logger = logging.getLogger("answer_cache")
+logger.setLevel(logging.INFO)
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float, max_entries: int, hnsw_m: int = 32, search_k: int = 8):
+        self.threshold = float(threshold)
+        self.max_entries = max(1, int(max_entries))
+        self.hnsw_m = int(hnsw_m)
+        self.search_k = max(1, int(search_k))
+        self.index_version: Optional[str] = None
+        self.dim: Optional[int] = None
+        self.index = None
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._next_id = 0
+        self._stale = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, embedding: np.ndarray, index_version: str) -> Optional[Dict[str, Any]]:
+        self._check_version(index_version)
+        if self.index is None or not self._entries:
+            self.misses += 1
+            return None
+
+        query = self._normalize(embedding)
+        if query.shape[1] != self.dim:
+            self.misses += 1
+            return None
+        scores, ids = self.index.search(query, min(self.search_k, self.index.ntotal))
+        for score, entry_id in zip(scores[0], ids[0]):
+            # HNSW cannot delete, so evicted ids stay in the graph until the next rebuild.
+            if entry_id < 0 or entry_id not in self._entries:
+                continue
+            if score < self.threshold:
+                break
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            entry = self._entries[entry_id]
+            return {"answer": entry["answer"], "question": entry["question"], "similarity": float(score)}
+        self.misses += 1
+        return None
+
+    def store(self, question: str, answer: str, embedding: np.ndarray, index_version: str):
+        self._check_version(index_version)
+        vector = self._normalize(embedding)
+        if self.index is None:
+            self.dim = vector.shape[1]
+            self.index = self._new_index()
+        elif vector.shape[1] != self.dim:
+            self.clear()
+            self.dim = vector.shape[1]
+            self.index = self._new_index()
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self.index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+        self._vectors[entry_id] = vector[0]
+        self._entries[entry_id] = {"question": question, "answer": answer}
+
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            del self._vectors[evicted]
+            self._stale += 1
+        if self._stale > self.max_entries:
+            self._rebuild()
+
+    def clear(self):
+        self._entries.clear()
+        self._vectors.clear()
+        self._stale = 0
+        self.index = self._new_index() if self.dim else None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "index_version": self.index_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _check_version(self, index_version: str):
+        if index_version != self.index_version:
+            if self._entries:
+                logger.info(f"Index version changed {self.index_version} -> {index_version}; clearing answer cache")
+            self.clear()
+            self.index_version = index_version
+
+    def _new_index(self):
+        hnsw = faiss.IndexHNSWFlat(self.dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexIDMap(hnsw)
+
+    def _rebuild(self):
+        self.index = self._new_index()
+        if self._vectors:
+            ids = np.array(list(self._vectors.keys()), dtype="int64")
+            self.index.add_with_ids(np.vstack(list(self._vectors.values())), ids)
+        self._stale = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.ascontiguousarray(np.asarray(embedding, dtype="float32").reshape(1, -1))
+        faiss.normalize_L2(vector)
+        return vector
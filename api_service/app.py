@@ -1,6 +1,8 @@
 # © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+import json
 import logging
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from fastapi.responses import JSONResponse, StreamingResponse
 from mcp_client import KittyCashMCPClient
 
 logging.basicConfig(
@@ -12,10 +14,24 @@ logger = logging.getLogger("api_server")
 app = FastAPI(title="Kitty Cash API Server (MCP Client)", version="1.0.0")
 mcp_client = KittyCashMCPClient()
 
+@app.on_event("startup")
+async def startup_event():
+    await mcp_client.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await mcp_client.close()
+
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
     return {"status": "API Server with MCP running"}
 
+@app.get("/health/ready")
+async def readiness_check():
+    status = await mcp_client.readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 @app.post("/support/chat")
 async def support_chat(request: Request):
     payload = await request.json()
@@ -27,6 +43,9 @@ async def support_chat(request: Request):
 
     logger.info(f"Received message from user {user_id}")
 
+    if payload.get("stream"):
+        return StreamingResponse(stream_chat(message), media_type="application/x-ndjson")
+
     try:
         routed = await mcp_client.route_and_call(message)
     except Exception as e:
@@ -34,9 +53,21 @@ async def support_chat(request: Request):
         raise HTTPException(status_code=503, detail=f"Routing/Tool error: {e}")
 
     answer = routed.get("answer", "")
-    logger.info(f"Returning answer preview: {answer[:240] if answer else '<empty>'}")
+    cached = routed.get("cached", False)
+    logger.info(f"Returning {'cached ' if cached else ''}answer preview: {answer[:240] if answer else '<empty>'}")
 
-    return {"status": "success", "responses": [{"type": "text", "content": answer}]}
+    response = {"status": "success", "cached": cached, "responses": [{"type": "text", "content": answer}]}
+    if cached:
+        response["similarity"] = routed.get("similarity")
+    return response
+
+async def stream_chat(message: str):
+    try:
+        async for event in mcp_client.route_and_stream(message):
+            yield json.dumps(event) + "\n"
+    except Exception as e:
+        logger.exception(f"Error streaming answer: {e}")
+        yield json.dumps({"error": f"Routing/Tool error: {e}"}) + "\n"
 
 @app.post("/admin/index/upload")
 async def admin_upload(file: UploadFile = File(...)):
@@ -48,7 +79,15 @@ async def admin_upload(file: UploadFile = File(...)):
         logger.info(f"Indexing file uploaded by admin: {file.filename}")
         result = await mcp_client.index(file_path)
         logger.info(f"Indexing result: {result}")
+        if mcp_client.answer_cache is not None:
+            mcp_client.answer_cache.clear()
         return {"status": "success", "detail": result}
     except Exception as e:
         logger.exception(f"Indexing failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/support/cache/stats")
+async def answer_cache_stats():
+    if mcp_client.answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **mcp_client.answer_cache.stats()}
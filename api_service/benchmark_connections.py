@@ -0,0 +1,63 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+# Measures per-message connection overhead of the chat path: fresh connections per call
+# (previous behaviour) versus the persistent MCP session and pooled HTTP clients. Each message
+# makes the retriever tool call the chat path makes, plus the MCP server's downstream /search/
+# call; the generator is left out so Ollama's latency doesn't drown the connection cost.
+#
+#   python benchmark_connections.py --server-url http://127.0.0.1:9000/mcp \
+#       --search-url http://127.0.0.1:8002/search/ --messages 30
+
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from fastmcp import Client
+
+
+async def fresh_message(server_url: str, search_url: str, query: str):
+    async with Client(server_url) as client:
+        await client.call_tool("retriever", {"query": query})
+    async with httpx.AsyncClient() as client:
+        (await client.get(search_url, params={"query": query})).raise_for_status()
+
+
+async def pooled_message(session: Client, http: httpx.AsyncClient, search_url: str, query: str):
+    await session.call_tool("retriever", {"query": query})
+    (await http.get(search_url, params={"query": query})).raise_for_status()
+
+
+async def measure(label: str, messages: int, run):
+    timings = []
+    for _ in range(messages):
+        started = time.perf_counter()
+        await run()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"{label:<8} mean={statistics.mean(timings):7.2f} ms  p50={timings[len(timings) // 2]:7.2f} ms  "
+          f"p95={timings[int(len(timings) * 0.95) - 1]:7.2f} ms  per message")
+    return statistics.mean(timings)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server-url", default="http://127.0.0.1:9000/mcp")
+    parser.add_argument("--search-url", default="http://127.0.0.1:8002/search/")
+    # The retrieval result cache answers repeats, so every message costs the same search.
+    parser.add_argument("--query", default="how do I join a group")
+    parser.add_argument("--messages", type=int, default=30)
+    args = parser.parse_args()
+
+    before = await measure("before", args.messages,
+                           lambda: fresh_message(args.server_url, args.search_url, args.query))
+
+    async with Client(args.server_url) as session, httpx.AsyncClient() as http:
+        after = await measure("after", args.messages,
+                              lambda: pooled_message(session, http, args.search_url, args.query))
+
+    print(f"overhead saved per message: {before - after:.2f} ms ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,6 +2,21 @@
 
 MCP_SERVER_URL = "http://mcp_server:9000/mcp"
 MCP_META_URL = "http://mcp_server:9001"
+RETRIEVAL_SERVICE_URL = "http://retrieval_service:8002"
 TOP_K = 3
+# Hits retrieved for an answer's context. The generation service drops near-duplicates and keeps
+# at most its TOP_K, so the spares take the place of the dropped ones.
+CONTEXT_CANDIDATES = 8
 OLLAMA_ROUTER_MODEL = "llama3:latest"
+ANSWER_CACHE_ENABLED = True
+# Cosine between questions. A wrong cached answer costs more than a miss, and on BGE-M3 questions
+# that differ in the action asked about ("settle" vs "cancel a contribution") can score above 0.92.
+# Lower it only after checking paraphrases against such near-misses for the deployed model.
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_SIZE = 1000
+HTTP_MAX_CONNECTIONS = 50
+HTTP_MAX_KEEPALIVE = 20
+HTTP_KEEPALIVE_EXPIRY = 30.0
+MCP_TOOL_TIMEOUTS = {"retriever": 30.0, "generator": 300.0, "indexer": 300.0}
 
+READINESS_TIMEOUT = 2.0
@@ -1,11 +1,17 @@
 # © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
 
+import asyncio
 import json
 import logging
 import subprocess
-from typing import Dict, Any, List, Optional
+from typing import AsyncIterator, Dict, Any, List, Optional
+import httpx
 from fastmcp import Client
-from config import MCP_SERVER_URL, MCP_META_URL, TOP_K, OLLAMA_ROUTER_MODEL
+from answer_cache import SemanticAnswerCache
+from config import (MCP_SERVER_URL, MCP_META_URL, RETRIEVAL_SERVICE_URL, TOP_K, CONTEXT_CANDIDATES, OLLAMA_ROUTER_MODEL,
+                    ANSWER_CACHE_ENABLED, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_SIZE,
+                    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY, MCP_TOOL_TIMEOUTS,
+                    READINESS_TIMEOUT)
 
 logger = logging.getLogger("mcp_client")
 logger.setLevel(logging.INFO)
@@ -16,20 +22,100 @@ class RouterError(RuntimeError):
     pass
 
 class KittyCashMCPClient:
-    def __init__(self, server_url: str = None, meta_url: str = None):
+    def __init__(self, server_url: str = None, meta_url: str = None, retrieval_url: str = None):
         self.server_url = server_url or MCP_SERVER_URL
         self.meta_url = meta_url or MCP_META_URL
+        self.retrieval_url = retrieval_url or RETRIEVAL_SERVICE_URL
+        self.answer_cache = SemanticAnswerCache(ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_SIZE) if ANSWER_CACHE_ENABLED else None
+        self.http: Optional[httpx.AsyncClient] = None
+        self.session: Optional[Client] = None
+        self._connect_lock = asyncio.Lock()
+        self._connect_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.get_http()
+        try:
+            await self.connect()
+        except Exception as e:
+            logger.warning(f"MCP session not established at startup, will retry on first call: {e}")
+
+    async def close(self):
+        if self.session is not None:
+            try:
+                await self.session.__aexit__(None, None, None)
+            except Exception as e:
+                logger.warning(f"Error closing MCP session: {e}")
+            self.session = None
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+        logger.info("Closed MCP session and HTTP pool")
+
+    def get_http(self) -> httpx.AsyncClient:
+        if self.http is None or self.http.is_closed:
+            self.http = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self.http
+
+    @property
+    def connected(self) -> bool:
+        return self.session is not None and self.session.is_connected()
+
+    def schedule_connect(self):
+        if self._connect_task is None or self._connect_task.done():
+            self._connect_task = asyncio.create_task(self._connect_quietly())
+
+    async def _connect_quietly(self):
+        try:
+            await self.connect()
+        except Exception as e:
+            logger.warning(f"MCP session not established, will retry: {e}")
+
+    async def readiness(self) -> Dict[str, Any]:
+        if not self.connected:
+            # Reconnects in the background so a probe never waits on an MCP handshake.
+            self.schedule_connect()
+        status: Dict[str, Any] = {"mcp_session": self.connected}
+        try:
+            resp = await self.get_http().get(f"{self.meta_url}/health/ready", timeout=READINESS_TIMEOUT)
+            status["mcp_server_ready"] = resp.status_code == 200
+            status["mcp_server"] = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            status["mcp_server_ready"] = False
+            status["error"] = f"MCP server unreachable: {e}"
+        status["ready"] = status["mcp_session"] and status["mcp_server_ready"]
+        return status
+
+    async def connect(self) -> Client:
+        async with self._connect_lock:
+            if self.session is not None and self.session.is_connected():
+                return self.session
+            if self.session is not None:
+                try:
+                    await self.session.__aexit__(None, None, None)
+                except Exception:
+                    pass
+            # One MCP session is reused for every tool call instead of a handshake per call.
+            session = Client(self.server_url, timeout=max(MCP_TOOL_TIMEOUTS.values()))
+            await session.__aenter__()
+            self.session = session
+            logger.info(f"Opened persistent MCP session to {self.server_url}")
+            return session
 
     async def discover_tools(self, refresh: bool = False) -> List[Dict[str, Any]]:
         global TOOL_MANIFEST_CACHE
         if TOOL_MANIFEST_CACHE and not refresh:
             return TOOL_MANIFEST_CACHE
 
-        import httpx
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f"{self.meta_url}/mcp/tools", timeout=120.0)
-            resp.raise_for_status()
-            data = resp.json()
+        resp = await self.get_http().get(f"{self.meta_url}/mcp/tools", timeout=120.0)
+        resp.raise_for_status()
+        data = resp.json()
         tools = data.get("tools", [])
         TOOL_MANIFEST_CACHE = tools
         logger.info(f"Discovered tools: {[t['name'] for t in tools]}")
@@ -58,6 +144,7 @@ Rules:
 1. Your goal is to produce a final natural language answer for the user.
 2. If the request needs information retrieval (facts, who/what/when/where/how, product details, etc.),
    - First call the `retriever` tool with the user's query.
+   - If the user limits the question to a KB file or a time range, pass `source` and/or `added_after` / `added_before`.
    - Never send the retriever's raw results as the final answer.
    - After retrieving, ALWAYS plan a second step that calls the `generator`
      with:
@@ -98,25 +185,61 @@ User request:
         except json.JSONDecodeError as e:
             raise RouterError(f"Router LLM returned invalid JSON. Raw: {out}. Error: {e}")
 
-    async def call_tool(self, tool_name: str, args: Dict[str, Any], timeout: float = 300.0):
+    async def call_tool(self, tool_name: str, args: Dict[str, Any], timeout: float = None):
         logger.info(f"Calling tool '{tool_name}' with args: {args}")
-        async with Client(self.server_url, timeout=timeout) as client:
-            res = await client.call_tool(tool_name, args)
-            data = getattr(res, "data", None)
-            if data:
-                logger.info(f"Tool '{tool_name}' returned data with keys: {list(data.keys())}")
-                return data
-            content = getattr(res, "content", None)
-            if content and len(content) > 0 and hasattr(content[0], "text"):
-                try:
-                    parsed = json.loads(content[0].text)
-                    logger.info(f"Tool '{tool_name}' returned parseable JSON content")
-                    return parsed
-                except Exception:
-                    logger.warning(f"Tool '{tool_name}' returned non-JSON content")
-                    return {"text": content[0].text}
-            logger.warning(f"Tool '{tool_name}' returned empty or unrecognized response")
-            return {}
+        timeout = timeout or MCP_TOOL_TIMEOUTS.get(tool_name, 300.0)
+        session = await self.connect()
+        try:
+            res = await session.call_tool(tool_name, args, timeout=timeout)
+        except (httpx.TransportError, ConnectionError) as e:
+            logger.warning(f"MCP session dropped during '{tool_name}', reconnecting: {e}")
+            session = await self.connect()
+            res = await session.call_tool(tool_name, args, timeout=timeout)
+        data = getattr(res, "data", None)
+        if data:
+            logger.info(f"Tool '{tool_name}' returned data with keys: {list(data.keys())}")
+            return data
+        content = getattr(res, "content", None)
+        if content and len(content) > 0 and hasattr(content[0], "text"):
+            try:
+                parsed = json.loads(content[0].text)
+                logger.info(f"Tool '{tool_name}' returned parseable JSON content")
+                return parsed
+            except Exception:
+                logger.warning(f"Tool '{tool_name}' returned non-JSON content")
+                return {"text": content[0].text}
+        logger.warning(f"Tool '{tool_name}' returned empty or unrecognized response")
+        return {}
+
+    @staticmethod
+    def context_from_output(prev) -> List[Any]:
+        context_docs = []
+        if isinstance(prev, dict):
+            results = prev.get("results", [])
+            for d in results:
+                if isinstance(d, dict) and isinstance(d.get("document"), dict):
+                    # Score, key and stored embedding let the generator budget and de-duplicate the context.
+                    extra = {name: d[name] for name in ("score", "key", "embedding") if d.get(name) is not None}
+                    context_docs.append({**d["document"], **extra})
+                elif isinstance(d, dict):
+                    context_docs.append(d.get("document") or d.get("text") or str(d))
+                else:
+                    context_docs.append(str(d))
+        elif isinstance(prev, list):
+            context_docs = [str(d) for d in prev]
+        return context_docs
+
+    @staticmethod
+    def without_embeddings(outputs: Dict[str, Any]) -> Dict[str, Any]:
+        # The stored vectors are only for the generator; callers get the hits without them.
+        stripped = {}
+        for step_id, output in outputs.items():
+            if isinstance(output, dict) and isinstance(output.get("results"), list):
+                results = [{name: value for name, value in d.items() if name != "embedding"}
+                           if isinstance(d, dict) else d for d in output["results"]]
+                output = {**output, "results": results}
+            stripped[step_id] = output
+        return stripped
 
     async def execute_plan(self, plan: List[Dict[str, Any]]):
         outputs = {}
@@ -127,18 +250,7 @@ User request:
 
             if "context_from" in args:
                 ref = args.pop("context_from")
-                prev = outputs.get(ref, {})
-                context_docs = []
-                if isinstance(prev, dict):
-                    results = prev.get("results", [])
-                    for d in results:
-                        if isinstance(d, dict):
-                            context_docs.append(d.get("document") or d.get("text") or str(d))
-                        else:
-                            context_docs.append(str(d))
-                elif isinstance(prev, list):
-                    context_docs = [str(d) for d in prev]
-                args["context"] = context_docs
+                args["context"] = self.context_from_output(outputs.get(ref, {}))
 
             logger.info(f"Executing plan step '{step_id}' using tool '{tool}' with args keys: {list(args.keys())}")
             outputs[step_id] = await self.call_tool(tool, args)
@@ -146,13 +258,37 @@ User request:
 
         return outputs
 
+    async def embed_query(self, text: str) -> Dict[str, Any]:
+        resp = await self.get_http().get(f"{self.retrieval_url}/embed/", params={"query": text}, timeout=30.0)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def _lookup_answer(self, user_input: str):
+        if self.answer_cache is None:
+            return None, None
+        try:
+            embedded = await self.embed_query(user_input)
+            hit = self.answer_cache.lookup(embedded["embedding"], embedded.get("index_version"))
+        except Exception as e:
+            logger.warning(f"Answer cache lookup skipped: {e}")
+            return None, None
+        if hit:
+            logger.info(f"Answer cache hit (similarity={hit['similarity']:.3f}) for question {hit['question']!r}")
+        return embedded, hit
+
     async def route_and_call(self, user_input: str, kb_file: str = None):
+        embedded, hit = await self._lookup_answer(user_input)
+        if hit:
+            return {"route": {"plan": []}, "outputs": {}, "answer": hit["answer"],
+                    "cached": True, "similarity": hit["similarity"]}
+
         tools = await self.discover_tools()
         global TOOL_MANIFEST_CACHE
         TOOL_MANIFEST_CACHE = tools
 
         plan = [
-            {"id": "retr1", "tool": "retriever", "args": {"query": user_input}},
+            {"id": "retr1", "tool": "retriever",
+             "args": {"query": user_input, "with_embeddings": True, "top_k": CONTEXT_CANDIDATES}},
             {"id": "gen1", "tool": "generator", "args": {"user_query": user_input, "context_from": "retr1"}}
         ]
 
@@ -161,10 +297,55 @@ User request:
         final_answer = outputs.get(last_step, {}).get("answer") if last_step else ""
         logger.info(f"Final answer returned: {final_answer[:240] if final_answer else '<empty>'}")
 
-        return {"route": {"plan": plan}, "outputs": outputs, "answer": final_answer}
+        if final_answer and embedded is not None:
+            self.answer_cache.store(user_input, final_answer, embedded["embedding"], embedded.get("index_version"))
+
+        return {"route": {"plan": plan}, "outputs": self.without_embeddings(outputs), "answer": final_answer,
+                "cached": False}
+
+    async def stream_generate(self, user_query: str, context: list) -> AsyncIterator[Dict[str, Any]]:
+        async with self.get_http().stream(
+            "POST",
+            f"{self.meta_url}/mcp/tools/generator/stream",
+            json={"user_query": user_query, "context": context},
+            timeout=httpx.Timeout(MCP_TOOL_TIMEOUTS["generator"], read=None),
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def route_and_stream(self, user_input: str) -> AsyncIterator[Dict[str, Any]]:
+        embedded, hit = await self._lookup_answer(user_input)
+        if hit:
+            yield {"token": hit["answer"]}
+            yield {"done": True, "cached": True, "similarity": hit["similarity"]}
+            return
+
+        retrieved = await self.retrieve(user_input)
+        context = self.context_from_output(retrieved)
+        logger.info(f"Streaming answer with {len(context)} context documents")
+
+        tokens = []
+        async for event in self.stream_generate(user_input, context):
+            if "error" in event:
+                yield event
+                return
+            if event.get("done"):
+                break
+            token = event.get("token", "")
+            tokens.append(token)
+            yield {"token": token}
+
+        final_answer = "".join(tokens)
+        logger.info(f"Streamed answer: {final_answer[:240] if final_answer else '<empty>'}")
+        if final_answer and embedded is not None:
+            self.answer_cache.store(user_input, final_answer, embedded["embedding"], embedded.get("index_version"))
+        yield {"done": True, "cached": False}
 
-    async def retrieve(self, query: str):
-        return await self.call_tool("retriever", {"query": query})
+    async def retrieve(self, query: str, filters: Dict[str, Any] = None):
+        return await self.call_tool("retriever", {"query": query, "with_embeddings": True, "top_k": CONTEXT_CANDIDATES,
+                                                  **(filters or {})})
 
     async def generate(self, user_query: str, context: list):
         return await self.call_tool("generator", {"user_query": user_query, "context": context})
@@ -0,0 +1,70 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import numpy as np
+import pytest
+from answer_cache import SemanticAnswerCache
+
+DIM = 16
+VERSION = "v3-120d"
+
+
+def basis(i: int) -> np.ndarray:
+    vector = np.zeros(DIM, dtype="float32")
+    vector[i] = 1.0
+    return vector
+
+
+def near(i: int, j: int, cosine: float) -> np.ndarray:
+    # Unit vector at the given cosine to basis(i), tilted towards basis(j).
+    return cosine * basis(i) + np.sqrt(1 - cosine ** 2) * basis(j)
+
+
+@pytest.fixture
+def cache():
+    return SemanticAnswerCache(threshold=0.92, max_entries=2)
+
+
+def test_threshold_cuts_off_near_misses(cache):
+    cache.store("How do I settle my group?", "Open the group and choose Settle.", basis(0), VERSION)
+    hit = cache.lookup(near(0, 1, 0.95), VERSION)
+    assert hit["answer"] == "Open the group and choose Settle." and hit["similarity"] == pytest.approx(0.95, abs=1e-5)
+    # Unnormalized embeddings are compared by cosine too.
+    assert cache.lookup(3.0 * near(0, 1, 0.95), VERSION)["similarity"] == pytest.approx(0.95, abs=1e-5)
+    assert cache.lookup(near(0, 1, 0.9), VERSION) is None
+    assert cache.lookup(np.ones(DIM + 1, dtype="float32"), VERSION) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_lru_eviction_skips_evicted_ids_still_in_the_graph(cache):
+    cache.store("a", "answer a", basis(0), VERSION)
+    cache.store("b", "answer b", basis(1), VERSION)
+    # Using a makes b the least recently used entry.
+    assert cache.lookup(basis(0), VERSION)["answer"] == "answer a"
+    cache.store("c", "answer c", near(1, 2, 0.96), VERSION)
+
+    assert cache.stats()["entries"] == 2 and cache.index.ntotal == 3
+    # b is still the graph's nearest neighbour of its own question, but only c may answer.
+    hit = cache.lookup(basis(1), VERSION)
+    assert hit["answer"] == "answer c" and hit["similarity"] == pytest.approx(0.96, abs=1e-5)
+    assert cache.lookup(basis(0), VERSION)["answer"] == "answer a"
+
+
+def test_rebuild_drops_evicted_ids_from_the_graph(cache):
+    for i in range(4):
+        cache.store(str(i), f"answer {i}", basis(i), VERSION)
+    assert cache.index.ntotal == 4 and cache._stale == 2
+    # One more eviction than max_entries rebuilds the graph from the live entries.
+    cache.store("4", "answer 4", basis(4), VERSION)
+    assert cache.index.ntotal == 2 and cache._stale == 0
+    assert [cache.lookup(basis(i), VERSION) for i in range(3)] == [None] * 3
+    assert [cache.lookup(basis(i), VERSION)["answer"] for i in (3, 4)] == ["answer 3", "answer 4"]
+
+
+def test_index_version_change_clears_entries(cache):
+    cache.store("a", "answer a", basis(0), VERSION)
+    assert cache.lookup(basis(0), "v4-120d") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["index_version"] == "v4-120d"
+    # Answers built on the old version do not come back with it either.
+    assert cache.lookup(basis(0), VERSION) is None
+    cache.store("a", "answer a", basis(0), VERSION)
+    assert cache.lookup(basis(0), VERSION)["answer"] == "answer a"
@@ -1,13 +1,36 @@
 # © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
 
 from fastapi import FastAPI, HTTPException, Query, UploadFile, File
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
 from embedder import Embedder
+from embedding_cache import EmbeddingCache, content_hash
+from encode_pool import BulkEncoder
 from indexer import Indexer
-from documents import load_kb_files, load_docstore, save_docstore
-from config import EMBED_MODEL, INDEX_DIR, KB_FILES_DIR
+from index_policy import has_ids
+from retrainer import Retrainer
+from compactor import Compactor
+from merger import SegmentMerger
+from vectors import VectorStore
+from docstore import DocStore
+from lexical import LexicalIndex
+from attributes import AttributeIndex
+from shards import ShardSet
+from documents import load_kb_files, iter_kb_files
+from chunker import make_chunker
+from ingest import IngestPipeline, batched
+from jobs import IndexJobQueue
+from config import (EMBED_MODEL, INDEX_DIR, KB_FILES_DIR, UPLOAD_STAGING_DIR, VECTORS_PATH, DOCSTORE_PATH, LEGACY_DOCSTORE_PATH,
+                    UPLOAD_CHUNK_BYTES, EMBEDDING_CACHE_PATH, CHUNKER, STARTUP_RETRY_SECONDS, INGEST_BATCH_SIZE,
+                    INDEX_SHARDS)
 import numpy as np
 from pathlib import Path
-import json
+import os
+import shutil
+import threading
+import time
+import uuid
 
 app = FastAPI(
     title="Kitty Cash Data/Indexing Service",
@@ -16,51 +39,228 @@ app = FastAPI(
 )
 
 embedder = Embedder(EMBED_MODEL)
-indexer = Indexer(INDEX_DIR)
-documents = []
+bulk_encoder = BulkEncoder(embedder)
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, embedder.variant, bulk_encoder.encode)
+# Needs the model's tokenizer, so it is built at startup once the embedder has loaded.
+chunker = None
+indexer = Indexer(INDEX_DIR, embedder.variant)
+vector_store = VectorStore(VECTORS_PATH)
+docstore = DocStore(DOCSTORE_PATH)
+lexical = LexicalIndex(indexer.manifest)
+attributes = AttributeIndex(indexer.manifest)
+shards = ShardSet(INDEX_DIR, INDEX_SHARDS, embedder.variant) if INDEX_SHARDS > 1 else None
 current_version = None
+# Guards indexer.index, the docstore and version bumps between requests and the background retrainer.
+index_lock = threading.Lock()
+startup_timings = {}
+load_error = None
 
 def get_next_version():
     global current_version
-    try:
-        versions = sorted(Path(INDEX_DIR).glob("*.meta.json"))
-        if not versions:
-            current_version = "v1"
-            return current_version
-        latest_meta_path = versions[-1]
-        meta = json.loads(latest_meta_path.read_text())
-        last_version = meta["version"]
-        num = int(last_version.replace("v", ""))
-        current_version = f"v{num + 1}"
-        return current_version
-    except FileNotFoundError:
-        current_version = "v1"
-        return current_version
+    current_version = indexer.next_version()
+    return current_version
 
-@app.on_event("startup")
-def startup_event():
-    global documents, current_version
+def save_version(version: str):
+    # Shards are written first: retrieval picks a version up once it is listed in the main
+    # manifest, which also lists the lexical and attribute parts sealed here.
+    if shards is not None:
+        shards.save(version, len(docstore), docstore.next_key)
+    parts = {lexical.kind: lexical.seal(), attributes.kind: attributes.seal()}
+    indexer.save(version, len(docstore), docstore.next_key, parts)
+
+def publish_retrained():
+    version = get_next_version()
+    save_version(version)
+    return version
+
+retrainer = Retrainer(indexer, vector_store, docstore, index_lock, publish_retrained)
+
+def publish_compacted(dropped: np.ndarray):
+    lexical.drop(dropped)
+    attributes.drop(dropped)
+    version = get_next_version()
+    save_version(version)
+    return version
+
+compactor = Compactor(docstore, vector_store, indexer, shards, index_lock, publish_compacted)
+merger = SegmentMerger([indexer] + (shards.indexers if shards is not None else []), docstore, vector_store,
+                       index_lock, publish_retrained, [lexical, attributes])
+
+def bulk_batch_size() -> int:
+    return max(INGEST_BATCH_SIZE, bulk_encoder.chunk_size)
+
+def stored_vectors(count: int) -> np.ndarray:
+    if vector_store.count > count:
+        vector_store.truncate(count)
+    elif vector_store.count < count:
+        # Rows written before vectors were stored (or lost in a crash): encode them once.
+        keys = docstore.keys[vector_store.count:count]
+        print(f"Backfilling {len(keys)} stored vectors")
+        for batch in batched(keys, bulk_batch_size()):
+            vector_store.append(embedding_cache.encode([doc["text"] for doc in docstore.get_many(batch)]))
+    return vector_store.read(count)
+
+def key_limit(rows: int) -> int:
+    # Lexical and attribute indexes are addressed by key; this bounds the keys of the first rows.
+    return int(docstore.keys[rows - 1]) + 1 if rows else 0
+
+def sync_lexical() -> bool:
+    keys = docstore.keys[docstore.keys >= len(lexical)]
+    if not len(keys):
+        return False
+    print(f"Adding {len(keys)} docstore rows to the lexical index")
+    for batch in batched(keys):
+        lexical.add(batch, [doc["text"] for doc in docstore.get_many(batch)])
+    return True
+
+def sync_attributes() -> bool:
+    keys = docstore.keys[docstore.keys >= len(attributes)]
+    if not len(keys):
+        return False
+    print(f"Adding {len(keys)} docstore rows to the attribute index")
+    for batch in batched(keys):
+        attributes.add(batch, docstore.get_many(batch))
+    return True
+
+def sync_shards(version: str, vectors: np.ndarray) -> bool:
+    if shards is None:
+        return False
+    total = len(docstore)
+    if not shards.load(version) or len(shards) > total or not shards.consistent(docstore.keys[:len(shards)]):
+        print(f"Building {INDEX_SHARDS} index shards from {total} stored vectors")
+        shards.build(np.array(vectors[:total]), docstore.keys)
+        return True
+    start = len(shards)
+    if start == total:
+        return False
+    print(f"Adding {total - start} docstore rows to the index shards")
+    shards.add(docstore.keys[start:total], np.array(vectors[start:total]))
+    return True
+
+def reconcile_index(version: str):
+    # The docstore is committed before the index version that covers it, so after a crash it
+    # can hold rows the latest index has not seen yet.
+    vector_store.dim = indexer.dim
+    vectors = stored_vectors(len(docstore))
+    relabelled = indexer.index is not None and not has_ids(indexer.index)
+    # A version from before segments is loaded as the open segment; saving seals it.
+    unsealed = indexer.index is not None
+    if relabelled:
+        # Indexes from before stable ids are labelled by row; rebuild from the stored vectors.
+        print(f"Index {version} predates stable document ids; rebuilding it with docstore keys")
+        indexer.build(np.array(vectors), docstore.keys)
+    ntotal = indexer.ntotal
+    lexical.load(version)
+    if len(lexical) > key_limit(ntotal):
+        lexical.reset()
+    lexical_behind = sync_lexical()
+    attributes.load(version)
+    if len(attributes) > key_limit(ntotal):
+        attributes.reset()
+    attributes_behind = sync_attributes()
+    shards_behind = sync_shards(version, vectors)
+    if len(docstore) > ntotal:
+        print(f"Indexing {len(docstore) - ntotal} docstore rows missing from the index")
+        indexer.add(np.array(vectors[ntotal:]), docstore.keys[ntotal:])
+    if unsealed or len(docstore) > ntotal or lexical_behind or attributes_behind or shards_behind:
+        save_version(get_next_version())
+
+def rebuild_from_docstore():
+    if not len(docstore):
+        for batch in batched(iter_kb_files(KB_FILES_DIR, chunker=chunker)):
+            docstore.append(batch)
+        if not len(docstore):
+            raise RuntimeError("Knowledge base is empty. Please add KB files.")
+    # Vectors come from the embedding cache; only text this model has not seen is encoded.
+    vector_store.reset()
+    vector_store.dim = None
+    embeddings = stored_vectors(len(docstore))
+    indexer.build(np.array(embeddings), docstore.keys)
+    if shards is not None:
+        shards.build(np.array(embeddings), docstore.keys)
+    lexical.reset()
+    sync_lexical()
+    attributes.reset()
+    sync_attributes()
+    version = get_next_version()
+    save_version(version)
+    return version
+
+def load_service():
+    global current_version, chunker, load_error
+    started = time.perf_counter()
+    embedder.warm_up()
+    chunker = make_chunker(CHUNKER, embedder.count_tokens, embedder.max_tokens)
+    startup_timings.update(embedder.timings)
+
+    phase = time.perf_counter()
+    docstore.migrate_from_json(LEGACY_DOCSTORE_PATH)
+    startup_timings["docstore_s"] = time.perf_counter() - phase
+    phase = time.perf_counter()
     try:
         meta = indexer.load_latest()
-        documents = load_docstore()
         current_version = meta["version"]
-        print(f"Loaded latest index: {meta['version']}")
+        # Versions from before embed_model was recorded were built with EMBED_MODEL on PyTorch.
+        if meta.get("embed_model", EMBED_MODEL) != embedder.variant:
+            print(f"Index {meta['version']} was built with {meta.get('embed_model', EMBED_MODEL)}; "
+                  f"rebuilding for {embedder.variant}")
+            print(f"Rebuilt index: {rebuild_from_docstore()}")
+        else:
+            reconcile_index(meta["version"])
+            print(f"Loaded latest index: {meta['version']}")
     except FileNotFoundError:
-        documents = load_kb_files(KB_FILES_DIR)
-        if not documents:
-            raise RuntimeError("Knowledge base is empty. Please add KB files.")
-        texts = [doc["text"] for doc in documents]
-        embeddings = embedder.encode(texts)
-        indexer.build(embeddings)
-        version = get_next_version()
-        indexer.save(version, len(documents))
-        save_docstore(documents)
-        print(f"Created initial index: {version}")
+        print(f"Created initial index: {rebuild_from_docstore()}")
+    startup_timings["index_s"] = time.perf_counter() - phase
+    compactor.maybe_schedule()
+    merger.maybe_schedule()
+    index_jobs.start()
+    startup_timings["total_s"] = time.perf_counter() - started
+    load_error = None
+    print("[Startup] " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in startup_timings.items()))
+
+def load_service_until_ready():
+    global load_error
+    while not index_jobs.running:
+        try:
+            load_service()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if error != load_error:
+                print(f"[Startup] Indexing service not ready, retrying every {STARTUP_RETRY_SECONDS}s: {error}")
+            load_error = error
+            time.sleep(STARTUP_RETRY_SECONDS)
+
+# Model load and index build/reconcile run in the background so liveness probes pass meanwhile.
+# Uploads are accepted and queued; the job worker only starts once the index is loaded.
+@app.on_event("startup")
+def startup_event():
+    # Staged uploads belong to jobs queued before a restart, which are gone.
+    shutil.rmtree(UPLOAD_STAGING_DIR, ignore_errors=True)
+    threading.Thread(target=load_service_until_ready, name="indexing-startup", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    bulk_encoder.close()
 
 @app.get("/health")
+@app.get("/health/live")
 def health_check():
     return {"status": "Data/Indexing Service is running"}
 
+@app.get("/health/ready")
+def readiness_check():
+    ready = index_jobs.running and current_version is not None
+    body = {
+        "ready": ready,
+        "model_loaded": embedder.loaded,
+        "warmed_up": "warm_up_s" in embedder.timings,
+        "index_version": current_version,
+        "jobs_worker": index_jobs.running,
+        "startup": {name: round(seconds, 3) for name, seconds in startup_timings.items()},
+        "error": load_error,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 '''@app.post("/index/add")
 def add_to_index(kb_file: str = Query(None, description="KB file path added")):
     global documents
@@ -100,41 +300,209 @@ def add_to_index(kb_file: str = Query(None, description="KB file path added")):
     }'''
 
 
-@app.post("/index/add")
+def publish_upload(staged: Path, kb_path: Path, job_id: str):
+    # The KB directory copy (read by a full rebuild) is swapped in whole; the staged file is
+    # never written again, so linking it is enough.
+    tmp_path = kb_path.with_name(f".{kb_path.name}.{job_id}.tmp")
+    try:
+        os.link(staged, tmp_path)
+    except OSError:
+        shutil.copyfile(staged, tmp_path)
+    os.replace(tmp_path, kb_path)
+
+
+@app.post("/index/add", status_code=202)
 async def upload_and_index(file: UploadFile = File(...)):
-    global documents
-    kb_path = Path(KB_FILES_DIR) / file.filename
-    with open(kb_path, "wb") as f:
-        f.write(await file.read())
-    new_docs = load_kb_files(KB_FILES_DIR, file.filename)
-    existing_texts = {doc["text"] for doc in documents}
-    fresh_docs = [doc for doc in new_docs if doc["text"] not in existing_texts]
-    if not fresh_docs:
-        return {"message": "No new KB documents to add.", "total_docs": len(documents)}
-    texts = [doc["text"] for doc in fresh_docs]
-    embeddings = embedder.encode(texts)
-    indexer.add(embeddings)
-    documents.extend(fresh_docs)
-    version = get_next_version()
-    indexer.save(version, len(documents))
-    save_docstore(documents)
+    # Queued and running jobs may still be reading an earlier upload of the same name, so each
+    # upload is written under its own name and only replaces the KB file once complete.
+    filename = Path(file.filename).name
+    job_id = uuid.uuid4().hex
+    staging_dir = Path(UPLOAD_STAGING_DIR)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    staged = staging_dir / f"{job_id}-{filename}"
+    part_path = staged.with_name(staged.name + ".part")
+    try:
+        with open(part_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                f.write(chunk)
+        os.replace(part_path, staged)
+    finally:
+        part_path.unlink(missing_ok=True)
+    publish_upload(staged, Path(KB_FILES_DIR) / filename, job_id)
+    job = index_jobs.submit(filename, str(staged), job_id)
     return {
-        "message": f"Uploaded and indexed {len(fresh_docs)} documents. Index version: {version}",
-        "total_docs": len(documents)
+        "message": f"Queued {filename} for indexing.",
+        "job_id": job.id,
+        "status": job.status
     }
 
 
+@app.get("/index/jobs/{job_id}")
+def index_job_status(job_id: str):
+    job = index_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+
+def commit_documents(batch, embeddings) -> List[int]:
+    # Callers hold index_lock. Vectors go first and the docstore append is the commit point.
+    vector_store.append(embeddings)
+    keys = docstore.append(batch)
+    lexical.add(keys, [doc["text"] for doc in batch])
+    attributes.add(keys, batch)
+    indexer.add(embeddings, np.asarray(keys, dtype="int64"))
+    if shards is not None:
+        shards.add(keys, embeddings)
+    return keys
+
+
+def ingest_jobs(jobs):
+    # Re-uploads of the same file share one pass over the latest upload's staged copy.
+    jobs_by_file = {}
+    for job in jobs:
+        jobs_by_file[job.filename] = job
+    # Texts queued in this run but not yet committed are not in the docstore's hash index yet.
+    seen_in_run = set()
+
+    def fresh_docs():
+        for filename, job in jobs_by_file.items():
+            for doc in iter_kb_files(KB_FILES_DIR, job.path or filename, chunker, source=filename):
+                key = content_hash(doc["text"])
+                if key in seen_in_run or docstore.contains(doc["text"]):
+                    job.documents_deduplicated += 1
+                    continue
+                seen_in_run.add(key)
+                yield doc
+
+    def commit(batch, embeddings):
+        # Each batch is committed in crash order; the version covering them is saved once at the end.
+        with index_lock:
+            commit_documents(batch, embeddings)
+        for doc in batch:
+            jobs_by_file[doc["source"]].documents_added += 1
+
+    try:
+        stats = IngestPipeline(embedding_cache.encode, commit, batch_size=bulk_batch_size()).run(fresh_docs())
+    finally:
+        for job in jobs:
+            if job.path:
+                Path(job.path).unlink(missing_ok=True)
+    deduplicated = sum(job.documents_deduplicated for job in jobs_by_file.values())
+    if not stats["documents"]:
+        print(f"No new KB documents in {list(jobs_by_file)}; {deduplicated} already indexed")
+        return None
+    with index_lock:
+        version = get_next_version()
+        save_version(version)
+    print(f"Ingested {stats['documents']} documents ({deduplicated} already indexed) from {len(jobs_by_file)} "
+          f"file(s) in {stats['batches']} batches, {stats['seconds']}s. Index version: {version}")
+    if not retrainer.maybe_schedule():
+        merger.maybe_schedule()
+    return version
+
+
+index_jobs = IndexJobQueue(ingest_jobs)
+
+
 @app.get("/index/status")
 def index_status():
     try:
-        meta = indexer.load_latest()
+        meta = indexer.latest_meta()
         kb_files_count = len(list(Path(KB_FILES_DIR).glob("*.txt")))
         return {
             "status": "Index loaded",
             "version": meta["version"],
             "dimensions": meta["dim"],
             "total_documents": meta["doc_count"],
-            "kb_files_count": kb_files_count
+            "kb_files_count": kb_files_count,
+            "jobs": index_jobs.stats(),
+            "embedding_cache": embedding_cache.stats(),
+            "encoding": bulk_encoder.stats(),
+            "shards": shards.stats() if shards is not None else None,
+            "compaction": compactor.status(),
+            "segments": merger.status()
         }
     except FileNotFoundError:
-        return {"status": "Index not found", "kb_files_count": 0}
\ No newline at end of file
+        return {"status": "Index not found", "kb_files_count": 0}
+
+
+@app.get("/index/drift")
+def index_drift():
+    stats = indexer.drift_stats()
+    return {"drift": stats, "needs_retrain": indexer.needs_retrain(stats), "retrain": retrainer.status()}
+
+class DeleteRequest(BaseModel):
+    keys: List[int]
+
+
+class UpdateRequest(BaseModel):
+    key: int
+    text: str
+    section: Optional[str] = None
+
+
+def require_index():
+    if not index_jobs.running:
+        raise HTTPException(status_code=503, detail="Index is still loading")
+
+
+@app.post("/index/delete")
+def delete_documents(req: DeleteRequest):
+    # Tombstoned keys drop out of retrieval results on its next search; the records and vectors
+    # are removed by the background compaction.
+    require_index()
+    with index_lock:
+        deleted = docstore.delete(req.keys)
+    missing = sorted(set(req.keys) - set(deleted))
+    print(f"Deleted {len(deleted)} documents {deleted}" + (f"; not live: {missing}" if missing else ""))
+    compactor.maybe_schedule()
+    return {"deleted": deleted, "not_found": missing, "compaction": compactor.status()}
+
+
+def content_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    # What an update can change; the bookkeeping fields differ on every update.
+    return {name: value for name, value in doc.items() if name not in ("added_at", "replaces")}
+
+
+@app.post("/index/update")
+def update_document(req: UpdateRequest):
+    # Records are immutable: the new text gets a fresh key and the old key is tombstoned in the
+    # same locked step, so a search sees exactly one of them.
+    require_index()
+    if not req.text.strip():
+        raise HTTPException(status_code=400, detail="text must be non-empty")
+    with index_lock:
+        if req.key not in docstore.keys or req.key in docstore.deleted:
+            raise HTTPException(status_code=404, detail=f"No live document with key {req.key}")
+        old = docstore.get(req.key)
+    doc = {**old, "text": req.text.strip(), "added_at": int(time.time()), "replaces": req.key}
+    if req.section is not None:
+        doc["section"] = req.section
+    if content_fields(doc) == content_fields(old):
+        raise HTTPException(status_code=409, detail=f"Document {req.key} already has this content")
+    # Only new text can collide with another document; the same text with a new section is an update.
+    if doc["text"] != old["text"] and docstore.contains(doc["text"]):
+        raise HTTPException(status_code=409, detail="This text is already indexed")
+    embeddings = embedding_cache.encode([doc["text"]])
+    with index_lock:
+        if req.key in docstore.deleted:
+            raise HTTPException(status_code=409, detail=f"Document {req.key} was deleted during the update")
+        # Checked again: an upload or update may have committed the same text while encoding.
+        if doc["text"] != old["text"] and docstore.contains(doc["text"]):
+            raise HTTPException(status_code=409, detail="This text is already indexed")
+        keys = commit_documents([doc], embeddings)
+        docstore.delete([req.key])
+        version = get_next_version()
+        save_version(version)
+    print(f"Updated document {req.key} -> {keys[0]}. Index version: {version}")
+    if not compactor.maybe_schedule():
+        merger.maybe_schedule()
+    return {"key": req.key, "new_key": keys[0], "version": version}
+
+
+@app.post("/index/compact", status_code=202)
+def compact_index():
+    require_index()
+    started = compactor.maybe_schedule(force=True)
+    return {"started": started, "compaction": compactor.status()}
@@ -0,0 +1,114 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence
+import numpy as np
+from segments import Manifest, PartedIndex
+from config import FILTER_FIELDS
+
+
+# Filterable attributes of one docstore key range [key_start, key_end). Each field in FILTER_FIELDS
+# keeps value -> docstore keys postings; added_at keeps one timestamp per key (-1 for keys no
+# longer stored), indexed by key - key_start. Retrieval turns them into FAISS ID selectors.
+class AttributePart:
+    def __init__(self, key_start: int = 0, fields: Sequence[str] = FILTER_FIELDS):
+        self.key_start = int(key_start)
+        self.fields = tuple(fields)
+        self.postings: Dict[str, Dict[str, List[int]]] = {field: {} for field in self.fields}
+        self.added_at: List[int] = []
+
+    @property
+    def key_end(self) -> int:
+        return self.key_start + len(self.added_at)
+
+    @property
+    def count(self) -> int:
+        return sum(1 for added_at in self.added_at if added_at >= 0)
+
+    def meta(self) -> Dict[str, Any]:
+        return {"fields": list(self.fields)}
+
+    def add(self, keys: Iterable[int], docs: Iterable[Dict[str, Any]]):
+        for key, doc in zip(keys, docs):
+            if int(key) < self.key_end:
+                raise ValueError(f"Attribute index already covers key {key}")
+            # Keys compacted out of the docstore are holes with added_at -1.
+            self.added_at.extend([-1] * (int(key) - self.key_end))
+            for field in self.fields:
+                value = doc.get(field)
+                if value is not None:
+                    self.postings[field].setdefault(str(value), []).append(int(key))
+            # Documents stored before added_at was recorded sort as oldest.
+            self.added_at.append(int(doc.get("added_at") or 0))
+
+    def drop(self, keys: Iterable[int]):
+        dropped = {int(key) for key in keys}
+        for postings in self.postings.values():
+            for value, value_keys in list(postings.items()):
+                kept = [key for key in value_keys if key not in dropped]
+                if kept:
+                    postings[value] = kept
+                else:
+                    del postings[value]
+        for key in dropped:
+            if self.key_start <= key < self.key_end:
+                self.added_at[key - self.key_start] = -1
+
+    def extend(self, other: "AttributePart"):
+        # other covers the keys after this part's.
+        self.added_at.extend([-1] * (other.key_start - self.key_end))
+        self.added_at.extend(other.added_at)
+        for field in self.fields:
+            for value, value_keys in other.postings[field].items():
+                self.postings[field].setdefault(value, []).extend(value_keys)
+
+    def save(self, path: Path) -> Path:
+        arrays = {"fields": np.array(self.fields, dtype=str), "added_at": np.array(self.added_at, dtype="int64"),
+                  "key_start": np.int64(self.key_start)}
+        for field in self.fields:
+            values = sorted(self.postings[field])
+            offsets = np.zeros(len(values) + 1, dtype="int64")
+            offsets[1:] = np.cumsum([len(self.postings[field][value]) for value in values])
+            arrays[f"{field}.values"] = np.array(values, dtype=str)
+            arrays[f"{field}.offsets"] = offsets
+            arrays[f"{field}.keys"] = np.fromiter((key for value in values for key in self.postings[field][value]),
+                                                  dtype="int64", count=offsets[-1])
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        print(f"[AttributeIndex] Saved {', '.join(f'{len(self.postings[f])} {f}' for f in self.fields)} values "
+              f"over keys {self.key_start}-{self.key_end} to {path.name}")
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "AttributePart":
+        with np.load(path) as data:
+            # Per-version files from before parts start at key 0.
+            part = cls(int(data["key_start"]) if "key_start" in data.files else 0, data["fields"].tolist())
+            for field in part.fields:
+                offsets, keys = data[f"{field}.offsets"], data[f"{field}.keys"]
+                for i, value in enumerate(data[f"{field}.values"].tolist()):
+                    part.postings[field][value] = keys[offsets[i]:offsets[i + 1]].tolist()
+            part.added_at = data["added_at"].tolist()
+        return part
+
+
+# Attributes grown batch by batch with the FAISS index and sealed into segments/<id>.attributes.npz
+# parts at every save.
+class AttributeIndex(PartedIndex):
+    kind = "attributes"
+    part_type = AttributePart
+
+    def __init__(self, manifest: Manifest, fields: Sequence[str] = FILTER_FIELDS):
+        self.fields = tuple(fields)
+        super().__init__(manifest)
+
+    def new_part(self, key_start: int) -> AttributePart:
+        return AttributePart(key_start, self.fields)
+
+    def compatible(self, part_meta: Dict[str, Any]) -> bool:
+        # FILTER_FIELDS changed: the caller rebuilds from the docstore.
+        return tuple(part_meta.get("fields", ())) == self.fields
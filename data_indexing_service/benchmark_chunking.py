@@ -0,0 +1,62 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+# Compares the per-line chunker with the token-aware chunker on the knowledge base:
+# documents (vectors) produced, chunk sizes, lines the model would truncate, flat index size,
+# context tokens for top-k hits and, with --encode, embedding time.
+#
+#   python benchmark_chunking.py --kb-dir ../data/kb_files --encode
+
+import argparse
+import statistics
+import time
+from chunker import approx_tokens, make_chunker, CHUNKERS
+from documents import load_kb_files
+from config import EMBED_MODEL
+
+
+def measure(name: str, kb_dir: str, count_tokens, max_tokens: int, dim: int, top_k: int, embedder=None):
+    chunker = make_chunker(name, count_tokens, max_tokens)
+    docs = load_kb_files(kb_dir, chunker=chunker)
+    sizes = [count_tokens(doc["text"]) for doc in docs] or [0]
+    row = {
+        "chunker": name,
+        "documents": len(docs),
+        "mean_tokens": round(statistics.mean(sizes), 1),
+        "max_tokens": max(sizes),
+        "truncated": sum(size > max_tokens for size in sizes),
+        "index_kb": round(len(docs) * dim * 4 / 1024, 1),
+        "context_tokens": round(statistics.mean(sizes) * min(top_k, len(docs)), 1),
+    }
+    if embedder is not None:
+        started = time.perf_counter()
+        embedder.encode([doc["text"] for doc in docs])
+        row["encode_s"] = round(time.perf_counter() - started, 3)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kb-dir", default="../data/kb_files")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--encode", action="store_true", help=f"Load {EMBED_MODEL} to count tokens and time encoding")
+    args = parser.parse_args()
+
+    embedder, count_tokens, max_tokens = None, approx_tokens, 512
+    if args.encode:
+        from embedder import Embedder
+        embedder = Embedder(EMBED_MODEL)
+        count_tokens, max_tokens = embedder.count_tokens, embedder.max_tokens
+        embedder.encode(["warm up"])
+    else:
+        print("Token counts are approximate (word/punctuation pieces); pass --encode to use the model tokenizer.")
+
+    rows = [measure(name, args.kb_dir, count_tokens, max_tokens, args.dim, args.top_k, embedder) for name in CHUNKERS]
+    columns = list(rows[0])
+    print("  ".join(f"{column:>14}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{row[column]!s:>14}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+# Measures bulk encoding throughput (texts/sec) on the knowledge base for a grid of batch sizes
+# and worker counts, against one plain Embedder.encode call over the whole list. Each row also
+# reports the largest difference from the baseline vectors, to confirm order is restored.
+#
+#   python benchmark_encoding.py --kb-dir ../data/kb_files --batch-sizes 16,32,64 --workers 1,2,4
+
+import argparse
+import time
+import numpy as np
+from chunker import make_chunker
+from documents import load_kb_files
+from embedder import Embedder
+from encode_pool import BulkEncoder
+from config import EMBED_MODEL, BULK_ENCODE_START_METHOD
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kb-dir", default="../data/kb_files")
+    parser.add_argument("--chunker", default="line", help="line gives many short, mixed-length texts")
+    parser.add_argument("--repeat", type=int, default=4, help="Repeat the corpus to get a bulk-sized workload")
+    parser.add_argument("--batch-sizes", default="16,32,64")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--start-method", default=BULK_ENCODE_START_METHOD)
+    args = parser.parse_args()
+
+    embedder = Embedder(EMBED_MODEL)
+    embedder.warm_up()
+    chunker = make_chunker(args.chunker, embedder.count_tokens, embedder.max_tokens)
+    texts = [doc["text"] for doc in load_kb_files(args.kb_dir, chunker=chunker)] * args.repeat
+    print(f"{len(texts)} texts, model {EMBED_MODEL}")
+
+    started = time.perf_counter()
+    baseline = embedder.encode(texts)
+    seconds = time.perf_counter() - started
+    rows = [{"workers": "-", "batch_size": "single call", "seconds": round(seconds, 3),
+             "texts_per_s": round(len(texts) / seconds, 1), "max_diff": 0.0}]
+
+    for workers in [int(w) for w in args.workers.split(",")]:
+        for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+            encoder = BulkEncoder(embedder, workers, batch_size, args.start_method)
+            try:
+                encoder.encode(texts[:workers * batch_size * 2])
+                encoder.texts, encoder.seconds = 0, 0.0
+                vectors = encoder.encode(texts)
+            finally:
+                encoder.close()
+            stats = encoder.stats()
+            rows.append({"workers": workers, "batch_size": batch_size, "seconds": stats["seconds"],
+                         "texts_per_s": stats["texts_per_s"],
+                         "max_diff": round(float(np.abs(vectors - baseline).max()), 6)})
+
+    columns = list(rows[0])
+    print("  ".join(f"{column:>12}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{row[column]!s:>12}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from config import CHUNKER, CHUNK_TARGET_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_MAX_TOKENS
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+# Markdown headings, short lines ending in ':' and short ALL-CAPS lines open a new section.
+HEADING_PATTERN = re.compile(r"^(#{1,6}\s+\S.*|[^|?]{1,60}:|[A-Z0-9][A-Z0-9 &/\-]{2,59})$")
+# "question | answer" lines are self-contained FAQ entries.
+QA_PATTERN = re.compile(r"\S\s*\|\s*\S")
+
+
+def approx_tokens(text: str) -> int:
+    # Word and punctuation pieces; used when the model's tokenizer is not available.
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def is_heading(text: str) -> bool:
+    return bool(HEADING_PATTERN.match(text))
+
+
+def heading_title(text: str) -> str:
+    return text.lstrip("#").strip().rstrip(":").strip()
+
+
+def is_qa_pair(text: str) -> bool:
+    return bool(QA_PATTERN.search(text))
+
+
+# One document per non-empty line (the original load_kb_files behaviour).
+class LineChunker:
+    name = "line"
+
+    def __init__(self, count_tokens: Callable[[str], int] = approx_tokens):
+        self.count_tokens = count_tokens
+
+    def chunk(self, lines: Iterable[str], source: str) -> Iterator[Dict[str, Any]]:
+        section: Optional[str] = None
+        for line_no, line in enumerate(lines, 1):
+            text = line.strip()
+            if not text:
+                continue
+            if is_heading(text):
+                section = heading_title(text)
+            yield {"text": text, "source": source, "section": section, "lines": [line_no, line_no]}
+
+
+# Packs consecutive lines into chunks of up to target_tokens within a section, carrying up to
+# overlap_tokens of trailing lines into the next chunk. Question | answer lines are never packed
+# with their neighbours: each is one chunk of its own. Lines longer than max_tokens are split
+# on sentence (then word) boundaries instead of being truncated by the model.
+class TokenChunker:
+    name = "token"
+
+    def __init__(self, count_tokens: Callable[[str], int] = approx_tokens, target_tokens: int = CHUNK_TARGET_TOKENS,
+                 overlap_tokens: int = CHUNK_OVERLAP_TOKENS, max_tokens: int = CHUNK_MAX_TOKENS):
+        self.count_tokens = count_tokens
+        self.target_tokens = min(target_tokens, max_tokens)
+        self.overlap_tokens = overlap_tokens
+        self.max_tokens = max_tokens
+
+    def chunk(self, lines: Iterable[str], source: str) -> Iterator[Dict[str, Any]]:
+        section: Optional[str] = None
+        section_tokens = 0
+        units: List[Tuple[str, int, int]] = []
+        size = 0
+        for line_no, line in enumerate(lines, 1):
+            text = line.strip()
+            if not text:
+                continue
+            if is_heading(text):
+                if units:
+                    yield self._emit(units, section, source)
+                units, size = [], 0
+                section = heading_title(text)
+                section_tokens = self.count_tokens(section)
+                continue
+            if is_qa_pair(text):
+                # Packing unrelated pairs only dilutes each hit and grows the context sent per hit.
+                if units:
+                    yield self._emit(units, section, source)
+                units, size = [], 0
+                for piece in self._split(text):
+                    yield self._emit([(piece, line_no, 0)], section, source)
+                continue
+            for piece in self._split(text):
+                tokens = self.count_tokens(piece)
+                if units and section_tokens + size + tokens > self.target_tokens:
+                    yield self._emit(units, section, source)
+                    units = self._overlap(units)
+                    size = sum(unit[2] for unit in units)
+                units.append((piece, line_no, tokens))
+                size += tokens
+        if units:
+            yield self._emit(units, section, source)
+
+    def _overlap(self, units: List[Tuple[str, int, int]]) -> List[Tuple[str, int, int]]:
+        kept, total = [], 0
+        for unit in reversed(units[1:]):
+            if total + unit[2] > self.overlap_tokens:
+                break
+            kept.insert(0, unit)
+            total += unit[2]
+        return kept
+
+    def _split(self, text: str) -> List[str]:
+        if self.count_tokens(text) <= self.max_tokens:
+            return [text]
+        pieces = []
+        for sentence in SENTENCE_PATTERN.split(text):
+            if self.count_tokens(sentence) <= self.max_tokens:
+                pieces.append(sentence)
+                continue
+            words = sentence.split()
+            step = max(1, self.max_tokens // 2)
+            pieces.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+
+        windows, current, size = [], [], 0
+        for piece in pieces:
+            tokens = self.count_tokens(piece)
+            if current and size + tokens > self.max_tokens:
+                windows.append(" ".join(unit[0] for unit in current))
+                current = self._overlap(current)
+                size = sum(unit[2] for unit in current)
+            current.append((piece, 0, tokens))
+            size += tokens
+        if current:
+            windows.append(" ".join(unit[0] for unit in current))
+        return windows
+
+    def _emit(self, units: List[Tuple[str, int, int]], section: Optional[str], source: str) -> Dict[str, Any]:
+        body = "\n".join(unit[0] for unit in units)
+        return {
+            "text": f"{section}\n{body}" if section else body,
+            "source": source,
+            "section": section,
+            "lines": [units[0][1], units[-1][1]],
+        }
+
+
+CHUNKERS = {"line": LineChunker, "token": TokenChunker}
+
+
+def make_chunker(name: str = CHUNKER, count_tokens: Callable[[str], int] = approx_tokens, model_max_tokens: int = None):
+    if name == "token":
+        # Chunks must fit the model's input, or the tail is silently dropped at encode time.
+        return TokenChunker(count_tokens, max_tokens=min(CHUNK_MAX_TOKENS, model_max_tokens or CHUNK_MAX_TOKENS))
+    if name not in CHUNKERS:
+        raise ValueError(f"Unknown chunker: {name}. Choose from {sorted(CHUNKERS)}")
+    return CHUNKERS[name](count_tokens)
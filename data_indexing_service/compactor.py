@@ -0,0 +1,105 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+import numpy as np
+from docstore import DocStore
+from indexer import Indexer
+from index_policy import plan_index, add_vectors
+from shards import ShardSet
+from vectors import VectorStore
+from config import COMPACT_DEAD_SHARE, COMPACT_MIN_DEAD
+
+
+# Physically drops deleted documents once enough of the docstore is tombstoned: the docstore and
+# vectors.f32 are rewritten without them (keys unchanged) and the index is rebuilt from the live
+# rows. Like the Retrainer, the expensive plan is built from a snapshot outside the lock and the
+# rows committed since are added when it is swapped in.
+class Compactor:
+    def __init__(self, docstore: DocStore, vector_store: VectorStore, indexer: Indexer, shards: Optional[ShardSet],
+                 lock: threading.Lock, publish: Callable[[np.ndarray], str]):
+        self.docstore = docstore
+        self.vector_store = vector_store
+        self.indexer = indexer
+        self.shards = shards
+        self.lock = lock
+        # Called under the lock with the dropped keys; updates the key-indexed side indexes and saves a version.
+        self.publish = publish
+        self.running = False
+        self.last_run: Optional[dict] = None
+        self._thread = None
+
+    def stats(self) -> dict:
+        dead = self.docstore.dead_count()
+        total = len(self.docstore)
+        return {"documents": total, "tombstoned": dead, "tombstoned_share": round(dead / total, 4) if total else 0.0}
+
+    def needs_compaction(self, stats: dict = None) -> bool:
+        stats = stats or self.stats()
+        return stats["tombstoned"] >= COMPACT_MIN_DEAD and stats["tombstoned_share"] >= COMPACT_DEAD_SHARE
+
+    def maybe_schedule(self, force: bool = False) -> bool:
+        stats = self.stats()
+        if self.running or not stats["tombstoned"] or not (force or self.needs_compaction(stats)):
+            return False
+        print(f"[Compactor] {stats['tombstoned']} of {stats['documents']} documents tombstoned; compacting in background")
+        self.running = True
+        self._thread = threading.Thread(target=self._run, args=(stats,), name="docstore-compactor", daemon=True)
+        self._thread.start()
+        return True
+
+    def status(self) -> dict:
+        return {"running": self.running, "last_run": self.last_run, **self.stats()}
+
+    def _run(self, stats: dict):
+        started = time.perf_counter()
+        try:
+            with self.lock:
+                snapshot_rows = len(self.docstore)
+                snapshot_keep = self.docstore.live_mask()
+                keys = self.docstore.keys[:snapshot_rows][snapshot_keep].copy()
+            vectors = np.array(self.vector_store.read(snapshot_rows)[snapshot_keep])
+            plan = plan_index(vectors, keys)
+            shard_plans = self.shards.plan(vectors, keys) if self.shards is not None else None
+
+            with self.lock:
+                # Rows committed since the snapshot are kept as they are, including ones deleted
+                # meanwhile: they are still tombstoned and go in the next compaction.
+                total = len(self.docstore)
+                keep = np.ones(total, dtype=bool)
+                keep[:snapshot_rows] = snapshot_keep
+                dropped = self.docstore.keys[:total][~keep].copy()
+                tail_keys = self.docstore.keys[snapshot_rows:total].copy()
+                tail = np.array(self.vector_store.read(total)[snapshot_rows:total])
+                if len(tail):
+                    add_vectors(plan.index, tail, tail_keys)
+                    if shard_plans is not None:
+                        for i, shard_plan in enumerate(shard_plans):
+                            mask = tail_keys % len(shard_plans) == i
+                            if mask.any():
+                                add_vectors(shard_plan.index, np.ascontiguousarray(tail[mask]), tail_keys[mask])
+
+                vectors_tmp = self.vector_store.write_compacted(keep)
+                self.docstore.compact(keep, [(vectors_tmp, self.vector_store.path)])
+                self.indexer.swap(plan, trained_count=len(keys))
+                if shard_plans is not None:
+                    self.shards.swap(shard_plans)
+                version = self.publish(dropped)
+
+            self.last_run = {
+                "version": version,
+                "dropped": len(dropped),
+                "documents": len(self.docstore),
+                "seconds": round(time.perf_counter() - started, 3),
+                "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            print(f"[Compactor] Dropped {len(dropped)} tombstoned documents, published {version} "
+                  f"in {self.last_run['seconds']}s")
+        except Exception as e:
+            self.last_run = {"error": str(e), "tombstoned": stats["tombstoned"],
+                             "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+            print(f"[Compactor] Compaction failed: {e}")
+        finally:
+            self.running = False
@@ -2,7 +2,60 @@
 EMBED_MODEL = "BAAI/bge-m3"
 #EMBED_MODEL = "imagebind"
 INDEX_DIR = "../data/faiss_index"
-DOCSTORE_PATH = "../data/docstore.json"
+DOCSTORE_PATH = "../data/docstore.jsonl"
+LEGACY_DOCSTORE_PATH = "../data/docstore.json"
 KB_PATH = "../data/knowledge_base.txt"
 KB_FILES_DIR = "../data/kb_files"
-
+# Each upload is written here under a unique name, then published into KB_FILES_DIR; its job reads the staged copy.
+UPLOAD_STAGING_DIR = "../data/kb_files/.uploads"
+INDEX_FAMILY = "auto"
+INDEX_TARGET_RECALL = 0.95
+INDEX_LATENCY_TARGET_MS = 5.0
+FLAT_MAX_VECTORS = 100
+IVFPQ_MIN_VECTORS = 500000
+CALIBRATION_QUERIES = 200
+CALIBRATION_K = 10
+VECTORS_PATH = "../data/faiss_index/vectors.f32"
+RETRAIN_IMBALANCE_THRESHOLD = 2.0
+RETRAIN_ADDED_SHARE = 0.3
+RETRAIN_MIN_VECTORS = 200
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+INGEST_BATCH_SIZE = 64
+INGEST_QUEUE_DEPTH = 2
+JOB_COALESCE_SECONDS = 0.5
+JOB_HISTORY_SIZE = 1000
+EMBEDDING_CACHE_PATH = "../data/embedding_cache.sqlite"
+CHUNKER = "line"
+CHUNK_TARGET_TOKENS = 96
+CHUNK_OVERLAP_TOKENS = 24
+CHUNK_MAX_TOKENS = 512
+INDEX_COMPRESSION = "none"
+RERANK_OVERFETCH = 4
+EMBED_BACKEND = "torch"
+ONNX_DIR = "../data/onnx"
+ONNX_QUANTIZE = True
+ONNX_INTRA_OP_THREADS = 0
+ONNX_INTER_OP_THREADS = 1
+ONNX_MAX_LENGTH = 512
+ONNX_BATCH_SIZE = 32
+STARTUP_RETRY_SECONDS = 5
+# Encode processes for large batches; 1 encodes in-process, 0 means one per 4 cores. Spawned workers
+# each load their own copy of the model (BGE-M3 is ~2.3 GB fp32 in RAM, plus activations), so N
+# workers hold N copies next to the service's own: only raise this where that memory is spare.
+BULK_ENCODE_WORKERS = 1
+BULK_ENCODE_BATCH_SIZE = 32
+# "fork" would copy a process already running torch and tokenizer thread pools, which can deadlock the workers.
+BULK_ENCODE_START_METHOD = "spawn"
+INDEX_SHARDS = 1
+# Document fields retrieval can filter on (plus added_at); each is written to the attribute parts.
+FILTER_FIELDS = ("source", "section")
+# Compact once this many documents, and this share of the docstore, are deleted but still stored.
+COMPACT_MIN_DEAD = 50
+COMPACT_DEAD_SHARE = 0.2
+# Past this many segments, the SEGMENT_MERGE_FACTOR adjacent segments with the fewest rows are merged.
+SEGMENT_MAX_COUNT = 8
+SEGMENT_MERGE_FACTOR = 4
+# Superseded versions (and segments only they use) are deleted once they are neither among the
+# newest INDEX_RETAIN_VERSIONS nor younger than INDEX_RETAIN_SECONDS.
+INDEX_RETAIN_VERSIONS = 3
+INDEX_RETAIN_SECONDS = 600
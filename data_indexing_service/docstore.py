@@ -0,0 +1,254 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+import numpy as np
+from embedding_cache import content_hash
+
+# docstore.idx holds one (key, offset) entry per record in docstore.jsonl. Records are written
+# and fsynced first; the index entry is the commit point, so a crash between the two leaves an
+# orphan record that is truncated on the next open.
+ENTRY = np.dtype([("key", "<i8"), ("offset", "<i8")])
+# docstore.tombstones holds one int64 per deleted key. It is never truncated by compaction: old
+# index versions still hold those keys, and the highest tombstone keeps deleted keys from being reused.
+TOMBSTONE = np.dtype("<i8")
+
+
+class DocStore:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix(".idx")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tombstone_path = self.path.with_suffix(".tombstones")
+        self.journal_path = self.path.with_suffix(".compaction.json")
+        self.path.touch(exist_ok=True)
+        self.index_path.touch(exist_ok=True)
+        self._entries = np.zeros(0, dtype=ENTRY)
+        self._end = 0
+        # Bumped by every compaction, which moves rows; background jobs holding row numbers check it.
+        self.generation = 0
+        if self.journal_path.exists():
+            print("[DocStore] Finishing an interrupted compaction")
+        self._finish_compaction()
+        self._recover()
+        self._deleted = self._load_tombstones()
+        # content hash -> key, for O(1) duplicate checks without scanning the store.
+        self._hash_lock = threading.Lock()
+        self._hashes = sqlite3.connect(str(self.path.with_suffix(".hashes.sqlite")), check_same_thread=False)
+        self._hashes.execute("CREATE TABLE IF NOT EXISTS content (hash BLOB PRIMARY KEY, key INTEGER NOT NULL)")
+        self._sync_hashes()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def keys(self) -> np.ndarray:
+        return self._entries["key"]
+
+    @property
+    def deleted(self) -> np.ndarray:
+        # Every key ever deleted, sorted; compacted ones included.
+        return self._deleted
+
+    @property
+    def next_key(self) -> int:
+        last = int(self.keys[-1]) if len(self) else -1
+        if len(self._deleted):
+            last = max(last, int(self._deleted[-1]))
+        return last + 1
+
+    def live_mask(self) -> np.ndarray:
+        return ~np.isin(self.keys, self._deleted)
+
+    def dead_count(self) -> int:
+        # Deleted records still physically in the store, waiting for compaction.
+        return len(self) - int(self.live_mask().sum())
+
+    def _recover(self):
+        index_size = self.index_path.stat().st_size
+        if index_size % ENTRY.itemsize:
+            with open(self.index_path, "r+b") as f:
+                f.truncate(index_size - index_size % ENTRY.itemsize)
+        entries = np.fromfile(self.index_path, dtype=ENTRY)
+
+        data_size = self.path.stat().st_size
+        end = 0
+        with open(self.path, "rb") as f:
+            while len(entries):
+                f.seek(int(entries["offset"][-1]))
+                line = f.readline()
+                if line.endswith(b"\n"):
+                    end = int(entries["offset"][-1]) + len(line)
+                    break
+                entries = entries[:-1]
+        if len(entries) * ENTRY.itemsize != self.index_path.stat().st_size:
+            with open(self.index_path, "r+b") as f:
+                f.truncate(len(entries) * ENTRY.itemsize)
+        if data_size > end:
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+            print(f"[DocStore] Dropped {data_size - end} bytes of uncommitted records")
+        self._entries = entries
+        self._end = end
+
+    def _load_tombstones(self) -> np.ndarray:
+        if not self.tombstone_path.exists():
+            return np.zeros(0, dtype=TOMBSTONE)
+        size = self.tombstone_path.stat().st_size
+        if size % TOMBSTONE.itemsize:
+            with open(self.tombstone_path, "r+b") as f:
+                f.truncate(size - size % TOMBSTONE.itemsize)
+        return np.unique(np.fromfile(self.tombstone_path, dtype=TOMBSTONE))
+
+    def _finish_compaction(self):
+        # The journal is the compaction's commit point: once it exists every rewritten file is
+        # complete, so an interrupted swap is rolled forward; without it leftovers are discarded.
+        if self.journal_path.exists():
+            for tmp_path, path in json.loads(self.journal_path.read_text()):
+                if Path(tmp_path).exists():
+                    os.replace(tmp_path, path)
+            self.journal_path.unlink()
+        for tmp_path in (self.path.with_name(self.path.name + ".compact"),
+                         self.index_path.with_name(self.index_path.name + ".compact")):
+            tmp_path.unlink(missing_ok=True)
+
+    def _sync_hashes(self):
+        # Hashes are written after the idx commit, so after a crash they can trail the store.
+        last_key = int(self.keys[-1]) if len(self) else -1
+        with self._hash_lock:
+            self._hashes.execute("DELETE FROM content WHERE key > ?", [last_key])
+            last = self._hashes.execute("SELECT MAX(key) FROM content").fetchone()[0]
+        keys = self.keys if last is None else self.keys[self.keys > last]
+        keys = keys[~np.isin(keys, self._deleted)]
+        if len(keys):
+            self._index_hashes(keys, [doc["text"] for doc in self.get_many(keys)])
+            print(f"[DocStore] Indexed content hashes for {len(keys)} records")
+
+    def _index_hashes(self, keys, texts):
+        # The newest key owns a hash: an update that keeps its text appends the new record before
+        # tombstoning the old one, whose delete then leaves the new key's row in place.
+        rows = [(content_hash(text), int(key)) for key, text in zip(keys, texts)]
+        with self._hash_lock:
+            self._hashes.executemany("INSERT OR REPLACE INTO content VALUES (?, ?)", rows)
+            self._hashes.commit()
+
+    def contains(self, text: str) -> bool:
+        with self._hash_lock:
+            return self._hashes.execute("SELECT 1 FROM content WHERE hash = ?", [content_hash(text)]).fetchone() is not None
+
+    def append(self, documents: Iterable[Dict[str, Any]]) -> List[int]:
+        next_key = self.next_key
+        entries, chunks, texts, offset = [], [], [], self._end
+        for doc in documents:
+            record = {"id": doc["id"], "text": doc["text"], "source": doc.get("source", "")}
+            for extra in sorted(doc.keys() - record.keys()):
+                record[extra] = doc[extra]
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            entries.append((next_key + len(entries), offset))
+            chunks.append(line)
+            texts.append(record["text"])
+            offset += len(line)
+        if not entries:
+            return []
+
+        with open(self.path, "ab") as f:
+            f.write(b"".join(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+        new_entries = np.array(entries, dtype=ENTRY)
+        with open(self.index_path, "ab") as f:
+            f.write(new_entries.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._entries = np.concatenate([self._entries, new_entries])
+        self._end = offset
+        keys = [key for key, _ in entries]
+        self._index_hashes(keys, texts)
+        return keys
+
+    def delete(self, keys: Iterable[int]) -> List[int]:
+        # Tombstones take effect at once (retrieval reads the same file); the records stay until
+        # compaction. Returns the keys that were live.
+        keys = np.unique(np.asarray(list(keys), dtype="int64"))
+        keys = keys[np.isin(keys, self.keys) & ~np.isin(keys, self._deleted)]
+        if not len(keys):
+            return []
+        with open(self.tombstone_path, "ab") as f:
+            f.write(keys.astype(TOMBSTONE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._deleted = np.union1d(self._deleted, keys)
+        # Deleted text may be uploaded again.
+        with self._hash_lock:
+            self._hashes.executemany("DELETE FROM content WHERE key = ?", [(int(key),) for key in keys])
+            self._hashes.commit()
+        return keys.tolist()
+
+    def compact(self, keep: np.ndarray, companions: Iterable = ()) -> int:
+        # Rewrites the store with only the rows in keep, keys unchanged. companions are
+        # (tmp_path, path) pairs the caller has already written and fsynced (e.g. the vectors
+        # for the same rows); they are swapped in under the same journal.
+        data_tmp = self.path.with_name(self.path.name + ".compact")
+        index_tmp = self.index_path.with_name(self.index_path.name + ".compact")
+        entries = self._entries[keep].copy()
+        offsets, offset = [], 0
+        with open(self.path, "rb") as src, open(data_tmp, "wb") as dst:
+            for kept in keep:
+                line = src.readline()
+                if kept:
+                    offsets.append(offset)
+                    dst.write(line)
+                    offset += len(line)
+            dst.flush()
+            os.fsync(dst.fileno())
+        entries["offset"] = offsets
+        with open(index_tmp, "wb") as f:
+            f.write(entries.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        pairs = [(str(data_tmp), str(self.path)), (str(index_tmp), str(self.index_path))]
+        pairs += [(str(tmp_path), str(path)) for tmp_path, path in companions]
+        journal_tmp = self.journal_path.with_name(self.journal_path.name + ".tmp")
+        with open(journal_tmp, "w") as f:
+            json.dump(pairs, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(journal_tmp, self.journal_path)
+        self._finish_compaction()
+        dropped = len(self._entries) - len(entries)
+        self._entries = entries
+        self._end = offset
+        self.generation += 1
+        return dropped
+
+    def get(self, key: int) -> Dict[str, Any]:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Iterable[int]) -> List[Dict[str, Any]]:
+        positions = np.searchsorted(self._entries["key"], np.asarray(list(keys), dtype="int64"))
+        docs = []
+        with open(self.path, "rb") as f:
+            for position in positions:
+                f.seek(int(self._entries["offset"][position]))
+                docs.append(json.loads(f.readline()))
+        return docs
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        with open(self.path, "rb") as f:
+            for _ in range(len(self._entries)):
+                yield json.loads(f.readline())
+
+    def migrate_from_json(self, legacy_path: str) -> int:
+        legacy = Path(legacy_path)
+        if len(self) or not legacy.exists():
+            return 0
+        documents = json.loads(legacy.read_text(encoding="utf-8"))
+        self.append(documents)
+        print(f"[DocStore] Migrated {len(documents)} documents from {legacy} to {self.path}")
+        return len(documents)
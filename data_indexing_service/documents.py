@@ -1,11 +1,12 @@
 # © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
 
+import time
 from pathlib import Path
-import json
-from config import DOCSTORE_PATH
+from typing import Any, Dict, Iterator, List
+from chunker import make_chunker
 
 
-def load_kb_files(kb_dir: str, kb_file: str = None):
+def kb_file_paths(kb_dir: str, kb_file: str = None) -> List[Path]:
     kb_path = Path(kb_dir)
     if kb_file:
         file_path = Path(kb_file)
@@ -13,38 +14,27 @@ def load_kb_files(kb_dir: str, kb_file: str = None):
             file_path = kb_path / kb_file
             if not file_path.exists():
                 return []
-        files = [file_path]
-    else:
-        files = list(kb_path.glob("*.txt"))
-        if not files:
-            return []
-    documents = []
-    doc_id = 1  
-    for file in files:
+        return [file_path]
+    return list(kb_path.glob("*.txt"))
+
+
+def iter_kb_files(kb_dir: str, kb_file: str = None, chunker=None, source: str = None) -> Iterator[Dict[str, Any]]:
+    # Reads line by line, so only the chunk being packed is held in memory. source overrides the
+    # file name recorded on each chunk (staged uploads are read under a unique name).
+    chunker = chunker or make_chunker()
+    doc_id = 1
+    for file in kb_file_paths(kb_dir, kb_file):
+        # Ingestion time, for recency filters; re-uploaded duplicates keep their first added_at.
+        added_at = int(time.time())
         try:
-            for line in file.read_text(encoding="utf-8").splitlines():
-                text = line.strip()
-                if text:
-                    documents.append({"id": doc_id, "text": text, "source": str(file.name)})
+            with open(file, "r", encoding="utf-8") as f:
+                for chunk_no, chunk in enumerate(chunker.chunk(f, source or str(file.name))):
+                    yield {"id": doc_id, **chunk, "chunk": chunk_no, "added_at": added_at}
                     doc_id += 1
         except Exception as e:
             print(f"Error reading {file}: {str(e)}")
             continue
-    return documents
 
-def save_docstore(documents):
-    try:
-        data = [{"id": d["id"], "text": d["text"], "source": d.get("source", "")} for d in documents]
-        Path(DOCSTORE_PATH).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-    except Exception as e:
-        print(f"Error saving docstore: {str(e)}")
 
-def load_docstore():
-    p = Path(DOCSTORE_PATH)
-    if not p.exists():
-        return []
-    try:
-        return json.loads(p.read_text(encoding="utf-8"))
-    except Exception as e:
-        print(f"Error loading docstore: {str(e)}")
-        return []
\ No newline at end of file
+def load_kb_files(kb_dir: str, kb_file: str = None, chunker=None):
+    return list(iter_kb_files(kb_dir, kb_file, chunker))
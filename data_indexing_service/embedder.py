@@ -1,51 +1,176 @@
 # © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
 
+import threading
+import time
+from typing import Callable, Dict
 import numpy as np
-import torch
-from sentence_transformers import SentenceTransformer
-from imagebind.models import imagebind_model
-from imagebind import data
+from chunker import approx_tokens
+from config import (EMBED_BACKEND, ONNX_DIR, ONNX_QUANTIZE, ONNX_INTRA_OP_THREADS, ONNX_INTER_OP_THREADS,
+                    ONNX_MAX_LENGTH, ONNX_BATCH_SIZE)
 
+EMBED_BACKENDS = ("torch", "onnx")
+# Families with an ONNX export; the others run on PyTorch whatever EMBED_BACKEND says.
+ONNX_FAMILIES = ("bge",)
 
-class Embedder:
+# Model family (substring of the model name) -> loader. Loaders import their framework and read
+# weights only when called, so a BGE deployment never imports ImageBind and vice versa.
+MODEL_FAMILIES: Dict[str, Callable] = {}
+
+
+def register_family(name: str):
+    def register(loader):
+        MODEL_FAMILIES[name] = loader
+        return loader
+    return register
+
+
+def model_family(model_name: str) -> str:
+    for name in MODEL_FAMILIES:
+        if name in model_name.lower():
+            return name
+    raise ValueError(f"Unknown model_name: {model_name}")
+
+
+class SentenceTransformerBackend:
+    def __init__(self, model_name: str):
+        started = time.perf_counter()
+        from sentence_transformers import SentenceTransformer
+        loaded = time.perf_counter()
+        print(f"Using SentenceTransformer model: {model_name}")
+        self.model = SentenceTransformer(model_name)
+        self.timings = {"import_s": loaded - started, "weights_s": time.perf_counter() - loaded}
+
+    @property
+    def max_tokens(self) -> int:
+        return self.model.max_seq_length
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.model.tokenizer.tokenize(text))
+
+    def encode(self, texts) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        ).astype("float32")
+
+
+class OnnxBackend:
+    def __init__(self, model_name: str):
+        started = time.perf_counter()
+        # Imported here only so their cost lands in the import phase of the startup breakdown.
+        import onnxruntime
+        import transformers
+        from onnx_backend import OnnxEncoder
+        loaded = time.perf_counter()
+        print(f"Using ONNX Runtime for {model_name} ({'int8' if ONNX_QUANTIZE else 'fp32'})")
+        self.encoder = OnnxEncoder(model_name, ONNX_DIR, ONNX_QUANTIZE, ONNX_INTRA_OP_THREADS,
+                                   ONNX_INTER_OP_THREADS, ONNX_MAX_LENGTH, ONNX_BATCH_SIZE)
+        self.timings = {"import_s": loaded - started, "weights_s": time.perf_counter() - loaded}
+
+    @property
+    def max_tokens(self) -> int:
+        return self.encoder.max_length
+
+    def count_tokens(self, text: str) -> int:
+        return self.encoder.count_tokens(text)
+
+    def encode(self, texts) -> np.ndarray:
+        return self.encoder.encode(texts)
+
+
+class ImageBindBackend:
     def __init__(self, model_name: str):
-        self.model_name = model_name.lower()
+        started = time.perf_counter()
+        import torch
+        from imagebind.models import imagebind_model
+        from imagebind import data
+        loaded = time.perf_counter()
+        print(f"Using ImageBind model: {model_name}")
+        self.torch = torch
+        self.data = data
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = imagebind_model.imagebind_huge(pretrained=True)
+        self.model.eval()
+        self.model.to(self.device)
+        self.timings = {"import_s": loaded - started, "weights_s": time.perf_counter() - loaded}
+
+    @property
+    def max_tokens(self) -> int:
+        # ImageBind's text encoder uses a CLIP context of 77 tokens.
+        return 77
+
+    def count_tokens(self, text: str) -> int:
+        return approx_tokens(text)
+
+    def encode(self, texts) -> np.ndarray:
+        inputs = {"text": self.data.load_and_transform_text(texts, self.device)}
+        with self.torch.no_grad():
+            embeddings = self.model(inputs)
+        emb = embeddings["text"].cpu().numpy().astype("float32")
+        return emb.reshape(len(texts), -1)
+
+
+@register_family("bge")
+def load_bge(model_name: str, backend: str):
+    return OnnxBackend(model_name) if backend == "onnx" else SentenceTransformerBackend(model_name)
+
+
+@register_family("imagebind")
+def load_imagebind(model_name: str, backend: str):
+    if backend == "onnx":
+        print(f"No ONNX export for {model_name}; using PyTorch")
+    return ImageBindBackend(model_name)
+
+
+class Embedder:
+    def __init__(self, model_name: str, backend: str = EMBED_BACKEND):
+        if backend not in EMBED_BACKENDS:
+            raise ValueError(f"Unknown embed backend: {backend}")
+        self.model_name = model_name
+        self.family = model_family(model_name)
+        self.backend = backend
+        self.timings: Dict[str, float] = {}
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def variant(self) -> str:
+        # Names the vector space: ONNX Runtime, and int8 above all, gives vectors that differ from
+        # PyTorch's, so embedding caches and index versions record which one produced theirs.
+        if self.backend == "onnx" and self.family in ONNX_FAMILIES:
+            return f"{self.model_name}@onnx-{'int8' if ONNX_QUANTIZE else 'fp32'}"
+        return self.model_name
+
+    def load(self):
+        with self._load_lock:
+            if self._model is None:
+                self._model = MODEL_FAMILIES[self.family](self.model_name, self.backend)
+                self.timings.update(self._model.timings)
+        return self._model
 
-        if "bge" in self.model_name:  
-            print(f"Using SentenceTransformer model: {model_name}")
-            self.model = SentenceTransformer(model_name)
+    def warm_up(self) -> float:
+        # The first forward pass allocates buffers and picks kernels; keep it off user requests.
+        model = self.load()
+        started = time.perf_counter()
+        model.encode(["warm up"])
+        self.timings["warm_up_s"] = time.perf_counter() - started
+        return self.timings["warm_up_s"]
 
-        elif "imagebind" in self.model_name:
-            print(f"Using ImageBind model: {model_name}")
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.model = imagebind_model.imagebind_huge(pretrained=True)
-            self.model.eval()
-            self.model.to(self.device)
+    @property
+    def max_tokens(self) -> int:
+        return self.load().max_tokens
 
-        else:
-            raise ValueError(f"Unknown model_name: {model_name}")
+    def count_tokens(self, text: str) -> int:
+        return self.load().count_tokens(text)
 
     def encode(self, texts):
         if not texts or len(texts) == 0:
             print("called with empty texts")
-            return np.zeros((0, 1024), dtype="float32") 
-
-        if "bge" in self.model_name:
-            return self.model.encode(
-                texts,
-                normalize_embeddings=True,
-                convert_to_numpy=True,
-                show_progress_bar=False,
-            ).astype("float32")
-
-        elif "imagebind" in self.model_name:
-            inputs = {"text": data.load_and_transform_text(texts, self.device)}
-            with torch.no_grad():
-                embeddings = self.model(inputs)
-            emb = embeddings["text"].cpu().numpy().astype("float32")
-            return emb.reshape(len(texts), -1)
-
-        else:
-            raise ValueError(f"Unknown model_name: {self.model_name}")
-
-            
+            return np.zeros((0, 1024), dtype="float32")
+        return self.load().encode(texts)
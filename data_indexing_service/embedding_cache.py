@@ -0,0 +1,79 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List
+import numpy as np
+
+SQLITE_MAX_VARIABLES = 900
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+# Embeddings keyed by (model name, content hash), so rebuilds and re-uploads only encode
+# text the model has never seen.
+class EmbeddingCache:
+    def __init__(self, path: str, model_name: str, encode: Callable[[List[str]], np.ndarray]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self._encode = encode
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash BLOB NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, hash))"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, hashes: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), SQLITE_MAX_VARIABLES):
+                chunk = unique[start:start + SQLITE_MAX_VARIABLES]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(chunk))})",
+                    [self.model_name, *chunk],
+                )
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype="float32")
+        return found
+
+    def store(self, hashes: List[bytes], embeddings: np.ndarray):
+        rows = [(self.model_name, key, np.ascontiguousarray(vector, dtype="float32").tobytes())
+                for key, vector in zip(hashes, embeddings)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        hashes = [content_hash(text) for text in texts]
+        found = self.lookup(hashes)
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            embeddings = self._encode(list(missing.values()))
+            self.store(list(missing), embeddings)
+            found.update(zip(missing, embeddings))
+        if not texts:
+            return self._encode(texts)
+        return np.stack([found[key] for key in hashes]).astype("float32", copy=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", [self.model_name]).fetchone()[0]
+            hits, misses = self.hits, self.misses
+        return {"model": self.model_name, "entries": entries, "hits": hits, "misses": misses}
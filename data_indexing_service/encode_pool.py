@@ -0,0 +1,118 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+from config import BULK_ENCODE_WORKERS, BULK_ENCODE_BATCH_SIZE, BULK_ENCODE_START_METHOD
+
+# The Embedder a worker process encodes with. Spawned workers (the default) load their own copy;
+# forked workers inherit the parent's already loaded model, shared copy-on-write.
+_worker_embedder = None
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+def length_buckets(texts: List[str], batch_size: int) -> List[List[int]]:
+    # Neighbouring lengths share a batch, so little of each forward pass is padding.
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def _init_worker(threads: int, model_name: Optional[str], backend: Optional[str]):
+    global _worker_embedder
+    if "torch" in sys.modules:
+        # Workers split the cores instead of each starting one intra-op thread per core.
+        sys.modules["torch"].set_num_threads(threads)
+    if _worker_embedder is None:
+        from embedder import Embedder
+        _worker_embedder = Embedder(model_name, backend)
+        _worker_embedder.load()
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return _worker_embedder.encode(texts)
+
+
+# Encodes large text lists (initial builds, backfills, big uploads) in length-sorted batches,
+# spread over a pool of worker processes when BULK_ENCODE_WORKERS > 1 (opt-in: every spawned
+# worker holds a full model copy), and restores input order.
+class BulkEncoder:
+    def __init__(self, embedder, workers: int = BULK_ENCODE_WORKERS, batch_size: int = BULK_ENCODE_BATCH_SIZE,
+                 start_method: str = BULK_ENCODE_START_METHOD):
+        self.embedder = embedder
+        self.workers = int(workers) or default_workers()
+        self.batch_size = max(1, int(batch_size))
+        if start_method not in multiprocessing.get_all_start_methods():
+            start_method = "spawn"
+        self.start_method = start_method
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Upload jobs, backfills and the compactor may encode concurrently.
+        self._stats_lock = threading.Lock()
+        self.texts = 0
+        self.seconds = 0.0
+
+    @property
+    def chunk_size(self) -> int:
+        # Texts per encode call in bulk paths: two batches per worker keeps every worker busy.
+        return self.workers * self.batch_size * 2
+
+    def pool(self):
+        global _worker_embedder
+        with self._pool_lock:
+            if self._pool is None:
+                if self.start_method == "fork":
+                    # Load before forking so every worker shares the parent's weights.
+                    self.embedder.load()
+                    _worker_embedder = self.embedder
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                context = multiprocessing.get_context(self.start_method)
+                self._pool = context.Pool(self.workers, initializer=_init_worker,
+                                          initargs=(threads, self.embedder.model_name, self.embedder.backend))
+                print(f"[BulkEncoder] Started {self.workers} {self.start_method} workers with {threads} thread(s) each")
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return self.embedder.encode(texts)
+        started = time.perf_counter()
+        buckets = length_buckets(texts, self.batch_size)
+        batches = [[texts[i] for i in bucket] for bucket in buckets]
+        if self.workers > 1 and len(buckets) > 1:
+            encoded = self.pool().imap(_encode_batch, batches)
+        else:
+            encoded = (self.embedder.encode(batch) for batch in batches)
+
+        out = None
+        for bucket, embeddings in zip(buckets, encoded):
+            if out is None:
+                out = np.empty((len(texts), embeddings.shape[1]), dtype="float32")
+            out[bucket] = embeddings
+        with self._stats_lock:
+            self.texts += len(texts)
+            self.seconds += time.perf_counter() - started
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            texts, seconds = self.texts, self.seconds
+        return {
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            "start_method": self.start_method,
+            "texts": texts,
+            "seconds": round(seconds, 3),
+            "texts_per_s": round(texts / seconds, 1) if seconds else None,
+        }
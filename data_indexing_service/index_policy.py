@@ -0,0 +1,321 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import math
+import time
+from typing import Any, Dict, List, Tuple
+import faiss
+import numpy as np
+from config import (INDEX_FAMILY, INDEX_TARGET_RECALL, INDEX_LATENCY_TARGET_MS, FLAT_MAX_VECTORS,
+                    IVFPQ_MIN_VECTORS, CALIBRATION_QUERIES, CALIBRATION_K, INDEX_COMPRESSION, RERANK_OVERFETCH)
+
+NPROBE_STEPS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+EF_SEARCH_STEPS = [16, 32, 64, 128, 256, 512]
+OVERFETCH_STEPS = [2, 4, 8, 16, 32, 64]
+LATENCY_SAMPLE = 32
+COMPRESSIONS = ("none", "sq8", "pq", "binary")
+
+
+def ivf_nlist(num_vectors: int) -> int:
+    # ~4*sqrt(n) lists, keeping at least 39 training points per centroid as FAISS expects.
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def pq_subquantizers(dim: int) -> int:
+    m = max(1, dim // 16)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def pq_nbits(num_vectors: int) -> int:
+    # 2^nbits centroids per sub-quantizer need ~39 training points each.
+    return max(1, min(8, int(math.log2(max(2, num_vectors // 39)))))
+
+
+def compression_params(compression: str, num_vectors: int, dim: int) -> Dict[str, Any]:
+    if compression == "pq":
+        return {"compression": "pq", "pq_m": pq_subquantizers(dim), "pq_nbits": pq_nbits(num_vectors)}
+    if compression in ("sq8", "binary"):
+        return {"compression": compression}
+    return {}
+
+
+def build_params(family: str, num_vectors: int, dim: int) -> Dict[str, Any]:
+    if family == "flat":
+        return {}
+    if family == "ivf":
+        return {"nlist": ivf_nlist(num_vectors)}
+    if family == "ivfpq":
+        return {"nlist": ivf_nlist(num_vectors), "m": pq_subquantizers(dim), "nbits": 8}
+    if family == "hnsw":
+        return {"M": 32, "efConstruction": 80}
+    raise ValueError(f"Unknown index family: {family}")
+
+
+def create_index(family: str, dim: int, params: Dict[str, Any]):
+    compression = params.get("compression", "none")
+    if compression == "binary":
+        # Sign bits compared by Hamming distance; exhaustive, as 1 bit/dim scans fast enough.
+        return faiss.IndexBinaryFlat(dim)
+    if compression in ("sq8", "pq"):
+        codes = "SQ8" if compression == "sq8" else f"PQ{params['pq_m']}x{params['pq_nbits']}"
+        if family == "flat":
+            spec = codes
+        elif family in ("ivf", "ivfpq"):
+            spec = f"IVF{params['nlist']},{codes}"
+        elif family == "hnsw":
+            spec = f"HNSW{params['M']},{codes}" if compression == "sq8" else f"HNSW{params['M']}_{codes}"
+        else:
+            raise ValueError(f"Unknown index family: {family}")
+        return faiss.index_factory(dim, spec, faiss.METRIC_INNER_PRODUCT)
+    if family == "flat":
+        return faiss.IndexFlatIP(dim)
+    if family == "ivf":
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFFlat(quantizer, dim, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+    if family == "ivfpq":
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFPQ(quantizer, dim, params["nlist"], params["m"], params["nbits"],
+                                faiss.METRIC_INNER_PRODUCT)
+    if family == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["M"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params["efConstruction"]
+        return index
+    raise ValueError(f"Unknown index family: {family}")
+
+
+def is_binary(index) -> bool:
+    return isinstance(index, faiss.IndexBinary)
+
+
+def with_ids(index):
+    # Labels every vector with its docstore key instead of its insertion row, so keys survive
+    # compaction. Must wrap the index while it is still empty.
+    return faiss.IndexBinaryIDMap(index) if is_binary(index) else faiss.IndexIDMap(index)
+
+
+def has_ids(index) -> bool:
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexBinaryIDMap))
+
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+def train_index(index, embeddings: np.ndarray):
+    if not index.is_trained:
+        index.train(binarize(embeddings) if is_binary(index) else embeddings)
+
+
+def add_vectors(index, embeddings: np.ndarray, ids: np.ndarray = None):
+    if ids is None:
+        ids = np.arange(index.ntotal, index.ntotal + len(embeddings), dtype="int64")
+    index.add_with_ids(binarize(embeddings) if is_binary(index) else embeddings, np.asarray(ids, dtype="int64"))
+
+
+def index_bytes(index) -> int:
+    data = faiss.serialize_index_binary(index) if is_binary(index) else faiss.serialize_index(index)
+    return int(data.nbytes)
+
+
+def write_index(index, path: str):
+    if is_binary(index):
+        faiss.write_index_binary(index, path)
+    else:
+        faiss.write_index(index, path)
+
+
+def read_index(path: str, meta: Dict[str, Any]):
+    if meta.get("build_params", {}).get("compression") == "binary":
+        return faiss.read_index_binary(path)
+    return faiss.read_index(path)
+
+
+def rerank(vectors: np.ndarray, queries: np.ndarray, candidates: np.ndarray, k: int,
+           keys: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    # Exact inner products against the float vectors for each query's candidates. keys[i] is the
+    # id of vectors row i (sorted); without it ids are taken to be row numbers.
+    scores = np.full((len(queries), k), -np.inf, dtype="float32")
+    ids = np.full((len(queries), k), -1, dtype="int64")
+    for i, (query, row) in enumerate(zip(queries, candidates)):
+        row = np.unique(row[row >= 0])
+        if not len(row):
+            continue
+        rows = row if keys is None else np.searchsorted(keys, row)
+        exact = np.asarray(vectors[rows], dtype="float32") @ query
+        top = np.argsort(-exact)[:k]
+        scores[i, :len(top)] = exact[top]
+        ids[i, :len(top)] = row[top]
+    return scores, ids
+
+
+def search_codes(index, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    return index.search(binarize(queries) if is_binary(index) else queries, k)
+
+
+def search_index(index, queries: np.ndarray, k: int, vectors: np.ndarray = None,
+                 overfetch: int = RERANK_OVERFETCH, keys: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    if vectors is None:
+        return search_codes(index, queries, k)
+    # Compressed codes only pick overfetch x k candidates; those are re-scored exactly.
+    _, candidates = search_codes(index, queries, min(k * overfetch, index.ntotal))
+    return rerank(vectors, queries, candidates, k, keys)
+
+
+def search_param_steps(family: str, index, compressed: bool = False) -> List[Tuple[str, int]]:
+    if compressed and family == "flat":
+        # An exhaustive scan over codes has no knob of its own; how many candidates get re-scored is the trade-off.
+        return [("rerank_overfetch", n) for n in OVERFETCH_STEPS]
+    if family in ("ivf", "ivfpq"):
+        nlist = faiss.extract_index_ivf(index).nlist
+        return [("nprobe", n) for n in NPROBE_STEPS if n <= nlist] or [("nprobe", nlist)]
+    if family == "hnsw":
+        return [("efSearch", ef) for ef in EF_SEARCH_STEPS]
+    return []
+
+
+def apply_search_params(index, params: Dict[str, Any]):
+    if not params:
+        return index
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        # rerank_overfetch is applied at search time, not a FAISS parameter.
+        if name != "rerank_overfetch":
+            space.set_index_parameter(index, name, value)
+    return index
+
+
+def single_query_latency_ms(index, queries: np.ndarray, k: int, vectors: np.ndarray = None,
+                            overfetch: int = RERANK_OVERFETCH, keys: np.ndarray = None) -> float:
+    sample = queries[:LATENCY_SAMPLE]
+    started = time.perf_counter()
+    for row in sample:
+        search_index(index, row.reshape(1, -1), k, vectors, overfetch, keys)
+    return (time.perf_counter() - started) * 1000 / max(1, len(sample))
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t[t >= 0])) for f, t in zip(found, truth))
+    return hits / max(1, int((truth >= 0).sum()))
+
+
+class IndexPlan:
+    def __init__(self, family: str, index, build_params: Dict[str, Any], search_params: Dict[str, Any],
+                 calibration: Dict[str, Any]):
+        self.family = family
+        self.index = index
+        self.build_params = build_params
+        self.search_params = search_params
+        self.calibration = calibration
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "index_type": self.family,
+            "build_params": self.build_params,
+            "search_params": self.search_params,
+            "calibration": self.calibration,
+        }
+
+
+def choose_family(num_vectors: int, flat_latency_ms: float) -> str:
+    if INDEX_FAMILY != "auto":
+        return INDEX_FAMILY
+    if num_vectors < FLAT_MAX_VECTORS or flat_latency_ms <= INDEX_LATENCY_TARGET_MS:
+        return "flat"
+    if num_vectors >= IVFPQ_MIN_VECTORS:
+        return "ivfpq"
+    return "ivf"
+
+
+def calibrate(family: str, index, queries: np.ndarray, truth: np.ndarray, k: int,
+              vectors: np.ndarray = None, keys: np.ndarray = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    steps = search_param_steps(family, index, vectors is not None)
+    if not steps:
+        recall = recall_at_k(search_index(index, queries, k, vectors, keys=keys)[1], truth)
+        return {}, {"recall": round(recall, 4),
+                    "latency_ms": round(single_query_latency_ms(index, queries, k, vectors, keys=keys), 4)}
+
+    def sweep(candidates: List[Dict[str, Any]]):
+        trials = []
+        for params in candidates:
+            apply_search_params(index, params)
+            overfetch = params.get("rerank_overfetch", RERANK_OVERFETCH)
+            recall = recall_at_k(search_index(index, queries, k, vectors, overfetch, keys)[1], truth)
+            latency = single_query_latency_ms(index, queries, k, vectors, overfetch, keys)
+            trials.append((params, {"recall": round(recall, 4), "latency_ms": round(latency, 4)}))
+            # Search parameters only trade latency for recall, so stop at the first one that is good enough.
+            if recall >= INDEX_TARGET_RECALL:
+                break
+        # When the target is out of reach (e.g. PQ quantisation error), take the cheapest setting near the plateau.
+        best_recall = max(stats["recall"] for _, stats in trials)
+        return next(t for t in trials if t[1]["recall"] >= min(INDEX_TARGET_RECALL, best_recall - 0.01))
+
+    overfetch = {"rerank_overfetch": RERANK_OVERFETCH} if vectors is not None else {}
+    chosen = sweep([{**overfetch, name: value} for name, value in steps])
+    if overfetch and "rerank_overfetch" not in dict(steps) and chosen[1]["recall"] < INDEX_TARGET_RECALL:
+        # Coarse search is at its plateau; re-scoring more candidates is what recovers codec error.
+        chosen = sweep([chosen[0]] + [{**chosen[0], "rerank_overfetch": n} for n in OVERFETCH_STEPS if n > RERANK_OVERFETCH])
+    apply_search_params(index, chosen[0])
+    return chosen
+
+
+def memory_report(index, num_vectors: int, dim: int) -> Dict[str, Any]:
+    float_bytes = num_vectors * dim * 4
+    size = index_bytes(index)
+    return {"index_bytes": size, "float_bytes": float_bytes,
+            "compression_ratio": round(float_bytes / size, 2) if size else None}
+
+
+def plan_index(embeddings: np.ndarray, keys: np.ndarray = None) -> IndexPlan:
+    # keys are the docstore keys of the embedding rows; the planned index is labelled with them.
+    num_vectors, dim = embeddings.shape
+    keys = np.arange(num_vectors, dtype="int64") if keys is None else np.asarray(keys, dtype="int64")
+    k = max(1, min(CALIBRATION_K, num_vectors))
+    rng = np.random.default_rng(0)
+    sample = rng.choice(num_vectors, size=min(CALIBRATION_QUERIES, num_vectors), replace=False)
+    queries = np.ascontiguousarray(embeddings[np.sort(sample)])
+
+    flat = with_ids(faiss.IndexFlatIP(dim))
+    add_vectors(flat, embeddings, keys)
+    _, truth = flat.search(queries, k)
+    flat_latency = single_query_latency_ms(flat, queries, k)
+
+    family = choose_family(num_vectors, flat_latency)
+    if INDEX_COMPRESSION not in COMPRESSIONS:
+        raise ValueError(f"Unknown index compression: {INDEX_COMPRESSION}. Choose from {COMPRESSIONS}")
+    compressed = INDEX_COMPRESSION != "none"
+    if family == "flat" and not compressed:
+        calibration = {"recall": 1.0, "latency_ms": round(flat_latency, 4)}
+        return IndexPlan("flat", flat, {}, {}, {**calibration, "flat_latency_ms": round(flat_latency, 4),
+                                                 "queries": len(queries), "k": k,
+                                                 "memory": memory_report(flat, num_vectors, dim)})
+
+    if INDEX_COMPRESSION == "binary":
+        candidates = ["flat"]
+    elif INDEX_FAMILY != "auto" or family == "ivfpq":
+        candidates = [family]
+    else:
+        candidates = [family, "hnsw"]
+    # Compressed indexes are calibrated on what retrieval serves: code search plus exact re-score.
+    vectors = embeddings if compressed else None
+    plans = []
+    for candidate in candidates:
+        params = {**build_params(candidate, num_vectors, dim), **compression_params(INDEX_COMPRESSION, num_vectors, dim)}
+        index = with_ids(create_index(candidate, dim, params))
+        train_index(index, embeddings)
+        add_vectors(index, embeddings, keys)
+        search_params, calibration = calibrate(candidate, index, queries, truth, k, vectors, keys)
+        calibration.update({"flat_latency_ms": round(flat_latency, 4), "queries": len(queries), "k": k,
+                            "target_recall": INDEX_TARGET_RECALL, "latency_target_ms": INDEX_LATENCY_TARGET_MS,
+                            "memory": memory_report(index, num_vectors, dim)})
+        if compressed:
+            calibration["codes_recall"] = round(recall_at_k(search_codes(index, queries, k)[1], truth), 4)
+        plan = IndexPlan(candidate, index, params, search_params, calibration)
+        plans.append(plan)
+        print(f"[IndexPolicy] {candidate} {params} {search_params}: recall@{k}={calibration['recall']} "
+              f"latency={calibration['latency_ms']}ms (flat {flat_latency:.3f}ms) "
+              f"index={calibration['memory']['index_bytes']}B vs float {calibration['memory']['float_bytes']}B")
+        if calibration["recall"] >= INDEX_TARGET_RECALL and calibration["latency_ms"] <= INDEX_LATENCY_TARGET_MS:
+            return plan
+    # No candidate met both targets: keep the one with the best recall.
+    return max(plans, key=lambda p: (p.calibration["recall"], -p.calibration["latency_ms"]))
@@ -5,86 +5,217 @@ import numpy as np
 from pathlib import Path
 import json
 from datetime import datetime
+from typing import Dict, List, Tuple
+from index_policy import (plan_index, apply_search_params, IndexPlan, train_index, add_vectors,
+                          write_index, read_index, with_ids)
+from segments import Manifest, write_json
+from config import RETRAIN_IMBALANCE_THRESHOLD, RETRAIN_ADDED_SHARE, RETRAIN_MIN_VECTORS
 
+META_KEYS = ("index_type", "build_params", "search_params", "calibration", "trained_count")
+DELTA_META = {"index_type": "flat", "build_params": {}, "search_params": {}}
+
+
+def list_stats(index) -> Dict[str, float]:
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except (RuntimeError, TypeError):
+        return {}
+    sizes = np.array([ivf.invlists.list_size(i) for i in range(ivf.nlist)], dtype="float64")
+    if not sizes.sum():
+        return {}
+    # Same definition as faiss InvertedLists::imbalance_factor: 1.0 means perfectly even lists.
+    return {"imbalance": round(float(ivf.nlist * (sizes ** 2).sum() / sizes.sum() ** 2), 4),
+            "largest_list": int(sizes.max()), "empty_lists": int((sizes == 0).sum())}
+
+
+# The index is a list of sealed segments on disk plus one open segment in memory that takes the
+# rows added since the last save. save() seals the open segment (a small exact delta after an
+# upload, or the whole planned index after a build or retrain) and publishes a version listing
+# the live segments; sealed segments are never rewritten, only replaced by merges.
 class Indexer:
-    def __init__(self, index_dir: str):
+    def __init__(self, index_dir: str, embed_model: str = None, shard: Tuple[int, int] = None):
         self.index_dir = Path(index_dir)
+        self.embed_model = embed_model
+        # (shard id, shard count) when this indexer holds one partition of a sharded index.
+        self.shard = shard
         self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = Manifest(self.index_dir)
+        # Metadata of the sealed segments in key order; their vectors stay on disk.
+        self.segments: List[dict] = []
         self.index = None
         self.dim = None
+        self.index_meta = {}
 
-    def build(self, embeddings: np.ndarray):
+    @property
+    def ntotal(self) -> int:
+        return sum(segment["count"] for segment in self.segments) + (self.index.ntotal if self.index is not None else 0)
+
+    @property
+    def loaded(self) -> bool:
+        return self.dim is not None
+
+    def build(self, embeddings: np.ndarray, keys: np.ndarray = None):
         print(f"Building new index with shape: {embeddings.shape}")
         if embeddings.ndim != 2:
             raise ValueError("Embeddings must be 2D array [n, dim].")
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
         self.dim = embeddings.shape[1]
-        num_vectors = embeddings.shape[0]
-
-        if num_vectors < 100:  
-            self.index = faiss.IndexFlatIP(self.dim)
-            self.index.add(embeddings)
-            print(f"Built Flat index with {self.index.ntotal} vectors.")
-        else:
-            nlist = min(100, num_vectors // 4) #change it to dynamic dont fix the centroids
-            quantizer = faiss.IndexFlatIP(self.dim)
-            self.index = faiss.IndexIVFFlat(quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
-            self.index.train(embeddings)
-            self.index.add(embeddings)
-            print(f"[Indexer] Built IVF index with nlist={nlist} and {self.index.ntotal} vectors.")
 
+        return self.swap(plan_index(embeddings, keys))
+
+    def swap(self, plan: IndexPlan, trained_count: int = None):
+        # The plan covers every row, so it replaces all sealed segments once saved.
+        self.segments = []
+        self.index = plan.index
+        self.dim = plan.index.d
+        trained_count = plan.index.ntotal if trained_count is None else trained_count
+        self.index_meta = {**plan.meta(), "trained_count": trained_count}
+        print(f"[Indexer] Built {plan.family} index {plan.build_params} search={plan.search_params} "
+              f"with {self.index.ntotal} vectors.")
         return self.index
 
-    def add(self, embeddings: np.ndarray):
-        if self.index is None:
+    def replace_segments(self, segment_ids: List[str], plan: IndexPlan) -> dict:
+        # A merge: one sealed segment takes the place of the adjacent segments it was planned from.
+        segment = self._seal(plan.index, {**plan.meta(), "trained_count": plan.index.ntotal})
+        kept = [s for s in self.segments if s["id"] not in segment_ids]
+        self.segments = sorted(kept + [segment], key=lambda s: s["key_start"])
+        return segment
+
+    def drift_stats(self) -> dict:
+        ntotal = self.ntotal
+        if not ntotal:
+            return {}
+        # The largest segment is the trained base; deltas and merged segments count as added rows.
+        parts = list(self.segments)
+        if self.index is not None and self.index.ntotal:
+            parts.append({**self.index_meta, "count": self.index.ntotal, **list_stats(self.index)})
+        base = max(parts, key=lambda s: s["count"])
+        trained_count = int(base.get("trained_count", base["count"]))
+        stats = {
+            "index_type": base.get("index_type"),
+            "ntotal": ntotal,
+            "segments": len(parts),
+            "trained_count": trained_count,
+            "added_share": round((ntotal - trained_count) / ntotal, 4),
+        }
+        stats.update({key: base[key] for key in ("imbalance", "largest_list", "empty_lists") if key in base})
+        return stats
+
+    def needs_retrain(self, stats: dict = None) -> bool:
+        stats = stats or self.drift_stats()
+        if not stats or stats["ntotal"] < RETRAIN_MIN_VECTORS:
+            return False
+        return (stats.get("imbalance", 1.0) > RETRAIN_IMBALANCE_THRESHOLD
+                or stats["added_share"] > RETRAIN_ADDED_SHARE)
+
+    def add(self, embeddings: np.ndarray, keys: np.ndarray = None):
+        if not self.loaded:
             raise RuntimeError("Index not loaded. Load or build first.")
-        print(f"[Indexer] Adding {embeddings.shape[0]} embeddings to existing index.")
-        if isinstance(self.index, faiss.IndexIVFFlat) and not self.index.is_trained:
-            self.index.train(embeddings)
-        self.index.add(embeddings)
-        print(f"[Indexer] Index now contains {self.index.ntotal} vectors.")
+        if self.index is None:
+            # A fresh exact delta; small enough to search without a trained structure until merged.
+            self.index = with_ids(faiss.IndexFlatIP(self.dim))
+            self.index_meta = dict(DELTA_META)
+        print(f"[Indexer] Adding {embeddings.shape[0]} embeddings to the open segment.")
+        if keys is None:
+            keys = np.arange(self.ntotal, self.ntotal + len(embeddings), dtype="int64")
+        train_index(self.index, embeddings)
+        add_vectors(self.index, embeddings, keys)
+        print(f"[Indexer] Index now contains {self.ntotal} vectors in {len(self.segments) + 1} segments.")
         return self.index
 
-    def save(self, version: str, docs_added: int):
-        if self.index is None:
-            raise RuntimeError("No index to save.")
+    def _seal(self, index, index_meta: dict) -> dict:
+        segment_id = self.manifest.new_segment_id()
+        ids = faiss.vector_to_array(index.id_map)
+        segment = {
+            "id": segment_id,
+            # Keys are added in ascending order, so segments cover disjoint, adjacent key ranges.
+            "key_start": int(ids.min()) if len(ids) else 0,
+            "key_end": int(ids.max()) + 1 if len(ids) else 0,
+            "count": int(index.ntotal),
+            "dim": self.dim,
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **index_meta,
+            **list_stats(index),
+        }
+        index_path = self.manifest.segment_path(segment_id)
+        write_index(index, str(index_path))
+        write_json(self.manifest.segment_path(segment_id, ".json"), segment)
+        print(f"[Indexer] Sealed segment {segment_id} ({segment['index_type']}, {segment['count']} vectors, "
+              f"{index_path.stat().st_size} bytes)")
+        return segment
 
-        index_path = self.index_dir / f"{version}.index"
-        faiss.write_index(self.index, str(index_path))
-        print(f"[Indexer] Saved FAISS index to {index_path}")
-        print(f"[Indexer] Index file size: {index_path.stat().st_size} bytes")
+    def save(self, version: str, docs_added: int, key_limit: int = None, parts: Dict[str, List[dict]] = None):
+        if not self.loaded:
+            raise RuntimeError("No index to save.")
+        if self.index is not None:
+            if self.index.ntotal:
+                self.segments = sorted(self.segments + [self._seal(self.index, self.index_meta)],
+                                       key=lambda s: s["key_start"])
+            self.index = None
 
         meta = {
             "version": version,
             "dim": self.dim,
             "doc_count": docs_added,
+            "rows": self.ntotal,
+            "segments": [segment["id"] for segment in self.segments],
             "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         }
-        meta_path = self.index_dir / f"{version}.meta.json"
-        meta_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
-        print(f"[Indexer] Saved metadata to {meta_path}")
+        if key_limit is not None:
+            # Every docstore key below key_limit existed when this version was saved; compaction
+            # drops rows, so doc_count alone no longer says which records a version covers.
+            meta["key_limit"] = key_limit
+        if self.embed_model:
+            meta["embed_model"] = self.embed_model
+        if parts:
+            # Lexical and attribute parts (see PartedIndex) published with the segments.
+            meta.update(parts)
+        if self.shard:
+            # doc_count stays the global docstore prefix; rows is this shard's share of it.
+            meta["shard"], meta["shards"] = self.shard
+        self.manifest.publish(meta)
+        removed = self.manifest.collect()
+        print(f"[Indexer] Published {version} with {len(self.segments)} segments to {self.manifest.path}"
+              + (f"; removed {len(removed)} superseded files" if removed else ""))
 
     def load(self, version: str):
+        meta = self.manifest.get(version)
+        if meta is None:
+            return self._load_snapshot(version)
+        self.segments = [self.manifest.read_segment(segment_id) for segment_id in meta["segments"]]
+        self.index = None
+        self.index_meta = {}
+        self.dim = meta["dim"]
+        print(f"[Indexer] Loaded index version {version}: {len(self.segments)} segments, {self.ntotal} vectors")
+        return meta
+
+    def _load_snapshot(self, version: str):
+        # Versions written before segments are one full index; it is loaded as the open segment
+        # and sealed into the segment layout by the next save.
         index_path = self.index_dir / f"{version}.index"
         meta_path = self.index_dir / f"{version}.meta.json"
         if not index_path.exists() or not meta_path.exists():
             raise FileNotFoundError(f"Index files for {version} not found in {self.index_dir}")
-        self.index = faiss.read_index(str(index_path))
         meta = json.loads(meta_path.read_text())
+        self.segments = []
+        self.index = read_index(str(index_path), meta)
         self.dim = meta["dim"]
-        print(f"[Indexer] Loaded index version {version} with dimension {self.dim}")
+        self.index_meta = {key: meta[key] for key in META_KEYS if key in meta}
+        apply_search_params(self.index, meta.get("search_params", {}))
+        print(f"[Indexer] Loaded snapshot index version {version} with dimension {self.dim}")
         return meta
 
-    def load_latest(self):
-        versions = sorted(self.index_dir.glob("*.meta.json"))
-        if not versions:
+    def latest_meta(self):
+        meta = self.manifest.latest()
+        if meta is not None:
+            return meta
+        legacy = self.manifest.legacy_versions()
+        if not legacy:
             raise FileNotFoundError(f"No index versions found in {self.index_dir}")
+        return json.loads((self.index_dir / f"{legacy[-1]}.meta.json").read_text())
 
-        latest_meta_path = versions[-1]
-        meta = json.loads(latest_meta_path.read_text())
-        version = meta["version"]
+    def next_version(self) -> str:
+        return self.manifest.next_version()
 
-        index_path = self.index_dir / f"{version}.index"
-        self.index = faiss.read_index(str(index_path))
-        self.dim = meta["dim"]
-        print(f"Loaded latest index version {version} with dimension {self.dim}")
-        return meta
\ No newline at end of file
+    def load_latest(self):
+        return self.load(self.latest_meta()["version"])
@@ -0,0 +1,108 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+import numpy as np
+from config import INGEST_BATCH_SIZE, INGEST_QUEUE_DEPTH
+
+DONE = object()
+
+
+def batched(items: Iterable[Any], size: int = INGEST_BATCH_SIZE) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Three overlapping stages joined by bounded queues: a reader thread parses documents into
+# batches, the caller's thread encodes them, and a writer thread commits each encoded batch.
+# At most INGEST_QUEUE_DEPTH batches wait between stages, so memory does not grow with file size.
+class IngestPipeline:
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], commit: Callable[[List[Dict[str, Any]], np.ndarray], None],
+                 batch_size: int = INGEST_BATCH_SIZE, queue_depth: int = INGEST_QUEUE_DEPTH):
+        self.encode = encode
+        self.commit = commit
+        self.batch_size = batch_size
+        self.queue_depth = queue_depth
+
+    def run(self, documents: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        parsed = queue.Queue(maxsize=self.queue_depth)
+        encoded = queue.Queue(maxsize=self.queue_depth)
+        stop = threading.Event()
+        errors = []
+        stats = {"documents": 0, "batches": 0, "encode_seconds": 0.0}
+        started = time.perf_counter()
+
+        def put(q: queue.Queue, item) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read():
+            try:
+                for batch in batched(documents, self.batch_size):
+                    if not put(parsed, batch):
+                        return
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(parsed, DONE)
+
+        def write():
+            while True:
+                item = encoded.get()
+                if item is DONE:
+                    return
+                if stop.is_set():
+                    continue
+                try:
+                    batch, embeddings = item
+                    self.commit(batch, embeddings)
+                    stats["documents"] += len(batch)
+                    stats["batches"] += 1
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+
+        reader = threading.Thread(target=read, name="ingest-reader", daemon=True)
+        writer = threading.Thread(target=write, name="ingest-writer", daemon=True)
+        reader.start()
+        writer.start()
+        try:
+            while not stop.is_set():
+                try:
+                    batch = parsed.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if batch is DONE:
+                    break
+                encode_started = time.perf_counter()
+                embeddings = self.encode([doc["text"] for doc in batch])
+                stats["encode_seconds"] += time.perf_counter() - encode_started
+                if not put(encoded, (batch, embeddings)):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            encoded.put(DONE)
+            writer.join()
+            reader.join()
+
+        if errors:
+            raise errors[0]
+        stats["encode_seconds"] = round(stats["encode_seconds"], 3)
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        return stats
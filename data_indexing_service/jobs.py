@@ -0,0 +1,123 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from config import JOB_COALESCE_SECONDS, JOB_HISTORY_SIZE
+
+
+def now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class IndexJob:
+    def __init__(self, filename: str, path: str = None, job_id: str = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.filename = filename
+        # The upload's own staged copy, so a later upload of the same name cannot change it mid-read.
+        self.path = path
+        self.status = "queued"
+        self.documents_added = 0
+        self.documents_deduplicated = 0
+        self.version = None
+        self.coalesced_with: List[str] = []
+        self.error = None
+        self.created_at = now()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "documents_added": self.documents_added,
+            "documents_deduplicated": self.documents_deduplicated,
+            "version": self.version,
+            "coalesced_with": self.coalesced_with,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# A single worker drains every queued upload into one run, so a burst of uploads costs one
+# embedding pass and one version bump instead of one per file.
+class IndexJobQueue:
+    def __init__(self, run: Callable[[List[IndexJob]], Optional[str]], coalesce_seconds: float = JOB_COALESCE_SECONDS,
+                 history_size: int = JOB_HISTORY_SIZE):
+        self.run = run
+        self.coalesce_seconds = coalesce_seconds
+        self.history_size = history_size
+        self.jobs: "OrderedDict[str, IndexJob]" = OrderedDict()
+        self.pending: List[IndexJob] = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name="index-jobs", daemon=True)
+            self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, filename: str, path: str = None, job_id: str = None) -> IndexJob:
+        job = IndexJob(filename, path, job_id)
+        with self._cond:
+            self.jobs[job.id] = job
+            self.pending.append(job)
+            self._evict()
+            self._cond.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        with self._cond:
+            return self.jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"pending": len(self.pending), "jobs": counts}
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[: max(0, len(self.jobs) - self.history_size)]:
+            del self.jobs[job_id]
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self.pending:
+                    self._cond.wait()
+            # Let the rest of a burst arrive before taking the batch.
+            time.sleep(self.coalesce_seconds)
+            with self._cond:
+                batch, self.pending = self.pending, []
+                for job in batch:
+                    job.status = "running"
+                    job.started_at = now()
+                    job.coalesced_with = [other.id for other in batch if other is not job]
+
+            print(f"[IndexJobs] Running {len(batch)} coalesced upload(s): {[job.filename for job in batch]}")
+            try:
+                version = self.run(batch)
+                status, error = "done", None
+            except Exception as e:
+                print(f"[IndexJobs] Indexing run failed: {e}")
+                version, status, error = None, "failed", str(e)
+
+            with self._cond:
+                for job in batch:
+                    job.status = status
+                    job.version = version
+                    job.error = error
+                    job.finished_at = now()
+                self._evict()
@@ -0,0 +1,106 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+import numpy as np
+from segments import PartedIndex
+
+# Keeps codes such as "kc-1042" or "2.9" as single terms. Must match retrieval_service/lexical.py.
+TOKEN_PATTERN = re.compile(r"\w+(?:[-_.]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# Inverted index over one docstore key range [key_start, key_end), stored as CSR postings for the
+# retrieval service's BM25 search. doc_lens is indexed by key - key_start.
+class LexicalPart:
+    def __init__(self, key_start: int = 0):
+        self.key_start = int(key_start)
+        self.postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self.doc_lens: List[int] = []
+
+    @property
+    def key_end(self) -> int:
+        return self.key_start + len(self.doc_lens)
+
+    @property
+    def count(self) -> int:
+        return sum(1 for length in self.doc_lens if length)
+
+    def meta(self) -> Dict[str, Any]:
+        return {}
+
+    def add(self, keys: Iterable[int], texts: Iterable[str]):
+        for key, text in zip(keys, texts):
+            if int(key) < self.key_end:
+                raise ValueError(f"Lexical index already covers key {key}")
+            # Keys compacted out of the docstore stay as zero-length holes.
+            self.doc_lens.extend([0] * (int(key) - self.key_end))
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                keys_for_term, tfs = self.postings.setdefault(term, ([], []))
+                keys_for_term.append(int(key))
+                tfs.append(tf)
+            self.doc_lens.append(sum(counts.values()))
+
+    def drop(self, keys: Iterable[int]):
+        dropped = {int(key) for key in keys}
+        for term, (keys_for_term, tfs) in list(self.postings.items()):
+            kept = [(key, tf) for key, tf in zip(keys_for_term, tfs) if key not in dropped]
+            if len(kept) == len(keys_for_term):
+                continue
+            if kept:
+                self.postings[term] = ([key for key, _ in kept], [tf for _, tf in kept])
+            else:
+                del self.postings[term]
+        for key in dropped:
+            if self.key_start <= key < self.key_end:
+                self.doc_lens[key - self.key_start] = 0
+
+    def extend(self, other: "LexicalPart"):
+        # other covers the keys after this part's.
+        self.doc_lens.extend([0] * (other.key_start - self.key_end))
+        self.doc_lens.extend(other.doc_lens)
+        for term, (keys_for_term, tfs) in other.postings.items():
+            own_keys, own_tfs = self.postings.setdefault(term, ([], []))
+            own_keys.extend(keys_for_term)
+            own_tfs.extend(tfs)
+
+    def save(self, path: Path) -> Path:
+        terms = sorted(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        offsets[1:] = np.cumsum([len(self.postings[term][0]) for term in terms])
+        keys = np.fromiter((key for term in terms for key in self.postings[term][0]), dtype="int64", count=offsets[-1])
+        tfs = np.fromiter((tf for term in terms for tf in self.postings[term][1]), dtype="int32", count=offsets[-1])
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, terms=np.array(terms, dtype=str), offsets=offsets, keys=keys, tfs=tfs,
+                     doc_lens=np.array(self.doc_lens, dtype="int32"), key_start=np.int64(self.key_start))
+        os.replace(tmp_path, path)
+        print(f"[LexicalIndex] Saved {len(terms)} terms over keys {self.key_start}-{self.key_end} to {path.name}")
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "LexicalPart":
+        with np.load(path) as data:
+            # Per-version files from before parts start at key 0.
+            part = cls(int(data["key_start"]) if "key_start" in data.files else 0)
+            offsets, keys, tfs = data["offsets"], data["keys"], data["tfs"]
+            for i, term in enumerate(data["terms"].tolist()):
+                start, end = offsets[i], offsets[i + 1]
+                part.postings[term] = (keys[start:end].tolist(), tfs[start:end].tolist())
+            part.doc_lens = data["doc_lens"].tolist()
+        return part
+
+
+# BM25 postings grown batch by batch with the FAISS index and sealed into segments/<id>.lexical.npz
+# parts at every save.
+class LexicalIndex(PartedIndex):
+    kind = "lexical"
+    part_type = LexicalPart
@@ -0,0 +1,133 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+import numpy as np
+from docstore import DocStore
+from indexer import Indexer
+from index_policy import plan_index
+from segments import PartedIndex
+from vectors import VectorStore
+from config import SEGMENT_MAX_COUNT, SEGMENT_MERGE_FACTOR
+
+
+def pick_merge(segments: List[dict]) -> Optional[List[dict]]:
+    # Tiered merging: past SEGMENT_MAX_COUNT segments, the adjacent run of SEGMENT_MERGE_FACTOR
+    # holding the fewest rows becomes one, so upload deltas merge with each other long before
+    # anything rewrites the large base segment.
+    if len(segments) <= SEGMENT_MAX_COUNT:
+        return None
+    factor = min(len(segments), max(2, SEGMENT_MERGE_FACTOR))
+    sizes = [segment["count"] for segment in segments]
+    start = min(range(len(segments) - factor + 1), key=lambda i: sum(sizes[i:i + factor]))
+    return segments[start:start + factor]
+
+
+# Merges small segments in the background, for the main index, every shard and the lexical and
+# attribute parts. The merged segment is planned (and calibrated) from the stored vectors, and
+# merged parts are joined from their files, outside the lock; swapping it in only rewrites the
+# manifest, and the replaced segments are left to retention.
+class SegmentMerger:
+    def __init__(self, indexers: List[Indexer], docstore: DocStore, vector_store: VectorStore,
+                 lock: threading.Lock, publish: Callable[[], str], parts: List[PartedIndex] = ()):
+        self.indexers = indexers
+        self.parts = list(parts)
+        self.docstore = docstore
+        self.vector_store = vector_store
+        self.lock = lock
+        self.publish = publish
+        self.running = False
+        self.last_run: Optional[dict] = None
+        self._thread = None
+
+    def maybe_schedule(self) -> bool:
+        if self.running:
+            return False
+        jobs = [(indexer, window) for indexer in self.indexers if (window := pick_merge(indexer.segments))]
+        jobs += [(store, window) for store in self.parts if (window := pick_merge(store.parts))]
+        if not jobs:
+            return False
+        print(f"[SegmentMerger] Merging {sum(len(window) for _, window in jobs)} segments and parts in background")
+        self.running = True
+        self._thread = threading.Thread(target=self._run, args=(jobs,), name="segment-merger", daemon=True)
+        self._thread.start()
+        return True
+
+    def status(self) -> dict:
+        return {"running": self.running, "last_run": self.last_run,
+                "segments": [len(indexer.segments) for indexer in self.indexers],
+                "parts": {store.kind: len(store.parts) for store in self.parts}}
+
+    def _rows(self, indexer: Indexer, window: List[dict]) -> np.ndarray:
+        keys = self.docstore.keys
+        rows = np.flatnonzero((keys >= window[0]["key_start"]) & (keys < window[-1]["key_end"]))
+        if indexer.shard:
+            shard_id, shards = indexer.shard
+            rows = rows[keys[rows] % shards == shard_id]
+        return rows
+
+    def _merge_parts(self, store: PartedIndex, window: List[dict]) -> Optional[dict]:
+        part_ids = [part["id"] for part in window]
+        try:
+            part = store.combine(window)
+        except FileNotFoundError:
+            part = None
+        with self.lock:
+            if part is None or not set(part_ids) <= {p["id"] for p in store.parts}:
+                # Compaction rewrote these parts meanwhile.
+                print(f"[SegmentMerger] {store.kind} parts {part_ids} changed while merging; skipped")
+                return None
+            part_meta = store.replace_parts(part_ids, part)
+        return {"kind": store.kind, "merged": part_ids, "into": part_meta["id"], "rows": part_meta["count"]}
+
+    def _run(self, jobs):
+        started = time.perf_counter()
+        merged = []
+        try:
+            for indexer, window in jobs:
+                if isinstance(indexer, PartedIndex):
+                    if (record := self._merge_parts(indexer, window)) is not None:
+                        merged.append(record)
+                    continue
+                segment_ids = [segment["id"] for segment in window]
+                with self.lock:
+                    generation = self.docstore.generation
+                    rows = self._rows(indexer, window)
+                    keys = self.docstore.keys[rows].copy()
+                    total = len(self.docstore)
+                expected = sum(segment["count"] for segment in window)
+                if len(keys) != expected:
+                    raise RuntimeError(f"segments {segment_ids} hold {expected} rows but the docstore has {len(keys)}")
+                # Vectors are append-only and compaction replaces the file, so the mapping stays valid.
+                vectors = np.array(self.vector_store.read(total)[rows])
+                plan = plan_index(vectors, keys)
+
+                with self.lock:
+                    current = {segment["id"] for segment in indexer.segments}
+                    if self.docstore.generation != generation or not set(segment_ids) <= current:
+                        # A retrain or compaction replaced these segments meanwhile.
+                        print(f"[SegmentMerger] Segments {segment_ids} changed while merging; skipped")
+                        continue
+                    segment = indexer.replace_segments(segment_ids, plan)
+                merged.append({"kind": "index", "index_dir": str(indexer.index_dir), "merged": segment_ids,
+                               "into": segment["id"], "rows": segment["count"], "index_type": segment["index_type"]})
+
+            version = None
+            if merged:
+                with self.lock:
+                    version = self.publish()
+            self.last_run = {
+                "version": version,
+                "merges": merged,
+                "seconds": round(time.perf_counter() - started, 3),
+                "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            print(f"[SegmentMerger] {len(merged)} merges published as {version} in {self.last_run['seconds']}s")
+        except Exception as e:
+            self.last_run = {"error": str(e), "merges": merged,
+                             "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+            print(f"[SegmentMerger] Merge failed: {e}")
+        finally:
+            self.running = False
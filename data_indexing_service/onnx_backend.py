@@ -0,0 +1,140 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List
+import numpy as np
+
+# Runs a SentenceTransformer text model through ONNX Runtime. The first start exports the
+# transformer to ONNX_DIR (and a dynamic int8 copy when ONNX_QUANTIZE is on); later starts
+# only load the exported files.
+
+
+def model_dir(onnx_dir: str, model_name: str) -> Path:
+    return Path(onnx_dir) / model_name.replace("/", "__")
+
+
+def prepare_model(model_name: str, onnx_dir: str, quantize: bool, max_length: int) -> Path:
+    out_dir = model_dir(onnx_dir, model_name)
+    if not (out_dir / "settings.json").exists():
+        # Both services share ONNX_DIR, so the export goes to a private directory and is
+        # renamed into place; whichever finishes second discards its copy.
+        tmp_dir = out_dir.with_name(f"{out_dir.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        export_model(model_name, tmp_dir, max_length)
+        if quantize:
+            quantize_model(tmp_dir)
+        try:
+            tmp_dir.rename(out_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    model_file = out_dir / ("model.int8.onnx" if quantize else "model.onnx")
+    if not model_file.exists():
+        quantize_model(out_dir)
+    return model_file
+
+
+def export_model(model_name: str, out_dir: Path, max_length: int):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    class HiddenStates(torch.nn.Module):
+        # Keyword call with a plain tensor output keeps the traced graph independent of the
+        # transformers version's forward() signature and output classes.
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    print(f"[ONNX] Exporting {model_name} to {out_dir}")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0].auto_model.eval()
+    pooling = st[1].get_pooling_mode_str() if len(st) > 1 and hasattr(st[1], "get_pooling_mode_str") else "cls"
+    normalize = any(type(module).__name__ == "Normalize" for module in st)
+
+    sample = st.tokenizer(["export sample"], return_tensors="pt")
+    with torch.no_grad():
+        # Large models (BGE-M3 is ~2.2 GB in fp32) are written with external weight files.
+        torch.onnx.export(
+            HiddenStates(transformer),
+            (sample["input_ids"], sample["attention_mask"]),
+            str(out_dir / "model.onnx"),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                          "attention_mask": {0: "batch", 1: "sequence"},
+                          "last_hidden_state": {0: "batch", 1: "sequence"}},
+            opset_version=17,
+            dynamo=False,
+        )
+    st.tokenizer.save_pretrained(str(out_dir))
+    settings = {"model_name": model_name, "pooling": pooling, "normalize": normalize,
+                "max_length": min(max_length, st.max_seq_length)}
+    (out_dir / "settings.json").write_text(json.dumps(settings, indent=2), encoding="utf-8")
+
+
+def quantize_model(out_dir: Path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"[ONNX] Quantizing {out_dir / 'model.onnx'} to int8")
+    quantize_dynamic(str(out_dir / "model.onnx"), str(out_dir / "model.int8.onnx"),
+                     weight_type=QuantType.QInt8, use_external_data_format=True)
+
+
+class OnnxEncoder:
+    def __init__(self, model_name: str, onnx_dir: str, quantize: bool = True, intra_op_threads: int = 0,
+                 inter_op_threads: int = 1, max_length: int = 512, batch_size: int = 32):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_file = prepare_model(model_name, onnx_dir, quantize, max_length)
+        out_dir = model_file.parent
+        settings = json.loads((out_dir / "settings.json").read_text(encoding="utf-8"))
+        self.pooling = settings["pooling"]
+        self.normalize = settings["normalize"]
+        self.max_length = settings["max_length"]
+        self.quantized = quantize
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(str(out_dir))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads or (os.cpu_count() or 1)
+        options.inter_op_num_threads = inter_op_threads
+        self.session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        print(f"[ONNX] Loaded {model_file.name} ({self.pooling} pooling, intra_op={options.intra_op_num_threads}, "
+              f"inter_op={inter_op_threads})")
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.tokenize(text))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        # Similar lengths are batched together so little compute goes to padding.
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        out = [None] * len(texts)
+        for start in range(0, len(texts), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            for row, vector in zip(rows, self._encode_batch([texts[i] for i in rows])):
+                out[row] = vector
+        return np.vstack(out).astype("float32")
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        feed = {name: inputs[name].astype("int64") for name in ("input_ids", "attention_mask", "token_type_ids")
+                if name in self.input_names and name in inputs}
+        hidden = self.session.run(["last_hidden_state"], feed)[0]
+        if self.pooling == "mean":
+            mask = inputs["attention_mask"][..., None].astype("float32")
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        else:
+            pooled = hidden[:, 0]
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
@@ -0,0 +1,73 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+import numpy as np
+from docstore import DocStore
+from indexer import Indexer
+from index_policy import plan_index, add_vectors
+from vectors import VectorStore
+
+
+class Retrainer:
+    def __init__(self, indexer: Indexer, vector_store: VectorStore, docstore: DocStore, lock: threading.Lock,
+                 publish: Callable[[], str]):
+        self.indexer = indexer
+        self.vector_store = vector_store
+        self.docstore = docstore
+        self.lock = lock
+        self.publish = publish
+        self.running = False
+        self.last_run: Optional[dict] = None
+        self._thread = None
+
+    def maybe_schedule(self) -> bool:
+        stats = self.indexer.drift_stats()
+        if self.running or not self.indexer.needs_retrain(stats):
+            return False
+        print(f"[Retrainer] Drift detected {stats}; retraining in background")
+        self.running = True
+        self._thread = threading.Thread(target=self._run, args=(stats,), name="index-retrainer", daemon=True)
+        self._thread.start()
+        return True
+
+    def status(self) -> dict:
+        return {"running": self.running, "last_run": self.last_run}
+
+    def _run(self, drift: dict):
+        started = time.perf_counter()
+        try:
+            # Train on a snapshot of the stored vectors; uploads keep using the live index meanwhile.
+            with self.lock:
+                trained_count = self.indexer.ntotal
+                generation = self.docstore.generation
+                keys = self.docstore.keys[:trained_count].copy()
+            vectors = np.array(self.vector_store.read(trained_count))
+            plan = plan_index(vectors, keys)
+
+            with self.lock:
+                if self.docstore.generation != generation:
+                    raise RuntimeError("docstore was compacted while retraining; the compacted index is already fresh")
+                total = self.indexer.ntotal
+                if total > trained_count:
+                    add_vectors(plan.index, np.array(self.vector_store.read(total)[trained_count:]),
+                                self.docstore.keys[trained_count:total])
+                self.indexer.swap(plan, trained_count=trained_count)
+                version = self.publish()
+
+            self.last_run = {
+                "version": version,
+                "drift": drift,
+                "index_type": plan.family,
+                "seconds": round(time.perf_counter() - started, 3),
+                "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            print(f"[Retrainer] Published retrained index {version} in {self.last_run['seconds']}s")
+        except Exception as e:
+            self.last_run = {"error": str(e), "drift": drift,
+                             "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+            print(f"[Retrainer] Retraining failed: {e}")
+        finally:
+            self.running = False
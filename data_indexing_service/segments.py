@@ -0,0 +1,212 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from config import INDEX_RETAIN_VERSIONS, INDEX_RETAIN_SECONDS
+
+MANIFEST = "manifest.json"
+SEGMENT_DIR = "segments"
+# Per-version files written before segments and parts: vN.lexical.npz, vN.attributes.npz and the
+# vN.index/vN.meta.json snapshots.
+VERSION_FILE = re.compile(r"^v(\d+)\.")
+# Manifest entry fields listing a version's lexical and attribute parts (see PartedIndex).
+PART_KINDS = ("lexical", "attributes")
+
+
+def version_number(version: str) -> int:
+    match = re.fullmatch(r"v(\d+)", version or "")
+    return int(match.group(1)) if match else -1
+
+
+def write_json(path: Path, data: Any):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# An index directory holds immutable segments (segments/<id>.index plus <id>.json, each covering
+# one docstore key range) and manifest.json, the catalog of published versions in numeric order.
+# A version is the list of segments to search; publishing one only writes the segments sealed
+# since the last, and retrieval reuses the segments it already has loaded.
+class Manifest:
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        self.path = self.index_dir / MANIFEST
+        self.segment_dir = self.index_dir / SEGMENT_DIR
+        self.versions: List[Dict[str, Any]] = []
+        self.next_segment = 0
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            self.versions = data["versions"]
+            self.next_segment = data["next_segment"]
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self.versions[-1] if self.versions else None
+
+    def get(self, version: str) -> Optional[Dict[str, Any]]:
+        return next((entry for entry in self.versions if entry["version"] == version), None)
+
+    def legacy_versions(self) -> List[str]:
+        versions = [path.name[: -len(".meta.json")] for path in self.index_dir.glob("v*.meta.json")]
+        return sorted((v for v in versions if version_number(v) >= 0 and (self.index_dir / f"{v}.index").exists()),
+                      key=version_number)
+
+    def next_version(self) -> str:
+        numbers = [entry["number"] for entry in self.versions]
+        numbers += [version_number(v) for v in self.legacy_versions()]
+        return f"v{max(numbers, default=0) + 1}"
+
+    def new_segment_id(self) -> str:
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        segment_id = f"s{self.next_segment:06d}"
+        self.next_segment += 1
+        return segment_id
+
+    def segment_path(self, segment_id: str, suffix: str = ".index") -> Path:
+        return self.segment_dir / f"{segment_id}{suffix}"
+
+    def read_segment(self, segment_id: str) -> Dict[str, Any]:
+        return json.loads(self.segment_path(segment_id, ".json").read_text())
+
+    def publish(self, entry: Dict[str, Any]):
+        entry = {**entry, "number": version_number(entry["version"]), "published_at": time.time()}
+        self.versions = sorted([v for v in self.versions if v["version"] != entry["version"]] + [entry],
+                               key=lambda v: v["number"])
+        self._write()
+
+    def _write(self):
+        write_json(self.path, {"versions": self.versions, "next_segment": self.next_segment})
+
+    def collect(self) -> List[Path]:
+        # A version is kept while it is one of the newest INDEX_RETAIN_VERSIONS or younger than
+        # INDEX_RETAIN_SECONDS, so a retrieval replica still serving (or loading) it keeps its
+        # files. Snapshot versions from before segments age by their meta file. Segments and
+        # per-version files that nothing retained uses are deleted.
+        now = time.time()
+        published = {entry["number"]: entry["published_at"] for entry in self.versions}
+        for version in self.legacy_versions():
+            published.setdefault(version_number(version), (self.index_dir / f"{version}.meta.json").stat().st_mtime)
+        newest = set(sorted(published)[-max(1, INDEX_RETAIN_VERSIONS):])
+        live_versions = {number for number, at in published.items() if number in newest or now - at < INDEX_RETAIN_SECONDS}
+        retained = [entry for entry in self.versions if entry["number"] in live_versions]
+        if len(retained) != len(self.versions):
+            self.versions = retained
+            self._write()
+        live_segments = {segment_id for entry in retained for segment_id in entry["segments"]}
+        live_segments |= {part["id"] for entry in retained for kind in PART_KINDS for part in entry.get(kind, [])}
+
+        removed = []
+        if self.segment_dir.exists():
+            removed += [path for path in self.segment_dir.iterdir() if path.name.split(".")[0] not in live_segments]
+        for path in self.index_dir.iterdir():
+            match = VERSION_FILE.match(path.name)
+            if match and int(match.group(1)) not in live_versions:
+                removed.append(path)
+        for path in removed:
+            path.unlink(missing_ok=True)
+        return removed
+
+
+# Lexical postings and filter attributes are stored like the index segments. Each save seals the
+# documents added since the last one into segments/<id>.<kind>.npz. The manifest lists a version's
+# parts (id and key range) and SegmentMerger merges small adjacent ones. A save therefore writes
+# only its delta, and retrieval reuses the parts it has loaded. Subclasses set kind and part_type,
+# an in-memory index over one docstore key range with add, drop, extend, save and load.
+class PartedIndex:
+    kind = ""
+    part_type = None
+
+    def __init__(self, manifest: Manifest):
+        self.manifest = manifest
+        self.parts: List[Dict[str, Any]] = []
+        # Keys added since the last save; sealed into a part by the next one.
+        self.open = self.new_part(0)
+
+    def __len__(self) -> int:
+        # Every key below this is covered by a sealed part or the open one.
+        return self.open.key_end
+
+    def new_part(self, key_start: int):
+        return self.part_type(key_start)
+
+    def read_part(self, path: Path):
+        return self.part_type.load(path)
+
+    def compatible(self, part_meta: Dict[str, Any]) -> bool:
+        return True
+
+    def path(self, part_id: str) -> Path:
+        return self.manifest.segment_path(part_id, f".{self.kind}.npz")
+
+    def reset(self):
+        self.parts = []
+        self.open = self.new_part(0)
+
+    def add(self, keys: Iterable[int], values: Iterable[Any]):
+        self.open.add(keys, values)
+
+    def _seal(self, part) -> Dict[str, Any]:
+        part_id = self.manifest.new_segment_id()
+        part.save(self.path(part_id))
+        return {"id": part_id, "key_start": part.key_start, "key_end": part.key_end, "count": part.count, **part.meta()}
+
+    def seal(self) -> List[Dict[str, Any]]:
+        # The parts to list in the version being saved.
+        if self.open.key_end > self.open.key_start:
+            self.parts.append(self._seal(self.open))
+            self.open = self.new_part(self.open.key_end)
+        return list(self.parts)
+
+    def load(self, version: str) -> bool:
+        self.reset()
+        entry = self.manifest.get(version)
+        if entry is None or self.kind not in entry:
+            # Versions from before parts wrote one vN.<kind>.npz; it becomes the open part, sealed by the next save.
+            path = self.manifest.index_dir / f"{version}.{self.kind}.npz"
+            if not path.exists():
+                return False
+            part = self.read_part(path)
+            if not self.compatible(part.meta()):
+                return False
+            self.open = part
+            return True
+        parts = entry[self.kind]
+        if not all(self.compatible(part) and self.path(part["id"]).exists() for part in parts):
+            # Written with other settings (e.g. FILTER_FIELDS) or incomplete; the caller rebuilds from the docstore.
+            return False
+        self.parts = [dict(part) for part in parts]
+        self.open = self.new_part(parts[-1]["key_end"] if parts else 0)
+        print(f"[{type(self).__name__}] Loaded {len(parts)} parts over {len(self)} keys for {version}")
+        return True
+
+    def drop(self, keys: Iterable[int]):
+        # Compaction: only the parts holding dropped keys are rewritten, each under a new id.
+        dropped = np.unique(np.asarray(list(keys), dtype="int64"))
+        for i, part_meta in enumerate(self.parts):
+            inside = dropped[(dropped >= part_meta["key_start"]) & (dropped < part_meta["key_end"])]
+            if len(inside):
+                part = self.read_part(self.path(part_meta["id"]))
+                part.drop(inside)
+                self.parts[i] = self._seal(part)
+        self.open.drop(dropped)
+
+    def combine(self, window: List[Dict[str, Any]]):
+        # Parts are immutable, so a merge reads and joins them without holding the index lock.
+        merged = self.read_part(self.path(window[0]["id"]))
+        for part_meta in window[1:]:
+            merged.extend(self.read_part(self.path(part_meta["id"])))
+        return merged
+
+    def replace_parts(self, part_ids: List[str], part) -> Dict[str, Any]:
+        part_meta = self._seal(part)
+        kept = [p for p in self.parts if p["id"] not in part_ids]
+        self.parts = sorted(kept + [part_meta], key=lambda p: p["key_start"])
+        return part_meta
@@ -0,0 +1,74 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+from pathlib import Path
+from typing import Iterable, List
+import faiss
+import numpy as np
+from indexer import Indexer
+from index_policy import IndexPlan, plan_index, with_ids, has_ids
+
+
+def shard_dir(index_dir: str, shard_id: int) -> Path:
+    return Path(index_dir) / "shards" / str(shard_id)
+
+
+# Partitions the index by docstore key: key k lives in shard k % N, labelled with k itself, so
+# shard hits are global keys and compaction can drop keys without renumbering anything.
+# Each shard is a complete segmented index (own segments, plans and manifest.json) under
+# INDEX_DIR/shards/<id>/, so one retrieval process or node can load just its partition.
+class ShardSet:
+    def __init__(self, index_dir: str, shards: int, embed_model: str = None):
+        self.shards = shards
+        self.indexers = [Indexer(str(shard_dir(index_dir, i)), embed_model, shard=(i, shards)) for i in range(shards)]
+
+    def __len__(self) -> int:
+        return sum(indexer.ntotal for indexer in self.indexers)
+
+    def consistent(self, keys: np.ndarray) -> bool:
+        # Shards written before they were labelled with keys number their rows locally.
+        counts = np.bincount(np.asarray(keys) % self.shards, minlength=self.shards)
+        return all(indexer.loaded and (indexer.index is None or has_ids(indexer.index)) and indexer.ntotal == counts[i]
+                   for i, indexer in enumerate(self.indexers))
+
+    def plan(self, embeddings: np.ndarray, keys: np.ndarray) -> List[IndexPlan]:
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        keys = np.asarray(keys, dtype="int64")
+        plans = []
+        for i in range(self.shards):
+            mask = keys % self.shards == i
+            if mask.any():
+                plans.append(plan_index(np.ascontiguousarray(embeddings[mask]), keys[mask]))
+            else:
+                # Fewer documents than shards: an empty flat index keeps the shard servable.
+                plans.append(IndexPlan("flat", with_ids(faiss.IndexFlatIP(embeddings.shape[1])), {}, {}, {}))
+        return plans
+
+    def swap(self, plans: List[IndexPlan]):
+        for indexer, plan in zip(self.indexers, plans):
+            indexer.swap(plan)
+
+    def build(self, embeddings: np.ndarray, keys: np.ndarray):
+        self.swap(self.plan(embeddings, keys))
+
+    def add(self, keys: Iterable[int], embeddings: np.ndarray):
+        keys = np.asarray(list(keys), dtype="int64")
+        embeddings = np.asarray(embeddings, dtype="float32")
+        for i, indexer in enumerate(self.indexers):
+            mask = keys % self.shards == i
+            if mask.any():
+                indexer.add(np.ascontiguousarray(embeddings[mask]), keys[mask])
+
+    def save(self, version: str, doc_count: int, key_limit: int = None):
+        for indexer in self.indexers:
+            indexer.save(version, doc_count, key_limit)
+
+    def load(self, version: str) -> bool:
+        try:
+            metas = [indexer.load(version) for indexer in self.indexers]
+        except FileNotFoundError:
+            return False
+        return all(meta.get("shards") == self.shards for meta in metas)
+
+    def stats(self) -> List[dict]:
+        return [{"shard": i, "rows": indexer.ntotal, "segments": len(indexer.segments),
+                 "index_type": indexer.drift_stats().get("index_type")} for i, indexer in enumerate(self.indexers)]
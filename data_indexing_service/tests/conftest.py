@@ -0,0 +1,125 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import random
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import List
+import numpy as np
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+if str(SERVICE_DIR) not in sys.path:
+    sys.path.insert(0, str(SERVICE_DIR))
+
+from chunker import approx_tokens
+from embedder import register_family
+
+HASHING_MODEL = "hashing-test"
+HASHING_DIM = 256
+WORD = re.compile(r"\w+")
+VOCABULARY = ["wallet", "group", "payout", "bid", "admin", "cashier", "member", "term", "bonus", "fee", "stripe",
+              "refund", "profile", "photo", "password", "subscription", "plan", "invite", "approval", "settle",
+              "contribution", "reminder", "schedule", "ledger", "receipt", "kyc", "document", "limit", "currency",
+              "transfer", "balance", "chat", "notification", "support", "dispute", "penalty", "grace", "cycle"]
+
+
+def hashing_vectors(texts: List[str]) -> np.ndarray:
+    # Signed bag-of-words feature hashing. crc32 (unlike hash()) is stable across processes, so the
+    # retrieval tests' copy of this function encodes queries into the same space.
+    out = np.zeros((len(texts), HASHING_DIM), dtype="float32")
+    for row, text in enumerate(texts):
+        for word in WORD.findall(text.lower()):
+            code = zlib.crc32(word.encode("utf-8"))
+            out[row, code % HASHING_DIM] += 1.0 if code & 0x80000000 else -1.0
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.where(norms > 0, norms, 1.0)
+
+
+# Stands in for the embedding model, so the tests need no weights or network.
+class HashingBackend:
+    timings = {}
+    max_tokens = 512
+
+    def count_tokens(self, text: str) -> int:
+        return approx_tokens(text)
+
+    def encode(self, texts) -> np.ndarray:
+        return hashing_vectors(list(texts))
+
+
+@register_family("hashing")
+def load_hashing(model_name: str, backend: str):
+    return HashingBackend()
+
+
+def kb_lines(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        topic = rng.sample(VOCABULARY, 4)
+        lines.append(f"How does the {topic[0]} {topic[1]} work for case {seed}x{i}? | "
+                     f"The {topic[2]} {topic[3]} applies after {i} days in step {seed}y{i}.")
+    return lines
+
+
+def write_kb(data_dir: Path, name: str, lines: List[str]) -> Path:
+    kb_dir = Path(data_dir) / "kb_files"
+    kb_dir.mkdir(parents=True, exist_ok=True)
+    path = kb_dir / name
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def load_indexing_app(data_dir: Path, shards: int = 1):
+    # app.py builds its stores from config at import, so config is pointed at data_dir and the
+    # module imported afresh. Also used by the retrieval tests, in a subprocess.
+    import config
+    data_dir = Path(data_dir)
+    settings = {
+        "EMBED_MODEL": HASHING_MODEL,
+        "INDEX_DIR": data_dir / "faiss_index",
+        "DOCSTORE_PATH": data_dir / "docstore.jsonl",
+        "LEGACY_DOCSTORE_PATH": data_dir / "docstore.json",
+        "KB_FILES_DIR": data_dir / "kb_files",
+        "UPLOAD_STAGING_DIR": data_dir / "kb_files" / ".uploads",
+        "VECTORS_PATH": data_dir / "faiss_index" / "vectors.f32",
+        "EMBEDDING_CACHE_PATH": data_dir / "embedding_cache.sqlite",
+        "INDEX_SHARDS": shards,
+        # Encode in-process: spawned pool workers would not have the hashing family registered.
+        "BULK_ENCODE_WORKERS": 1,
+    }
+    for name, value in settings.items():
+        setattr(config, name, str(value) if isinstance(value, Path) else value)
+    sys.modules.pop("app", None)
+    import app
+    app.load_service()
+    return app
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    write_kb(tmp_path, "kb_a.txt", kb_lines(40, seed=1))
+    return tmp_path
+
+
+@pytest.fixture
+def indexing(data_dir):
+    app = load_indexing_app(data_dir)
+    yield app
+    app.bulk_encoder.close()
+
+
+def upload(client, name: str, lines: List[str], timeout: float = 60) -> dict:
+    # Posts a KB file and waits for its indexing job to finish.
+    body = ("\n".join(lines) + "\n").encode("utf-8")
+    response = client.post("/index/add", files={"file": (name, body, "text/plain")})
+    assert response.status_code == 202
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/index/jobs/{response.json()['job_id']}").json()
+        if job["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
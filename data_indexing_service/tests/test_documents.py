@@ -0,0 +1,138 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from conftest import kb_lines, upload
+from docstore import DocStore
+
+
+@pytest.fixture
+def client(indexing):
+    return TestClient(indexing.app)
+
+
+def live_texts(docstore):
+    live = docstore.keys[docstore.live_mask()]
+    return {doc["text"]: int(key) for key, doc in zip(live, docstore.get_many(live))}
+
+
+def test_delete_tombstones_and_allows_reupload(indexing, client):
+    docstore = indexing.docstore
+    key = int(docstore.keys[3])
+    text = docstore.get(key)["text"]
+
+    response = client.post("/index/delete", json={"keys": [key, 10_000]})
+    assert response.json()["deleted"] == [key] and response.json()["not_found"] == [10_000]
+    assert key in docstore.deleted and text not in live_texts(docstore)
+    assert client.post("/index/delete", json={"keys": [key]}).json()["deleted"] == []
+
+    job = upload(client, "readd.txt", [text])
+    assert job["status"] == "done" and job["documents_added"] == 1
+    assert live_texts(docstore)[text] > key
+
+
+def test_update_replaces_key(indexing, client):
+    docstore = indexing.docstore
+    key = int(docstore.keys[0])
+    response = client.post("/index/update", json={"key": key, "text": "The wallet payout now takes 3 days."})
+    assert response.status_code == 200
+    new_key = response.json()["new_key"]
+    assert key in docstore.deleted and new_key not in docstore.deleted
+    doc = docstore.get(new_key)
+    assert doc["replaces"] == key and doc["source"] == docstore.get(key)["source"]
+    assert client.post("/index/update", json={"key": key, "text": "again"}).status_code == 404
+
+
+def test_update_section_only(indexing, client):
+    docstore = indexing.docstore
+    key = int(docstore.keys[1])
+    text = docstore.get(key)["text"]
+
+    response = client.post("/index/update", json={"key": key, "text": text, "section": "Payouts"})
+    assert response.status_code == 200
+    new_key = response.json()["new_key"]
+    assert docstore.get(new_key)["section"] == "Payouts"
+    # The new key owns the text's hash, so the text is still deduplicated.
+    assert docstore.contains(text)
+    assert upload(client, "dup.txt", [text])["documents_deduplicated"] == 1
+
+    unchanged = client.post("/index/update", json={"key": new_key, "text": text, "section": "Payouts"})
+    assert unchanged.status_code == 409
+
+
+def test_update_to_other_documents_text_conflicts(indexing, client):
+    docstore = indexing.docstore
+    key, other = int(docstore.keys[0]), int(docstore.keys[1])
+    response = client.post("/index/update", json={"key": key, "text": docstore.get(other)["text"]})
+    assert response.status_code == 409
+    assert key not in docstore.deleted
+
+
+def test_update_racing_same_text_conflicts(indexing, client, monkeypatch):
+    docstore = indexing.docstore
+    key, other = int(docstore.keys[0]), int(docstore.keys[1])
+    text = "Payouts are released once every member has contributed."
+    real_encode = indexing.embedding_cache.encode
+
+    def racing_encode(texts):
+        # Another update commits the same text while this one encodes outside the lock.
+        monkeypatch.setattr(indexing.embedding_cache, "encode", real_encode)
+        assert client.post("/index/update", json={"key": other, "text": text}).status_code == 200
+        return real_encode(texts)
+
+    monkeypatch.setattr(indexing.embedding_cache, "encode", racing_encode)
+    response = client.post("/index/update", json={"key": key, "text": text})
+    assert response.status_code == 409
+    live = docstore.get_many(docstore.keys[docstore.live_mask()])
+    assert key not in docstore.deleted and [doc["text"] for doc in live].count(text) == 1
+
+
+def test_reupload_after_update_then_delete(indexing, client):
+    docstore = indexing.docstore
+    key = int(docstore.keys[2])
+    old_text = docstore.get(key)["text"]
+    new_text = "The group admin approves each bid before the payout."
+    new_key = client.post("/index/update", json={"key": key, "text": new_text}).json()["new_key"]
+    client.post("/index/delete", json={"keys": [new_key]})
+    assert not docstore.contains(new_text) and not docstore.contains(old_text)
+
+    job = upload(client, "restore.txt", [old_text, new_text])
+    assert job["documents_added"] == 2 and job["documents_deduplicated"] == 0
+    texts = live_texts(docstore)
+    assert texts[old_text] > new_key and texts[new_text] > new_key
+
+
+def test_compaction_journal_rolls_forward(tmp_path, monkeypatch):
+    store = DocStore(str(tmp_path / "docstore.jsonl"))
+    store.append([{"id": str(i), "text": line} for i, line in enumerate(kb_lines(10))])
+    store.delete([1, 4, 5])
+    keep = store.live_mask()
+    # Crash after the journal is written but before any file is swapped in.
+    monkeypatch.setattr(DocStore, "_finish_compaction", lambda self: None)
+    store.compact(keep)
+    assert store.journal_path.exists()
+    monkeypatch.undo()
+
+    reopened = DocStore(str(tmp_path / "docstore.jsonl"))
+    assert not reopened.journal_path.exists()
+    assert reopened.keys.tolist() == [0, 2, 3, 6, 7, 8, 9]
+    assert [doc["id"] for doc in reopened] == ["0", "2", "3", "6", "7", "8", "9"]
+    assert reopened.get(6)["text"] == kb_lines(10)[6]
+    # Deleted keys stay reserved after compaction.
+    assert reopened.next_key == 10
+
+
+def test_compaction_without_journal_is_discarded(tmp_path):
+    store = DocStore(str(tmp_path / "docstore.jsonl"))
+    store.append([{"id": str(i), "text": line} for i, line in enumerate(kb_lines(5))])
+    store.delete([0])
+    # Crash while the rewritten files were still being written: no journal, only leftovers.
+    for path in (store.path, store.index_path):
+        path.with_name(path.name + ".compact").write_bytes(b"partial")
+
+    reopened = DocStore(str(tmp_path / "docstore.jsonl"))
+    assert reopened.keys.tolist() == [0, 1, 2, 3, 4]
+    assert np.array_equal(reopened.deleted, [0])
+    assert not store.path.with_name(store.path.name + ".compact").exists()
+    assert reopened.get(4)["id"] == "4"
@@ -0,0 +1,202 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import threading
+import time
+import faiss
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from conftest import hashing_vectors, kb_lines, upload
+import merger as merger_module
+import segments as segments_module
+from index_policy import plan_index, read_index
+from indexer import Indexer
+from segments import PART_KINDS, Manifest
+from lexical import LexicalIndex, LexicalPart
+from attributes import AttributeIndex, AttributePart
+
+
+def segment_keys(manifest: Manifest, segment_ids) -> np.ndarray:
+    keys = []
+    for segment_id in segment_ids:
+        index = read_index(str(manifest.segment_path(segment_id)), manifest.read_segment(segment_id))
+        keys.append(faiss.vector_to_array(index.id_map))
+    return np.concatenate(keys) if keys else np.zeros(0, dtype="int64")
+
+
+def assert_versions_complete(index_dir):
+    # Read back from disk: every retained version must still find all of its segments.
+    manifest = Manifest(index_dir)
+    for entry in manifest.versions:
+        for segment_id in entry["segments"]:
+            assert manifest.segment_path(segment_id).exists(), (entry["version"], segment_id)
+            assert manifest.segment_path(segment_id, ".json").exists(), (entry["version"], segment_id)
+    for entry in manifest.versions:
+        for kind in PART_KINDS:
+            for part in entry.get(kind, []):
+                assert manifest.segment_path(part["id"], f".{kind}.npz").exists(), (entry["version"], part["id"])
+    live = {segment_id for entry in manifest.versions for segment_id in entry["segments"]}
+    live |= {part["id"] for entry in manifest.versions for kind in PART_KINDS for part in entry.get(kind, [])}
+    on_disk = {path.name.split(".")[0] for path in manifest.segment_dir.iterdir()}
+    assert on_disk == live
+    return manifest
+
+
+@pytest.fixture
+def vectors():
+    return hashing_vectors(kb_lines(80))
+
+
+def test_collect_keeps_segments_of_retained_versions(tmp_path, vectors, monkeypatch):
+    monkeypatch.setattr(segments_module, "INDEX_RETAIN_VERSIONS", 2)
+    monkeypatch.setattr(segments_module, "INDEX_RETAIN_SECONDS", 0)
+    indexer = Indexer(str(tmp_path))
+    indexer.build(vectors[:20], np.arange(20))
+    indexer.save("v1", 20, 20)
+    for number, start in ((2, 20), (3, 30), (4, 40)):
+        indexer.add(vectors[start:start + 10], np.arange(start, start + 10))
+        indexer.save(f"v{number}", start + 10, start + 10)
+        assert_versions_complete(tmp_path)
+    (tmp_path / "v1.lexical.npz").write_bytes(b"")
+    (tmp_path / "v4.lexical.npz").write_bytes(b"")
+
+    deltas = [segment["id"] for segment in indexer.segments[1:]]
+    indexer.replace_segments(deltas, plan_index(vectors[20:50], np.arange(20, 50)))
+    indexer.save("v5", 50, 50)
+    manifest = assert_versions_complete(tmp_path)
+    assert [entry["version"] for entry in manifest.versions] == ["v4", "v5"]
+    # v4 is retained and still lists the segments v5 merged away.
+    assert manifest.get("v4")["segments"][1:] == deltas
+    assert not (tmp_path / "v1.lexical.npz").exists() and (tmp_path / "v4.lexical.npz").exists()
+    assert np.array_equal(np.sort(segment_keys(manifest, manifest.get("v4")["segments"])), np.arange(50))
+
+    indexer.add(vectors[50:60], np.arange(50, 60))
+    indexer.save("v6", 60, 60)
+    manifest = assert_versions_complete(tmp_path)
+    assert [entry["version"] for entry in manifest.versions] == ["v5", "v6"]
+    assert not any(manifest.segment_path(segment_id).exists() for segment_id in deltas)
+    assert np.array_equal(np.sort(segment_keys(manifest, manifest.get("v6")["segments"])), np.arange(60))
+
+
+def test_collect_keeps_young_versions(tmp_path, vectors, monkeypatch):
+    monkeypatch.setattr(segments_module, "INDEX_RETAIN_VERSIONS", 1)
+    monkeypatch.setattr(segments_module, "INDEX_RETAIN_SECONDS", 600)
+    indexer = Indexer(str(tmp_path))
+    indexer.build(vectors[:20], np.arange(20))
+    indexer.save("v1", 20, 20)
+    indexer.add(vectors[20:30], np.arange(20, 30))
+    indexer.save("v2", 30, 30)
+    assert [entry["version"] for entry in assert_versions_complete(tmp_path).versions] == ["v1", "v2"]
+
+    # Once v1 is older than INDEX_RETAIN_SECONDS only the newest version is kept.
+    monkeypatch.setattr(segments_module, "INDEX_RETAIN_SECONDS", 0)
+    indexer.manifest.collect()
+    assert [entry["version"] for entry in assert_versions_complete(tmp_path).versions] == ["v2"]
+
+
+def test_merge_racing_ingest_save_keeps_every_key_once(indexing, monkeypatch):
+    monkeypatch.setattr(merger_module, "SEGMENT_MAX_COUNT", 2)
+    monkeypatch.setattr(merger_module, "SEGMENT_MERGE_FACTOR", 2)
+    # Hold the merge between planning and swapping in, where it runs without the lock.
+    planning, resume = threading.Event(), threading.Event()
+    real_plan_index = merger_module.plan_index
+
+    def paused_plan_index(vectors, keys):
+        planning.set()
+        assert resume.wait(30)
+        return real_plan_index(vectors, keys)
+
+    monkeypatch.setattr(merger_module, "plan_index", paused_plan_index)
+    client = TestClient(indexing.app)
+    assert upload(client, "first.txt", kb_lines(5, seed=2))["status"] == "done"
+    assert upload(client, "second.txt", kb_lines(5, seed=3))["status"] == "done"
+    assert planning.wait(30)
+    window = indexing.indexer.segments[1:]
+
+    # An upload commits and saves a version while the merge is in flight.
+    assert upload(client, "third.txt", kb_lines(5, seed=4))["status"] == "done"
+    resume.set()
+    deadline = time.monotonic() + 30
+    while indexing.merger.running and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    [merge] = [merge for merge in indexing.merger.last_run["merges"] if merge["kind"] == "index"]
+    assert merge["merged"] == [segment["id"] for segment in window]
+    manifest = Manifest(indexing.indexer.index_dir)
+    latest = manifest.latest()
+    assert latest["version"] == indexing.merger.last_run["version"]
+    assert latest["segments"] == [segment["id"] for segment in indexing.indexer.segments]
+    assert len(latest["segments"]) == 3
+    keys = segment_keys(manifest, latest["segments"])
+    assert len(keys) == len(np.unique(keys)) == len(indexing.docstore) == 55
+    assert np.array_equal(np.sort(keys), indexing.docstore.keys)
+
+
+def wait_idle(worker):
+    deadline = time.monotonic() + 30
+    while worker.running and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def assert_parts_match_docstore(indexing):
+    # The latest version's parts, joined, hold what one index rebuilt from the docstore would.
+    manifest = Manifest(indexing.indexer.index_dir)
+    version = manifest.latest()["version"]
+    docs = indexing.docstore.get_many(indexing.docstore.keys)
+    lexical, attributes = LexicalIndex(manifest), AttributeIndex(manifest)
+    assert lexical.load(version) and attributes.load(version)
+    joined = lexical.combine(lexical.parts)
+    expected = LexicalPart()
+    expected.add(indexing.docstore.keys, [doc["text"] for doc in docs])
+    assert joined.postings == expected.postings and joined.doc_lens == expected.doc_lens
+    joined = attributes.combine(attributes.parts)
+    expected = AttributePart()
+    expected.add(indexing.docstore.keys, docs)
+    assert joined.postings == expected.postings and joined.added_at == expected.added_at
+    return manifest.latest()
+
+
+def test_saves_write_lexical_and_attribute_deltas(indexing):
+    client = TestClient(indexing.app)
+    before = Manifest(indexing.indexer.index_dir).latest()
+    files = {(kind, part["id"]): indexing.indexer.manifest.segment_path(part["id"], f".{kind}.npz").read_bytes()
+             for kind in PART_KINDS for part in before[kind]}
+    assert upload(client, "small.txt", kb_lines(3, seed=5))["status"] == "done"
+    latest = assert_parts_match_docstore(indexing)
+    for kind in PART_KINDS:
+        # Earlier parts are listed as they were; the upload only wrote a part for its own keys.
+        assert latest[kind][:-1] == before[kind]
+        assert latest[kind][-1]["key_start"] == before[kind][-1]["key_end"]
+        assert latest[kind][-1]["count"] == 3
+    for (kind, part_id), data in files.items():
+        assert indexing.indexer.manifest.segment_path(part_id, f".{kind}.npz").read_bytes() == data
+
+    # Compaction rewrites only the parts holding dropped keys.
+    [key] = indexing.docstore.keys[-2:-1]
+    assert client.post("/index/delete", json={"keys": [int(key)]}).json()["deleted"] == [key]
+    assert client.post("/index/compact").json()["started"]
+    wait_idle(indexing.compactor)
+    compacted = assert_parts_match_docstore(indexing)
+    for kind in PART_KINDS:
+        assert compacted[kind][:-1] == before[kind]
+        assert compacted[kind][-1]["id"] != latest[kind][-1]["id"] and compacted[kind][-1]["count"] == 2
+    assert_versions_complete(indexing.indexer.index_dir)
+
+
+def test_merger_merges_lexical_and_attribute_parts(indexing, monkeypatch):
+    monkeypatch.setattr(merger_module, "SEGMENT_MAX_COUNT", 2)
+    monkeypatch.setattr(merger_module, "SEGMENT_MERGE_FACTOR", 2)
+    client = TestClient(indexing.app)
+    assert upload(client, "first.txt", kb_lines(4, seed=6))["status"] == "done"
+    wait_idle(indexing.merger)
+    assert upload(client, "second.txt", kb_lines(4, seed=7))["status"] == "done"
+    wait_idle(indexing.merger)
+
+    merges = indexing.merger.last_run["merges"]
+    assert {merge["kind"] for merge in merges} == {"index", *PART_KINDS}
+    latest = assert_parts_match_docstore(indexing)
+    for kind in PART_KINDS:
+        [merge] = [merge for merge in merges if merge["kind"] == kind]
+        assert len(latest[kind]) == 2 and latest[kind][-1]["id"] == merge["into"]
+        assert latest[kind][-1]["count"] == merge["rows"] == 8
+    assert indexing.merger.status()["parts"] == {kind: 2 for kind in PART_KINDS}
@@ -0,0 +1,62 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import os
+from pathlib import Path
+import numpy as np
+
+
+# Raw float32 rows, row i being the embedding of docstore row i. Kept so the index can be
+# retrained or rebuilt without re-encoding the knowledge base.
+class VectorStore:
+    def __init__(self, path: str, dim: int = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+
+    @property
+    def count(self) -> int:
+        if not self.dim or not self.path.exists():
+            return 0
+        return self.path.stat().st_size // (4 * self.dim)
+
+    def append(self, embeddings: np.ndarray):
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        if embeddings.ndim != 2:
+            raise ValueError("Embeddings must be 2D array [n, dim].")
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Vector dimension mismatch: {embeddings.shape[1]} vs store {self.dim}")
+        with open(self.path, "ab") as f:
+            f.write(embeddings.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def reset(self):
+        # Unlink rather than truncate: the retrieval service may still have the old file mapped.
+        self.path.unlink(missing_ok=True)
+
+    def truncate(self, count: int):
+        if self.count > count:
+            with open(self.path, "r+b") as f:
+                f.truncate(count * 4 * self.dim)
+            print(f"[VectorStore] Truncated to {count} vectors")
+
+    def write_compacted(self, keep: np.ndarray, chunk_rows: int = 65536) -> Path:
+        # Copies the rows in keep to a side file; DocStore.compact swaps it in with the docstore.
+        tmp_path = self.path.with_name(self.path.name + ".compact")
+        vectors = self.read(len(keep))
+        with open(tmp_path, "wb") as f:
+            for start in range(0, len(keep), chunk_rows):
+                rows = vectors[start:start + chunk_rows][keep[start:start + chunk_rows]]
+                f.write(np.ascontiguousarray(rows, dtype="float32").tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+    def read(self, count: int = None) -> np.ndarray:
+        total = self.count
+        count = total if count is None else min(count, total)
+        if count == 0:
+            return np.zeros((0, self.dim or 0), dtype="float32")
+        return np.memmap(self.path, dtype="float32", mode="r", shape=(count, self.dim))
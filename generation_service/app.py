@@ -1,10 +1,11 @@
 # © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
 
+import json
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
-from generator import Generator, SYSTEM_RULES, format_prompt
-from config import TOP_K
+from typing import List, Dict, Optional
+from generator import Generator, GenerationBusy, SYSTEM_RULES, format_prompt, context_assembler
 
 app = FastAPI(
     title="Kitty Cash Generation Service",
@@ -14,9 +15,22 @@ app = FastAPI(
 
 generator = Generator()
 
+@app.on_event("startup")
+async def startup_event():
+    await generator.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await generator.close()
+
 class Document(BaseModel):
     id: int
     text: str
+    # Filled from retrieval hits; callers sending only id and text still get the budget and trimming.
+    key: Optional[int] = None
+    score: Optional[float] = None
+    added_at: Optional[float] = None
+    embedding: Optional[List[float]] = None
 
 class GenerateRequest(BaseModel):
     user_query: str
@@ -26,13 +40,40 @@ class GenerateRequest(BaseModel):
 async def generate_answer(req: GenerateRequest):
     if not req.user_query or not req.context:
         raise HTTPException(status_code=400, detail="user_query and context are required")
-    prompt = format_prompt([c.dict() for c in req.context[:TOP_K]], req.user_query)
+    prompt = format_prompt([c.dict() for c in req.context], req.user_query)
     try:
-        answer = generator.generate(prompt)
+        answer = await generator.generate(prompt)
+    except GenerationBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return {"answer": answer}
 
+@app.post("/generate/stream")
+async def generate_answer_stream(req: GenerateRequest):
+    if not req.user_query or not req.context:
+        raise HTTPException(status_code=400, detail="user_query and context are required")
+    prompt = format_prompt([c.dict() for c in req.context], req.user_query)
+
+    async def ndjson_tokens():
+        try:
+            async for token in generator.generate_stream(prompt):
+                yield json.dumps({"token": token}) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+            return
+        yield json.dumps({"done": True}) + "\n"
+
+    return StreamingResponse(ndjson_tokens(), media_type="application/x-ndjson")
+
 @app.get("/health")
+@app.get("/health/live")
 def health_check():
-    return {"status": "Generation Service running"}
+    return {"status": "Generation Service running", "generations": generator.stats(),
+            "context": context_assembler.stats()}
+
+@app.get("/health/ready")
+async def readiness_check():
+    status = await generator.readiness()
+    ready = status["ollama_reachable"] and status["model_loaded"] and status["warm_up_s"] is not None
+    return JSONResponse({"ready": ready, **status, "generations": generator.stats()}, status_code=200 if ready else 503)
@@ -2,4 +2,20 @@
 
 LLM_MODEL = "llama3:latest"
 TOP_K = 3
-
+OLLAMA_KEEP_ALIVE = "30m"
+OLLAMA_PRELOAD = True
+OLLAMA_CONNECT_TIMEOUT = 5.0
+OLLAMA_READ_TIMEOUT = 120.0
+MAX_CONCURRENT_GENERATIONS = 2
+MAX_QUEUED_GENERATIONS = 16
+GENERATION_QUEUE_TIMEOUT = 30.0
+READINESS_TIMEOUT = 2.0
+# Context assembly: at most TOP_K blocks and CONTEXT_TOKEN_BUDGET estimated tokens of retrieved
+# text per prompt, CONTEXT_BLOCK_MAX_TOKENS per block. Blocks trimmed below CONTEXT_MIN_BLOCK_TOKENS are left out.
+CONTEXT_TOKEN_BUDGET = 1200
+CONTEXT_BLOCK_MAX_TOKENS = 400
+CONTEXT_MIN_BLOCK_TOKENS = 24
+# Blocks whose retrieval embeddings are at least this cosine-similar count as the same content.
+CONTEXT_DUPLICATE_SIMILARITY = 0.95
+# Token estimate without the LLM's tokenizer; roughly 4 characters per token for English text.
+CHARS_PER_TOKEN = 4.0
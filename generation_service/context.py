@@ -0,0 +1,117 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import math
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+from config import (TOP_K, CONTEXT_TOKEN_BUDGET, CONTEXT_BLOCK_MAX_TOKENS, CONTEXT_MIN_BLOCK_TOKENS,
+                    CONTEXT_DUPLICATE_SIMILARITY, CHARS_PER_TOKEN)
+
+# A sentence ends at . ! or ? followed by whitespace, or at a line break (KB lines are Q | A pairs).
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\s*\n\s*")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def trim_to_sentences(text: str, max_tokens: int) -> str:
+    # The longest prefix ending on a sentence boundary that fits; empty if the first sentence doesn't.
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    kept = ""
+    for match in SENTENCE_END.finditer(text):
+        prefix = text[:match.start()]
+        if estimate_tokens(prefix) > max_tokens:
+            break
+        kept = prefix
+    return kept.rstrip()
+
+
+def cosine(a: List[float], b: List[float]) -> float:
+    norm = math.sqrt(math.fsum(x * x for x in a) * math.fsum(y * y for y in b))
+    return math.fsum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+
+
+def recency(block: Dict[str, Any]) -> Tuple[float, int]:
+    # Docstore keys ascend and an update gets a new key, so the key breaks ties between equal timestamps.
+    key = block.get("key")
+    return float(block.get("added_at") or 0), int(key) if key is not None else -1
+
+
+def same_content(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    if a.get("embedding") and b.get("embedding"):
+        return cosine(a["embedding"], b["embedding"]) >= CONTEXT_DUPLICATE_SIMILARITY
+    # Without embeddings (callers that send only id and text) only repeated text is caught.
+    return " ".join(a["text"].lower().split()) == " ".join(b["text"].lower().split())
+
+
+# Picks the context blocks that go into a prompt. Prefill time grows with prompt length, so
+# near-duplicates are dropped (keeping the most recent copy, as the rules ask the model to use the
+# latest answer), the best-scoring blocks fill a token budget, and a block that does not fit is cut
+# at a sentence boundary rather than mid-sentence.
+class ContextAssembler:
+    def __init__(self, budget: int = CONTEXT_TOKEN_BUDGET, max_blocks: int = TOP_K,
+                 block_max_tokens: int = CONTEXT_BLOCK_MAX_TOKENS, min_block_tokens: int = CONTEXT_MIN_BLOCK_TOKENS):
+        self.budget = int(budget)
+        self.max_blocks = max(1, int(max_blocks))
+        self.block_max_tokens = int(block_max_tokens)
+        self.min_block_tokens = int(min_block_tokens)
+        self.totals = {"prompts": 0, "blocks_in": 0, "blocks_out": 0, "duplicates": 0, "trimmed": 0,
+                       "tokens_in": 0, "tokens_out": 0}
+
+    def deduplicate(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # A group of near-duplicates keeps its most recent block at the group's best rank and score.
+        kept: List[Dict[str, Any]] = []
+        for block in blocks:
+            i = next((i for i, other in enumerate(kept) if same_content(block, other)), None)
+            if i is None:
+                kept.append(block)
+                continue
+            other = kept[i]
+            newer = block if recency(block) > recency(other) else other
+            scores = [b["score"] for b in (block, other) if b.get("score") is not None]
+            kept[i] = {**newer, "score": max(scores) if scores else None}
+        return kept
+
+    def assemble(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        blocks = [block for block in blocks if block.get("text")]
+        unique = self.deduplicate(blocks)
+        if all(block.get("score") is not None for block in unique):
+            # Highest score first; among equal scores the more recent block.
+            unique.sort(key=lambda block: (-block["score"], tuple(-x for x in recency(block))))
+
+        selected, used, trimmed = [], 0, 0
+        for block in unique:
+            room = min(self.block_max_tokens, self.budget - used)
+            if len(selected) == self.max_blocks or room < self.min_block_tokens:
+                break
+            text = trim_to_sentences(block["text"], room)
+            if not text or (text != block["text"] and estimate_tokens(text) < self.min_block_tokens):
+                continue
+            trimmed += text != block["text"]
+            used += estimate_tokens(text)
+            selected.append({**block, "text": text})
+
+        tokens_in = sum(estimate_tokens(block["text"]) for block in blocks)
+        for name, value in (("prompts", 1), ("blocks_in", len(blocks)), ("blocks_out", len(selected)),
+                            ("duplicates", len(blocks) - len(unique)), ("trimmed", trimmed),
+                            ("tokens_in", tokens_in), ("tokens_out", used)):
+            self.totals[name] += value
+        print(f"[Context] {len(blocks)} blocks ~{tokens_in} tokens -> {len(selected)} blocks ~{used} tokens "
+              f"(budget {self.budget}, {len(blocks) - len(unique)} near-duplicates dropped, {trimmed} trimmed)")
+        # Oldest first, so the latest answer to a repeated question is also the last one the model reads.
+        return sorted(selected, key=recency)
+
+    def stats(self) -> Dict[str, Any]:
+        totals = self.totals
+        saved = totals["tokens_in"] - totals["tokens_out"]
+        return {**totals, "budget": self.budget,
+                "saved_share": round(saved / totals["tokens_in"], 4) if totals["tokens_in"] else 0.0}
+
+
+def block_header(block: Dict[str, Any]) -> str:
+    header = f"[DOC {block['id']}]"
+    if block.get("added_at"):
+        header += f" (added {datetime.fromtimestamp(float(block['added_at'])).strftime('%Y-%m-%d')})"
+    return header
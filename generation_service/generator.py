@@ -1,10 +1,15 @@
 # © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
 
-import subprocess
+import asyncio
 import os
 import json
-from config import LLM_MODEL
-import requests
+import time
+from contextlib import asynccontextmanager
+import httpx
+from config import (LLM_MODEL, OLLAMA_KEEP_ALIVE, OLLAMA_PRELOAD, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT,
+                    MAX_CONCURRENT_GENERATIONS, MAX_QUEUED_GENERATIONS, GENERATION_QUEUE_TIMEOUT,
+                    READINESS_TIMEOUT)
+from context import ContextAssembler, block_header, estimate_tokens
 
 
 
@@ -28,8 +33,11 @@ Rules:
 
 """
 
+context_assembler = ContextAssembler()
+
 def format_prompt(context_blocks, user_query):
-    context_text = "\n\n".join([f"[DOC {c['id']}]\n{c['text']}" for c in context_blocks])
+    blocks = context_assembler.assemble(context_blocks)
+    context_text = "\n\n".join([f"{block_header(c)}\n{c['text']}" for c in blocks])
     prompt = f"""{SYSTEM_RULES}
 
 [CONTEXT]
@@ -40,28 +48,178 @@ def format_prompt(context_blocks, user_query):
 
 [ASSISTANT RESPONSE]
 """
+    print(f"[Context] Prompt ~{estimate_tokens(prompt)} tokens ({estimate_tokens(context_text)} of them context)")
     return prompt
 
+class GenerationBusy(RuntimeError):
+    pass
+
 class Generator:
-    def __init__(self, model: str = None):
+    def __init__(self, model: str = None, max_concurrency: int = MAX_CONCURRENT_GENERATIONS,
+                 max_queue: int = MAX_QUEUED_GENERATIONS, queue_timeout: float = GENERATION_QUEUE_TIMEOUT):
         self.model = model or os.environ.get("LLM_MODEL", "llama3:latest")
         self.ollama_host = os.environ.get("OLLAMA_HOST", "http://ollama:11434")
+        self.keep_alive = OLLAMA_KEEP_ALIVE
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = float(queue_timeout)
+        self.client = None
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._waiting = 0
+        self._running = 0
+        self._preload_task = None
+        self.warm_up_s = None
+        self.preload_error = None
+        self.prompt_totals = {"prompts": 0, "tokens": 0, "eval_s": 0.0}
+
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.ollama_host,
+                timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.max_concurrency + 1,
+                                    max_keepalive_connections=self.max_concurrency + 1),
+            )
+        if OLLAMA_PRELOAD:
+            # In the background, so the service is live while Ollama loads the model; readiness waits for it.
+            self.schedule_preload()
+
+    def schedule_preload(self):
+        if self._preload_task is None or self._preload_task.done():
+            self._preload_task = asyncio.create_task(self._preload_quietly())
+
+    async def _preload_quietly(self):
+        try:
+            await self.preload()
+            self.preload_error = None
+        except Exception as e:
+            self.preload_error = str(e)
+            print(f"[Generator] Preloading {self.model} failed, it will load on first request: {e}")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def preload(self):
+        # A one-token generation loads the model, holds it for keep_alive and runs a first inference,
+        # so the first user request doesn't pay for allocating the context.
+        started = time.perf_counter()
+        response = await self.client.post("/api/generate", json={
+            "model": self.model, "prompt": "Hi", "stream": False, "keep_alive": self.keep_alive,
+            "options": {"num_predict": 1},
+        })
+        response.raise_for_status()
+        self.warm_up_s = time.perf_counter() - started
+        print(f"[Generator] Preloaded {self.model} in {self.warm_up_s:.3f}s (keep_alive={self.keep_alive})")
 
-    def generate(self, prompt: str) -> str:
+    async def readiness(self):
+        status = {"ollama_reachable": False, "model_loaded": False, "model": self.model,
+                  "warm_up_s": round(self.warm_up_s, 3) if self.warm_up_s is not None else None,
+                  "error": self.preload_error}
+        if self.client is None:
+            return status
+        try:
+            # /api/ps lists the models Ollama currently holds in memory.
+            response = await self.client.get("/api/ps", timeout=READINESS_TIMEOUT)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            status["error"] = f"Ollama unreachable: {e}"
+            return status
+        status["ollama_reachable"] = True
+        models = response.json().get("models", [])
+        status["model_loaded"] = any(self.model in (m.get("name"), m.get("model")) for m in models)
+        if not status["model_loaded"] or self.warm_up_s is None:
+            # Evicted after keep_alive, or never warmed up: do it now rather than stay unready.
+            self.schedule_preload()
+        return status
+
+    def stats(self):
+        prompts = self.prompt_totals["prompts"]
+        return {"running": self._running, "waiting": self._waiting,
+                "max_concurrency": self.max_concurrency, "max_queue": self.max_queue,
+                "prompt_tokens_avg": round(self.prompt_totals["tokens"] / prompts, 1) if prompts else None,
+                "prompt_eval_s_avg": round(self.prompt_totals["eval_s"] / prompts, 4) if prompts else None}
+
+    def record_prompt(self, result: dict):
+        # Ollama reports the real prompt size (its tokenizer) and prefill time with the final response.
+        if "prompt_eval_count" not in result:
+            return
+        tokens = int(result["prompt_eval_count"])
+        eval_s = result.get("prompt_eval_duration", 0) / 1e9
+        self.prompt_totals["prompts"] += 1
+        self.prompt_totals["tokens"] += tokens
+        self.prompt_totals["eval_s"] += eval_s
+        print(f"[Generator] Prompt {tokens} tokens evaluated in {eval_s:.3f}s")
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self._slots.locked() and self._waiting >= self.max_queue:
+            raise GenerationBusy(f"Generation queue is full ({self._waiting} waiting)")
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise GenerationBusy(f"Timed out after {self.queue_timeout}s waiting for a generation slot")
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    async def generate(self, prompt: str) -> str:
+        if self.client is None:
+            await self.start()
         prompt += "\nRespond only with a JSON object: {\"answer\": <your answer>}"
-        response = requests.post(
-            f"{self.ollama_host}/api/generate",
-            json={
-                "model": self.model,
-                "prompt": prompt,
-                "format": "json", 
-                "stream": False
-            }
-        )
+        async with self._slot():
+            response = await self.client.post(
+                "/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": prompt,
+                    "format": "json",
+                    "stream": False,
+                    "keep_alive": self.keep_alive
+                }
+            )
         if response.status_code != 200:
             raise RuntimeError(f"LLM generation failed: {response.text}")
+        self.record_prompt(response.json())
         try:
             answer_json = json.loads(response.json()["response"])
             return answer_json.get("answer", "")
         except Exception as e:
             raise RuntimeError(f"Error parsing LLM response: {e}")
+
+    async def generate_stream(self, prompt: str):
+        if self.client is None:
+            await self.start()
+        # Plain-text answer: a JSON envelope cannot be forwarded token by token.
+        async with self._slot():
+            async with self.client.stream(
+                "POST",
+                "/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": prompt,
+                    "stream": True,
+                    "keep_alive": self.keep_alive
+                }
+            ) as response:
+                if response.status_code != 200:
+                    raise RuntimeError(f"LLM generation failed: {(await response.aread()).decode(errors='ignore')}")
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(f"LLM generation failed: {chunk['error']}")
+                    token = chunk.get("response", "")
+                    if token:
+                        yield token
+                    if chunk.get("done"):
+                        self.record_prompt(chunk)
+                        break
@@ -6,3 +6,13 @@ GENERATION_SERVICE_URL = "http://generation_service:8003"
 INDEXING_SERVICE_URL = "http://data_indexing_service:8001"
 TOP_K = 3
 
+POOL_MAX_CONNECTIONS = 50
+POOL_MAX_KEEPALIVE = 20
+POOL_KEEPALIVE_EXPIRY = 30.0
+RETRIEVER_TIMEOUT = 30.0
+GENERATOR_TIMEOUT = 120.0
+INDEXER_TIMEOUT = 120.0
+
+READINESS_TIMEOUT = 2.0
+# Downstreams that must be ready for this service to take traffic; the indexer is only reported.
+READINESS_REQUIRED = ("retriever", "generator")
@@ -3,11 +3,14 @@
 import argparse
 import logging
 import threading
-from typing import Dict, List
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 from fastmcp import FastMCP
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
-from tools import retriever_tool, generator_tool, indexer_tool
+from tools import (ServiceClients, service_clients, retriever_tool, generator_tool, generator_stream_tool, indexer_tool,
+                   downstream_readiness)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,20 +18,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger("mcp_server")
 
-mcp = FastMCP("KittyCash-MCP-Server")
+@asynccontextmanager
+async def lifespan(server):
+    service_clients.start()
+    try:
+        yield
+    finally:
+        await service_clients.aclose()
+
+
+mcp = FastMCP("KittyCash-MCP-Server", lifespan=lifespan)
 
 # Tool metadata
 TOOLS_MANIFEST: List[Dict] = [
     {
         "name": "retriever",
         "capabilities": ["search", "semantic_search"],
-        "description": "Semantic vector search over knowledge base. Input: {query: str}. Returns top-k documents with score and snippet.",
+        "description": "Semantic vector search over knowledge base. Input: {query: str}, optionally filtered by KB file (source), section and when documents were added (added_after / added_before, ISO 8601 or Unix time). Filters are applied inside the index, so a filtered search still returns top-k matching documents with score and snippet. with_embeddings=true adds each document's stored embedding, for passing on to the generator. top_k overrides how many documents come back (up to the retrieval service's HYBRID_CANDIDATES).",
         "input_schema": {
             "type": "object",
-            "properties": {"query": {"type": "string"}},
+            "properties": {
+                "query": {"type": "string"},
+                "source": {"type": "array", "items": {"type": "string"}},
+                "section": {"type": "array", "items": {"type": "string"}},
+                "added_after": {"type": "string"},
+                "added_before": {"type": "string"},
+                "with_embeddings": {"type": "boolean"},
+                "top_k": {"type": "integer"},
+            },
             "required": ["query"],
         },
-        "examples": ["retriever(query='how to settle a contribution')"],
+        "examples": [
+            "retriever(query='how to settle a contribution')",
+            "retriever(query='subscription plans', source=['kb2.txt'], added_after='2025-06-01')",
+        ],
     },
     {
         "name": "generator",
@@ -45,11 +68,12 @@ TOOLS_MANIFEST: List[Dict] = [
         "examples": [
             "generator(user_query='Explain the settlement process', context=[{id:1, text:'...'}])"
         ],
+        "stream_endpoint": "/mcp/tools/generator/stream",
     },
     {
         "name": "indexer",
         "capabilities": ["ingest", "index", "update_kb"],
-        "description": "Uploads KB files and updates the FAISS index. Input: {kb_file: str path to local file}.",
+        "description": "Uploads KB files and queues them for indexing. Input: {kb_file: str path to local file}. Returns a job_id; progress is at /index/jobs/{job_id} on the indexing service.",
         "input_schema": {
             "type": "object",
             "properties": {"kb_file": {"type": "string"}},
@@ -61,22 +85,59 @@ TOOLS_MANIFEST: List[Dict] = [
 
 # Meta API for manifest discovery
 app = FastAPI(title="KittyCash MCP Meta", version="1.0.0")
+meta_clients = ServiceClients()
+
+
+@app.on_event("startup")
+async def meta_startup():
+    meta_clients.start()
+
+
+@app.on_event("shutdown")
+async def meta_shutdown():
+    await meta_clients.aclose()
 
 @app.get("/mcp/tools")
 async def list_tools():
     return {"tools": TOOLS_MANIFEST}
 
 
+@app.get("/health/live")
+async def liveness_check():
+    return {"status": "MCP Server running"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    # The MCP transport's pools are opened by its lifespan; until then tool calls cannot run.
+    downstream = await downstream_readiness(meta_clients)
+    ready = service_clients.started and downstream["ready"]
+    body = {"ready": ready, "mcp_transport": service_clients.started, "services": downstream["services"]}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+# MCP tool results are single messages, so streamed generation is relayed over the meta API.
+@app.post("/mcp/tools/generator/stream")
+async def generator_stream(request: Request):
+    payload = await request.json()
+    logger.info(f"Streaming 'generator' called with user_query={payload.get('user_query')!r}")
+    return StreamingResponse(generator_stream_tool(payload, meta_clients), media_type="application/x-ndjson")
+
+
 def run_meta_api(host: str, port: int):
     uvicorn.run(app, host=host, port=port, log_level="info")
 
 
 # MCP Tools
 @mcp.tool(name="retriever")
-async def retriever(query: str):
-    logger.info(f"Tool 'retriever' called with query: {query!r}")
+async def retriever(query: str, source: Optional[List[str]] = None, section: Optional[List[str]] = None,
+                    added_after: Optional[str] = None, added_before: Optional[str] = None,
+                    with_embeddings: bool = False, top_k: Optional[int] = None):
+    filters = {"source": source, "section": section, "added_after": added_after, "added_before": added_before}
+    filters = {name: value for name, value in filters.items() if value}
+    logger.info(f"Tool 'retriever' called with query: {query!r} filters={filters}")
     try:
-        result = await retriever_tool({"query": query})
+        result = await retriever_tool({"query": query, "with_embeddings": with_embeddings, "top_k": top_k, **filters})
         logger.info(f"'retriever' returning {len(result.get('results', []))} results")
         return result
     except Exception as e:
@@ -1,28 +1,111 @@
 # © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
 
+import asyncio
 import httpx
+import json
 import logging
 from pathlib import Path
-from config import RETRIEVAL_SERVICE_URL, GENERATION_SERVICE_URL, INDEXING_SERVICE_URL, TOP_K
+from config import (RETRIEVAL_SERVICE_URL, GENERATION_SERVICE_URL, INDEXING_SERVICE_URL, TOP_K,
+                    POOL_MAX_CONNECTIONS, POOL_MAX_KEEPALIVE, POOL_KEEPALIVE_EXPIRY,
+                    RETRIEVER_TIMEOUT, GENERATOR_TIMEOUT, INDEXER_TIMEOUT, READINESS_TIMEOUT, READINESS_REQUIRED)
 
 logger = logging.getLogger("tools")
 
-async def retriever_tool(payload: dict):
+SERVICES = {
+    "retriever": (RETRIEVAL_SERVICE_URL, RETRIEVER_TIMEOUT),
+    "generator": (GENERATION_SERVICE_URL, GENERATOR_TIMEOUT),
+    "indexer": (INDEXING_SERVICE_URL, INDEXER_TIMEOUT),
+}
+
+# Retriever tool arguments forwarded to /search/ as filters.
+RETRIEVER_FILTERS = ("source", "section", "added_after", "added_before")
+
+
+# Long-lived keep-alive clients, one per downstream service. httpx clients are bound to the
+# event loop they first run on, so the MCP transport and the meta API thread each own an instance.
+class ServiceClients:
+    def __init__(self):
+        self._clients = {}
+
+    @property
+    def started(self) -> bool:
+        return bool(self._clients)
+
+    def start(self):
+        for name in SERVICES:
+            self.get(name)
+        logger.info(f"Opened connection pools for {list(self._clients)}")
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            base_url, timeout = SERVICES[name]
+            client = httpx.AsyncClient(
+                base_url=base_url,
+                timeout=httpx.Timeout(timeout, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+                ),
+            )
+            self._clients[name] = client
+        return client
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+        logger.info("Closed service connection pools")
+
+
+service_clients = ServiceClients()
+
+
+async def probe_service(name: str, clients: ServiceClients) -> dict:
+    try:
+        resp = await clients.get(name).get("/health/ready", timeout=READINESS_TIMEOUT)
+    except httpx.HTTPError as e:
+        return {"ready": False, "error": f"{type(e).__name__}: {e}"}
+    try:
+        detail = resp.json()
+    except ValueError:
+        detail = resp.text[:200]
+    return {"ready": resp.status_code == 200, "detail": detail}
+
+
+async def downstream_readiness(clients: ServiceClients) -> dict:
+    names = list(SERVICES)
+    results = await asyncio.gather(*(probe_service(name, clients) for name in names))
+    checks = dict(zip(names, results))
+    return {"ready": all(checks[name]["ready"] for name in READINESS_REQUIRED), "services": checks}
+
+
+async def retriever_tool(payload: dict, clients: ServiceClients = None):
     query = payload.get("query")
     if not query:
         logger.warning("Missing 'query' in payload")
         return {"error": "Missing 'query'", "results": []}
 
     logger.info(f"Calling retrieval service with query: {query!r}")
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(f"{RETRIEVAL_SERVICE_URL}/search/", params={"query": query})
-        resp.raise_for_status()
-        results = resp.json().get("results", [])[:TOP_K]
+    client = (clients or service_clients).get("retriever")
+    # Callers assembling generator context ask for more than TOP_K, so near-duplicates can be replaced.
+    top_k = int(payload.get("top_k") or TOP_K)
+    params = {"query": query, "top_k": top_k}
+    for name in RETRIEVER_FILTERS:
+        if payload.get(name):
+            params[name] = payload[name]
+    if payload.get("with_embeddings"):
+        # Stored vectors of the hits; the generation service uses them to drop near-duplicate context.
+        params["with_embeddings"] = "true"
+    resp = await client.get("/search/", params=params)
+    resp.raise_for_status()
+    results = resp.json().get("results", [])[:top_k]
     logger.info(f"Retrieval service returned {len(results)} results")
     return {"results": results}
 
 
-async def generator_tool(payload: dict):
+async def generator_tool(payload: dict, clients: ServiceClients = None):
     user_query = payload.get("user_query")
     context = payload.get("context", [])
 
@@ -31,19 +114,43 @@ async def generator_tool(payload: dict):
         return {"error": "Missing 'user_query'", "answer": ""}
 
     logger.info(f"Calling generation service with user_query={user_query!r} context_len={len(context)}")
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            f"{GENERATION_SERVICE_URL}/generate/",
-            json={"user_query": user_query, "context": context[:TOP_K]},
-            timeout=120.0,
-        )
-        resp.raise_for_status()
-        gen_json = resp.json()
+    client = (clients or service_clients).get("generator")
+    # The generation service de-duplicates the context and keeps at most its own TOP_K blocks.
+    resp = await client.post("/generate/", json={"user_query": user_query, "context": context})
+    resp.raise_for_status()
+    gen_json = resp.json()
     logger.info(f"Generation service response keys: {list(gen_json.keys()) if isinstance(gen_json, dict) else 'non-dict'}")
     return gen_json if isinstance(gen_json, dict) else {"answer": str(gen_json)}
 
 
-async def indexer_tool(payload: dict):
+async def generator_stream_tool(payload: dict, clients: ServiceClients = None):
+    user_query = payload.get("user_query")
+    context = payload.get("context", [])
+
+    if not user_query:
+        logger.warning("Missing 'user_query' in payload")
+        yield json.dumps({"error": "Missing 'user_query'"}) + "\n"
+        return
+
+    logger.info(f"Streaming from generation service with user_query={user_query!r} context_len={len(context)}")
+    client = (clients or service_clients).get("generator")
+    try:
+        async with client.stream(
+            "POST",
+            "/generate/stream",
+            json={"user_query": user_query, "context": context},
+            timeout=httpx.Timeout(GENERATOR_TIMEOUT, read=None),
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if line:
+                    yield line + "\n"
+    except httpx.HTTPError as e:
+        logger.exception(f"Generator stream error: {e}")
+        yield json.dumps({"error": str(e)}) + "\n"
+
+
+async def indexer_tool(payload: dict, clients: ServiceClients = None):
     kb_file = payload.get("kb_file")
     if not kb_file:
         logger.warning("Missing 'kb_file' in payload")
@@ -55,13 +162,13 @@ async def indexer_tool(payload: dict):
         return {"error": f"File not found: {kb_file}"}
 
     logger.info(f"Uploading kb_file={kb_file!r} to indexing service")
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        with open(kb_path, "rb") as f:
-            files = {"file": (kb_path.name, f, "text/plain")}
-            resp = await client.post(f"{INDEXING_SERVICE_URL}/index/add", files=files)
+    client = (clients or service_clients).get("indexer")
+    with open(kb_path, "rb") as f:
+        files = {"file": (kb_path.name, f, "text/plain")}
+        resp = await client.post("/index/add", files=files)
 
-        resp.raise_for_status()
-        result = resp.json()
+    resp.raise_for_status()
+    result = resp.json()
 
     logger.info(f"Indexer response: {result}")
     return result if isinstance(result, dict) else {"result": result}
@@ -1,8 +1,15 @@
 # © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
 
-from fastapi import FastAPI, HTTPException
-from retriever import Retriever
-from config import EMBED_MODEL, INDEX_DIR, DOCSTORE_PATH, TOP_K
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from retriever import Retriever, SEARCH_MODES
+from shards import ShardError
+from filters import FilterError
+from config import EMBED_MODEL, INDEX_DIR, DOCSTORE_PATH, TOP_K, INDEX_POLL_SECONDS
 
 app = FastAPI(
     title="Kitty Cash Retrieval Service",
@@ -10,15 +17,146 @@ app = FastAPI(
     version="1.0.0"
 )
 
-retriever = Retriever(EMBED_MODEL, INDEX_DIR, DOCSTORE_PATH, TOP_K)
+# Loaded in a background thread so the process answers liveness probes while the model and index
+# load. It is published only after the warm-up, so readiness and request handling never see a
+# half-initialised retriever.
+retriever: Optional[Retriever] = None
+load_error: Optional[str] = None
+
+def load_retriever():
+    global retriever, load_error
+    started = time.perf_counter()
+    # Built once, so retries neither reload the model weights nor leave worker threads behind;
+    # only loading the index and the warm-up are retried.
+    loaded = None
+    while retriever is None:
+        try:
+            if loaded is None:
+                loaded = Retriever(EMBED_MODEL, INDEX_DIR, DOCSTORE_PATH, TOP_K)
+            loaded.start()
+        except Exception as e:
+            # Typically no index yet because the indexing service is still building v1.
+            error = f"{type(e).__name__}: {e}"
+            if error != load_error:
+                print(f"[Startup] Retriever not loaded, retrying every {max(INDEX_POLL_SECONDS, 1)}s: {error}")
+            load_error = error
+            time.sleep(max(INDEX_POLL_SECONDS, 1))
+            continue
+        loaded.startup["total_s"] = time.perf_counter() - started
+        retriever, load_error = loaded, None
+        print("[Startup] " + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in loaded.startup.items()))
+
+@app.on_event("startup")
+def startup_event():
+    threading.Thread(target=load_retriever, name="retriever-loader", daemon=True).start()
+
+def ready_retriever() -> Retriever:
+    if retriever is None:
+        raise HTTPException(status_code=503, detail="Retrieval service is still loading")
+    return retriever
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    mode: Optional[str] = None
+    # e.g. {"source": ["kb2.txt"], "added_after": "2025-06-01"}; applied to every query.
+    filters: Optional[Dict[str, Any]] = None
+
+def check_mode(mode: Optional[str]):
+    if mode is not None and mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {list(SEARCH_MODES)}")
 
 @app.get("/health")
+@app.get("/health/live")
 def health_check():
     return {"status": "Retrieval Service running"}
 
+@app.get("/health/ready")
+def readiness_check():
+    loaded = retriever
+    ready = loaded is not None and loaded.version is not None
+    body = {
+        "ready": ready,
+        "model_loaded": bool(loaded and loaded.embedder.loaded),
+        "warmed_up": bool(loaded and "warm_up_s" in loaded.embedder.timings),
+        "index_version": loaded.version if loaded else None,
+        "startup": {phase: round(seconds, 3) for phase, seconds in loaded.startup.items()} if loaded else {},
+        "error": load_error,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 @app.get("/search/")
-def search(query: str):
+def search(query: str, mode: Optional[str] = None, source: Optional[List[str]] = Query(None),
+           section: Optional[List[str]] = Query(None), added_after: Optional[str] = None,
+           added_before: Optional[str] = None, with_embeddings: bool = False,
+           top_k: Optional[int] = Query(None, ge=1)):
     if not query:
         raise HTTPException(status_code=400, detail="Query parameter is required")
-    results = retriever.search(query)
+    check_mode(mode)
+    filters = {"source": source, "section": section, "added_after": added_after, "added_before": added_before}
+    try:
+        loaded = ready_retriever()
+        results = loaded.search(query, mode, filters, top_k)
+        if with_embeddings:
+            results = loaded.with_embeddings(results)
+    except FilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ShardError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     return {"query": query, "results": results}
+
+@app.post("/search/batch")
+def search_batch(req: BatchSearchRequest):
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="queries must be a non-empty list")
+    check_mode(req.mode)
+    try:
+        results = ready_retriever().search_batch(req.queries, req.mode, req.filters)
+    except FilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ShardError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"results": [{"query": q, "results": r} for q, r in zip(req.queries, results)]}
+
+@app.get("/embed/")
+def embed(query: str):
+    if not query:
+        raise HTTPException(status_code=400, detail="Query parameter is required")
+    loaded = ready_retriever()
+    vector = loaded.embed(query)
+    # Includes the tombstone count, so caches keyed on it drop answers built on deleted documents.
+    return {"query": query, "embedding": vector.tolist(), "index_version": loaded.content_version}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return ready_retriever().cache_stats()
+
+@app.get("/admin/index")
+def index_info():
+    return ready_retriever().index_info()
+
+@app.get("/admin/shards")
+def shard_stats():
+    stats = ready_retriever().shard_stats()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Index is not sharded (INDEX_SHARDS = 1)")
+    return stats
+
+@app.post("/admin/index/pin")
+def pin_index(version: str):
+    loaded = ready_retriever()
+    try:
+        loaded.pin_version(version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return loaded.index_info()
+
+@app.post("/admin/index/unpin")
+def unpin_index():
+    loaded = ready_retriever()
+    try:
+        loaded.unpin()
+    except (FileNotFoundError, RuntimeError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return loaded.index_info()
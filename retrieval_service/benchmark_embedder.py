@@ -0,0 +1,88 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+# Compares the PyTorch SentenceTransformer embedder with the ONNX Runtime backend (fp32 and
+# dynamic int8) on knowledge base lines: cosine agreement with PyTorch, top-k overlap when the
+# lines search themselves, single-query latency and batch throughput.
+#
+#   python benchmark_embedder.py --kb-dir ../data/kb_files --queries 200
+
+import argparse
+import time
+from pathlib import Path
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from onnx_backend import OnnxEncoder
+from config import (EMBED_MODEL, ONNX_DIR, ONNX_INTRA_OP_THREADS, ONNX_INTER_OP_THREADS, ONNX_MAX_LENGTH,
+                    ONNX_BATCH_SIZE)
+
+
+def kb_lines(kb_dir: str, limit: int):
+    lines = []
+    for path in sorted(Path(kb_dir).glob("*.txt")):
+        lines.extend(line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip())
+    return lines[:limit]
+
+
+def timed(encode, texts, queries: int, batch_size: int):
+    encode(texts[:1])
+    latencies = []
+    for text in texts[:queries]:
+        started = time.perf_counter()
+        encode([text])
+        latencies.append((time.perf_counter() - started) * 1000)
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        encode(texts[start:start + batch_size])
+    seconds = time.perf_counter() - started
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "texts_per_s": round(len(texts) / seconds, 1),
+    }
+
+
+def topk_overlap(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    ref_top = np.argsort(-(reference @ reference.T), axis=1)[:, 1:k + 1]
+    cand_top = np.argsort(-(candidate @ candidate.T), axis=1)[:, 1:k + 1]
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kb-dir", default="../data/kb_files")
+    parser.add_argument("--limit", type=int, default=1000, help="Knowledge base lines to encode")
+    parser.add_argument("--queries", type=int, default=200, help="Single-text calls for the latency percentiles")
+    parser.add_argument("--batch-size", type=int, default=ONNX_BATCH_SIZE)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = kb_lines(args.kb_dir, args.limit)
+    print(f"{len(texts)} texts from {args.kb_dir}, model {EMBED_MODEL}")
+
+    model = SentenceTransformer(EMBED_MODEL, device="cpu")
+    torch_encode = lambda batch: model.encode(batch, normalize_embeddings=True, convert_to_numpy=True,
+                                              show_progress_bar=False, batch_size=args.batch_size)
+    backends = {"torch": torch_encode}
+    for quantize in (False, True):
+        encoder = OnnxEncoder(EMBED_MODEL, ONNX_DIR, quantize, ONNX_INTRA_OP_THREADS, ONNX_INTER_OP_THREADS,
+                              ONNX_MAX_LENGTH, args.batch_size)
+        backends["onnx-int8" if quantize else "onnx-fp32"] = encoder.encode
+
+    reference = torch_encode(texts).astype("float32")
+    rows = []
+    for name, encode in backends.items():
+        vectors = encode(texts)
+        cosine = np.sum(reference * vectors, axis=1)
+        row = {"backend": name, "min_cos": round(float(cosine.min()), 4), "mean_cos": round(float(cosine.mean()), 4),
+               f"top{args.top_k}_overlap": round(topk_overlap(reference, vectors, args.top_k), 3)}
+        row.update(timed(encode, texts, args.queries, args.batch_size))
+        rows.append(row)
+
+    columns = list(rows[0])
+    print("  ".join(f"{column:>12}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{row[column]!s:>12}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+# Checks sharded retrieval against the unsharded index on an index built with INDEX_SHARDS > 1.
+# Queries are stored document vectors with noise added, so no embedding model is needed. It
+# reports recall@k against exact search and latency for: the full index, in-process shards,
+# shard_server.py processes standing in for nodes, and the same processes with one killed.
+#
+#   python benchmark_shards.py --shards 2 --queries 200 --port 8102
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+import httpx
+import numpy as np
+from retriever import IndexSnapshot, map_vectors, search_snapshot
+from segments import SegmentCatalog
+from shards import ShardRouter, ShardError
+from docstore import DocStoreReader
+from config import INDEX_DIR, VECTORS_PATH, DOCSTORE_PATH, INDEX_SHARDS, SHARD_TIMEOUT_MS, SHARD_MIN_FRACTION
+
+
+def full_index_snapshot(index_dir: Path) -> IndexSnapshot:
+    catalog = SegmentCatalog(index_dir)
+    meta = catalog.meta(catalog.list_versions()[-1])
+    segments = catalog.segments(meta)
+    docstore = DocStoreReader(DOCSTORE_PATH, limit=int(meta["doc_count"]), key_limit=meta.get("key_limit"))
+    compressed = any(segment.compression != "none" for segment in segments)
+    vectors = map_vectors(Path(VECTORS_PATH), meta["dim"], len(docstore)) if compressed else None
+    return IndexSnapshot(meta["version"], segments, meta["dim"], docstore, meta, vectors=vectors)
+
+
+def measure(search, queries: np.ndarray, exact: np.ndarray, k: int) -> dict:
+    latencies, recalls, missing = [], [], 0
+    for query, truth in zip(queries, exact):
+        started = time.perf_counter()
+        keys, missed = search(query.reshape(1, -1))
+        latencies.append((time.perf_counter() - started) * 1000)
+        missing += bool(missed)
+        recalls.append(len(set(keys[0][keys[0] >= 0].tolist()) & set(truth.tolist())) / k)
+    return {
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "partial": missing,
+    }
+
+
+def start_servers(shards: int, port: int):
+    processes = []
+    script = str(Path(__file__).with_name("shard_server.py"))
+    for i in range(shards):
+        processes.append(subprocess.Popen([sys.executable, script, "--shard", str(i), "--shards", str(shards),
+                                           "--index-dir", INDEX_DIR, "--port", str(port + i)],
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    deadline = time.monotonic() + 120
+    for i in range(shards):
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port + i}/health/ready", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Shard server {i} did not become ready")
+            time.sleep(0.2)
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=INDEX_SHARDS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8102)
+    parser.add_argument("--timeout-ms", type=float, default=SHARD_TIMEOUT_MS)
+    args = parser.parse_args()
+    if args.shards < 2:
+        parser.error("build the index with INDEX_SHARDS > 1 and pass --shards")
+
+    index_dir = Path(INDEX_DIR)
+    snapshot = full_index_snapshot(index_dir)
+    version = snapshot.version
+    stored = np.memmap(VECTORS_PATH, dtype="float32", mode="r").reshape(-1, snapshot.dim)[: len(snapshot.docstore)]
+    rng = np.random.default_rng(0)
+    queries = np.asarray(stored[rng.integers(0, len(stored), args.queries)], dtype="float32")
+    queries += rng.normal(0, args.noise, queries.shape).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    # Searches return docstore keys; vector rows map to them through the docstore index.
+    exact = snapshot.docstore.keys[np.argsort(-(queries @ np.asarray(stored).T), axis=1)[:, : args.top_k]]
+    print(f"{version}: {len(stored)} documents, {args.shards} shards, {args.queries} queries, k={args.top_k}")
+
+    rows = {"full index": measure(lambda q: (search_snapshot(snapshot, q, args.top_k)[1], []), queries, exact,
+                                  args.top_k)}
+
+    local = ShardRouter(args.shards, INDEX_DIR, VECTORS_PATH, DOCSTORE_PATH, {}, args.timeout_ms, SHARD_MIN_FRACTION)
+    local.load(version)
+    rows["local shards"] = measure(lambda q: local.search(q, args.top_k, version)[1:], queries, exact, args.top_k)
+
+    processes = start_servers(args.shards, args.port)
+    try:
+        endpoints = {i: f"http://127.0.0.1:{args.port + i}" for i in range(args.shards)}
+        remote = ShardRouter(args.shards, INDEX_DIR, VECTORS_PATH, DOCSTORE_PATH, endpoints, args.timeout_ms,
+                             SHARD_MIN_FRACTION)
+        rows["shard processes"] = measure(lambda q: remote.search(q, args.top_k, version)[1:], queries, exact,
+                                          args.top_k)
+
+        processes[-1].kill()
+        processes[-1].wait()
+        try:
+            rows["one process killed"] = measure(lambda q: remote.search(q, args.top_k, version)[1:], queries,
+                                                 exact, args.top_k)
+        except ShardError as e:
+            print(f"One process killed: {e}")
+        print(json.dumps(remote.stats(), indent=2))
+    finally:
+        for process in processes:
+            process.kill()
+
+    columns = ["recall_at_k", "p50_ms", "p95_ms", "partial"]
+    print(f"{'':>20}" + "".join(f"{column:>14}" for column in columns))
+    for name, row in rows.items():
+        print(f"{name:>20}" + "".join(f"{row[column]!s:>14}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
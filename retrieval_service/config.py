@@ -3,5 +3,36 @@
 EMBED_MODEL = "BAAI/bge-m3"
 #EMBED_MODEL = "imagebind"
 INDEX_DIR = "../data/faiss_index"
-DOCSTORE_PATH = "../data/docstore.json"
+DOCSTORE_PATH = "../data/docstore.jsonl"
 TOP_K = 3
+BATCH_MAX_SIZE = 32
+BATCH_MAX_WAIT_MS = 5
+EMBED_CACHE_SIZE = 4096
+RESULT_CACHE_SIZE = 2048
+CACHE_TTL_SECONDS = 900
+INDEX_POLL_SECONDS = 5
+INDEX_MMAP = True
+# Default for requests without a mode. "dense" returns cosine scores; "hybrid" (RRF fused ranks, with the
+# BM25-only fast path for short queries) and "lexical" (BM25 scores) are opted into per request with mode.
+SEARCH_MODE = "dense"
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+LEXICAL_FAST_PATH_MAX_TERMS = 2
+BM25_K1 = 1.2
+BM25_B = 0.75
+VECTORS_PATH = "../data/faiss_index/vectors.f32"
+EMBED_BACKEND = "torch"
+ONNX_DIR = "../data/onnx"
+ONNX_QUANTIZE = True
+ONNX_INTRA_OP_THREADS = 0
+ONNX_INTER_OP_THREADS = 1
+ONNX_MAX_LENGTH = 512
+ONNX_BATCH_SIZE = 32
+INDEX_SHARDS = 1
+# Shard id -> base URL of a shard_server.py node; shards not listed are searched in this process.
+SHARD_ENDPOINTS = {}
+SHARD_TIMEOUT_MS = 250
+SHARD_MIN_FRACTION = 0.5
+FILTER_CACHE_SIZE = 256
+# Filters admitting at most this many documents are answered by an exact scan of their vectors.
+FILTER_EXACT_MAX_ROWS = 8192
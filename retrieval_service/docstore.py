@@ -0,0 +1,89 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import json
+import mmap
+from pathlib import Path
+from typing import Any, Dict, Optional
+import numpy as np
+
+# Same layout as the indexing service's DocStore: docstore.jsonl records plus docstore.idx
+# (key, offset) entries. Only the records for hit ids are decoded.
+ENTRY = np.dtype([("key", "<i8"), ("offset", "<i8")])
+TOMBSTONE = np.dtype("<i8")
+
+
+def key_rows(keys: np.ndarray, wanted: np.ndarray) -> np.ndarray:
+    # Row of each wanted key in the sorted keys, -1 where it is absent (e.g. compacted away).
+    wanted = np.asarray(wanted, dtype="int64")
+    rows = np.searchsorted(keys, wanted)
+    found = rows < len(keys)
+    found[found] = keys[rows[found]] == wanted[found]
+    return np.where(found, rows, -1)
+
+
+class DocStoreReader:
+    def __init__(self, path: str, limit: Optional[int] = None, key_limit: Optional[int] = None):
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix(".idx")
+        self._mm = None
+        entries = np.zeros(0, dtype=ENTRY)
+        if self.path.exists() and self.index_path.exists() and self.path.stat().st_size:
+            with open(self.path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            index_size = self.index_path.stat().st_size
+            entries = np.fromfile(self.index_path, dtype=ENTRY, count=index_size // ENTRY.itemsize)
+            # Ignore entries whose record lies beyond what was mapped (written after we opened).
+            entries = entries[entries["offset"] < len(self._mm)]
+        if key_limit is not None:
+            # Keys are ascending, so a version's records are still a prefix after compaction.
+            entries = entries[entries["key"] < key_limit]
+        elif limit is not None:
+            entries = entries[:limit]
+        self._entries = entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def keys(self) -> np.ndarray:
+        return self._entries["key"]
+
+    def rows(self, keys: np.ndarray) -> np.ndarray:
+        # docstore row = vectors.f32 row.
+        return key_rows(self._entries["key"], keys)
+
+    def get(self, key: int) -> Optional[Dict[str, Any]]:
+        position = int(np.searchsorted(self._entries["key"], key))
+        if position >= len(self._entries) or self._entries["key"][position] != key:
+            return None
+        offset = int(self._entries["offset"][position])
+        end = self._mm.find(b"\n", offset)
+        if end < 0:
+            return None
+        return json.loads(self._mm[offset:end])
+
+
+# Follows docstore.tombstones, which the indexing service appends deleted keys to. A stat per
+# search is enough to notice a delete, so it applies without waiting for a new index version.
+class TombstoneReader:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.keys = np.zeros(0, dtype=TOMBSTONE)
+        self._size = 0
+
+    def refresh(self) -> bool:
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        size -= size % TOMBSTONE.itemsize
+        if size == self._size:
+            return False
+        if size < self._size:
+            self.keys, self._size = np.zeros(0, dtype=TOMBSTONE), 0
+        with open(self.path, "rb") as f:
+            f.seek(self._size)
+            added = np.frombuffer(f.read(size - self._size), dtype=TOMBSTONE)
+        self.keys = np.union1d(self.keys, added)
+        self._size = size
+        return True
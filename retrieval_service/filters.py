@@ -0,0 +1,156 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+
+RANGE_FILTERS = ("added_after", "added_before")
+HNSW_MAX_EF_SEARCH = 1024
+
+
+class FilterError(ValueError):
+    pass
+
+
+def parse_timestamp(value: Any) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Optional[Tuple]:
+    # Hashable, order-independent form of a filter, used as the selection and result cache key.
+    if not filters:
+        return None
+    normalized = []
+    for field, value in filters.items():
+        if value is None or value == [] or value == "":
+            continue
+        if field in RANGE_FILTERS:
+            try:
+                normalized.append((field, parse_timestamp(value)))
+            except ValueError:
+                raise FilterError(f"{field} must be a Unix timestamp or ISO 8601 datetime, got {value!r}")
+        else:
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            normalized.append((field, tuple(sorted(str(v) for v in values))))
+    return tuple(sorted(normalized)) or None
+
+
+# One segments/<id>.attributes.npz part written by the indexing service (or the vN.attributes.npz
+# of a version from before parts): per-field value -> key postings and an added_at timestamp per
+# docstore key in [key_start, key_end) (-1 for keys no longer stored).
+class AttributePart:
+    def __init__(self, path: Path):
+        self.fields: Dict[str, Tuple[Dict[str, int], np.ndarray, np.ndarray]] = {}
+        with np.load(path) as data:
+            self.key_start = int(data["key_start"]) if "key_start" in data.files else 0
+            for field in data["fields"].tolist():
+                values = {value: i for i, value in enumerate(data[f"{field}.values"].tolist())}
+                self.fields[field] = (values, data[f"{field}.offsets"], data[f"{field}.keys"])
+            self.added_at = data["added_at"]
+        self.key_end = self.key_start + len(self.added_at)
+
+
+# The attributes of all of a version's parts.
+class AttributeIndex:
+    def __init__(self, parts: List[AttributePart]):
+        self.parts = parts
+        # The indexing service rebuilds every part when FILTER_FIELDS changes.
+        self.fields: Tuple[str, ...] = tuple(parts[0].fields) if parts else ()
+        self.key_space = max((part.key_end for part in parts), default=0)
+        self.added_at = np.full(self.key_space, -1, dtype="int64")
+        for part in parts:
+            self.added_at[part.key_start:part.key_end] = part.added_at
+
+    def __len__(self) -> int:
+        return self.key_space
+
+    def mask(self, filters: Tuple) -> np.ndarray:
+        # Values within a field are OR-ed, fields are AND-ed.
+        mask = self.added_at >= 0
+        for field, wanted in filters:
+            if field == "added_after":
+                mask &= self.added_at >= wanted
+            elif field == "added_before":
+                mask &= self.added_at < wanted
+            elif field in self.fields:
+                field_mask = np.zeros(self.key_space, dtype=bool)
+                for part in self.parts:
+                    values, offsets, keys = part.fields[field]
+                    for value in wanted:
+                        i = values.get(value)
+                        if i is not None:
+                            field_mask[keys[offsets[i]:offsets[i + 1]]] = True
+                mask &= field_mask
+            else:
+                raise FilterError(f"Unknown filter field {field!r}; filterable: {list(self.fields) + list(RANGE_FILTERS)}")
+        return mask
+
+
+# The documents a search may return in one index version: live (stored, not tombstoned) keys that
+# pass the filter, as a boolean mask over docstore keys, the matching keys and their vector rows,
+# and the packed bitmap FAISS ID selectors read. key is the normalized filter, None when the
+# selection only hides deleted documents. Built once per (content version, filter) and cached,
+# so repeated queries only pay for the search itself.
+class Selection:
+    def __init__(self, version: str, key: Optional[Tuple], mask: np.ndarray, docstore):
+        self.version = version
+        self.key = key
+        self.mask = mask
+        self.keys = np.flatnonzero(mask)
+        self.rows = docstore.rows(self.keys)
+        self.count = len(self.keys)
+        self.fraction = self.count / len(docstore) if len(docstore) else 0.0
+        self._bitmap = None
+
+    def bitmap(self) -> np.ndarray:
+        # Indexes and shards are all labelled with global docstore keys, so one bitmap fits every shard.
+        if self._bitmap is None:
+            self._bitmap = np.packbits(self.mask, bitorder="little")
+        return self._bitmap
+
+
+def search_parameters(index, bitmap: np.ndarray, fraction: float = 1.0):
+    # The selector only points at the bitmap's buffer; the params keep both alive for the search.
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    # A filter admitting a fraction f of the documents leaves ~f of each probed list or visited
+    # neighbourhood. Widening the search by 1/f keeps the admitted candidates (and so recall) at the
+    # unfiltered level; rejected ids are skipped before any distance is computed.
+    widen = 1.0 / max(fraction, 1e-6)
+    # The id map translates the selector to the inner index's rows and passes the params through.
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(index, faiss.IndexBinary):
+        params = faiss.SearchParameters(sel=selector)
+    else:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=min(ivf.nlist, math.ceil(ivf.nprobe * widen)))
+        elif isinstance(inner, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=min(HNSW_MAX_EF_SEARCH,
+                                                                             math.ceil(inner.hnsw.efSearch * widen)))
+        else:
+            params = faiss.SearchParameters(sel=selector)
+    params.refs = (selector, bitmap)
+    return params
+
+
+def exact_search(vectors: np.ndarray, queries: np.ndarray, rows: np.ndarray, keys: np.ndarray, k: int):
+    # Brute force over just the admitted rows; cheaper than the index for selective filters.
+    scores = np.full((len(queries), k), -np.inf, dtype="float32")
+    ids = np.full((len(queries), k), -1, dtype="int64")
+    if not len(keys):
+        return scores, ids
+    exact = queries @ np.asarray(vectors[rows], dtype="float32").T
+    top = np.argsort(-exact, axis=1, kind="stable")[:, :k]
+    scores[:, :top.shape[1]] = np.take_along_axis(exact, top, axis=1)
+    ids[:, :top.shape[1]] = keys[top]
+    return scores, ids
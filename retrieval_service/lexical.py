@@ -0,0 +1,79 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import math
+import re
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+from config import BM25_K1, BM25_B
+
+# Must match data_indexing_service/lexical.py, which writes the lexical parts.
+TOKEN_PATTERN = re.compile(r"\w+(?:[-_.]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# One segments/<id>.lexical.npz part (or the vN.lexical.npz of a version from before parts): CSR
+# postings over the docstore keys [key_start, key_end), with doc_lens indexed by key - key_start.
+class LexicalPart:
+    def __init__(self, path: Path):
+        with np.load(path) as data:
+            self.key_start = int(data["key_start"]) if "key_start" in data.files else 0
+            self.offsets = data["offsets"]
+            self.keys = data["keys"]
+            self.tfs = data["tfs"].astype("float32")
+            self.doc_lens = data["doc_lens"].astype("float32")
+            self.term_ids = {term: i for i, term in enumerate(data["terms"].tolist())}
+        self.key_end = self.key_start + len(self.doc_lens)
+        # Keys compacted away are zero-length holes.
+        stored = self.doc_lens[self.doc_lens > 0]
+        self.doc_count = len(stored)
+        self.total_len = float(stored.sum())
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return None
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.keys[start:end], self.tfs[start:end]
+
+
+# BM25 over all of a version's lexical parts. Document frequencies and the average length are
+# summed across parts, so scores match a single index over the same documents.
+class BM25Index:
+    def __init__(self, parts: List[LexicalPart]):
+        self.parts = parts
+        self.key_space = max((part.key_end for part in parts), default=0)
+        self.doc_count = sum(part.doc_count for part in parts)
+        self.avg_len = sum(part.total_len for part in parts) / self.doc_count if self.doc_count else 0.0
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def search(self, terms: List[str], k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        keys, scores = [], []
+        for term in dict.fromkeys(terms):
+            found = [(part, postings) for part in self.parts if (postings := part.postings(term)) is not None]
+            if not found:
+                continue
+            doc_freq = sum(len(term_keys) for _, (term_keys, _) in found)
+            idf = math.log(1 + (self.doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+            for part, (postings, tf) in found:
+                if mask is not None:
+                    # idf stays corpus-wide, so filtered scores rank the same as unfiltered ones.
+                    admitted = mask[postings]
+                    postings, tf = postings[admitted], tf[admitted]
+                doc_lens = part.doc_lens[postings - part.key_start]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lens / self.avg_len)
+                keys.append(postings)
+                scores.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+        if not keys:
+            return []
+
+        unique, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        top = np.argpartition(-totals, k)[:k] if len(totals) > k else np.arange(len(totals))
+        top = top[np.argsort(-totals[top], kind="stable")]
+        return [(int(unique[i]), float(totals[i])) for i in top]
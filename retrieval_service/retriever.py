@@ -1,67 +1,518 @@
 # © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
 
-import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
-from typing import List, Dict, Any
-import faiss
+from typing import List, Dict, Any, Optional
 import numpy as np
-from embedder import Embedder   
-from config import EMBED_MODEL, INDEX_DIR, DOCSTORE_PATH, TOP_K
+from embedder import Embedder
+from cache import LRUCache
+from docstore import DocStoreReader, TombstoneReader
+from lexical import BM25Index, LexicalPart, tokenize
+from filters import (AttributeIndex, AttributePart, FilterError, Selection, RANGE_FILTERS, normalize_filters,
+                     exact_search)
+from segments import Segment, SegmentCatalog, search_segments
+from config import (EMBED_MODEL, INDEX_DIR, DOCSTORE_PATH, TOP_K, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS,
+                    EMBED_CACHE_SIZE, RESULT_CACHE_SIZE, CACHE_TTL_SECONDS, INDEX_POLL_SECONDS,
+                    SEARCH_MODE, HYBRID_CANDIDATES, RRF_K, LEXICAL_FAST_PATH_MAX_TERMS, VECTORS_PATH,
+                    INDEX_SHARDS, SHARD_ENDPOINTS, SHARD_TIMEOUT_MS, SHARD_MIN_FRACTION, FILTER_CACHE_SIZE,
+                    FILTER_EXACT_MAX_ROWS)
+
+SEARCH_MODES = ("dense", "hybrid", "lexical")
+
+
+class IndexSnapshot:
+    def __init__(self, version: str, segments: List[Segment], dim: int, docstore: DocStoreReader,
+                 meta: Dict[str, Any], lexical: Optional[BM25Index] = None, vectors: Optional[np.ndarray] = None,
+                 shards=None, attributes: Optional[AttributeIndex] = None):
+        self.version = version
+        # The immutable index segments this version lists, searched together.
+        self.segments = segments
+        self.dim = dim
+        self.docstore = docstore
+        self.meta = meta
+        self.lexical = lexical
+        # Float rows, for exact re-scoring of compressed codes and exact scans of narrow filters.
+        self.vectors = vectors
+        self.attributes = attributes
+        # ShardRouter over INDEX_DIR/shards/ when INDEX_SHARDS > 1; segments is then empty.
+        self.shards = shards
+        # Keys this version holds that have since been deleted; replaced as a whole when
+        # docstore.tombstones grows, and hidden from every search through a Selection.
+        self.dead = np.zeros(0, dtype="int64")
+        stored = int(docstore.keys[-1]) + 1 if len(docstore) else 0
+        self.key_space = max(int(meta.get("key_limit", stored)), stored,
+                             lexical.key_space if lexical is not None else 0,
+                             attributes.key_space if attributes is not None else 0)
+
+    @property
+    def compression(self) -> List[str]:
+        return sorted({segment.compression for segment in self.segments})
+
+    @property
+    def content_version(self) -> str:
+        # Deletes only add tombstones, so their count tells apart what one index version serves.
+        return f"{self.version}-{len(self.dead)}d" if len(self.dead) else self.version
 
 
 class Retriever:
-    def __init__(self, embed_model: str, index_dir: str, docstore_path: str, top_k: int = 3):
+    def __init__(self, embed_model: str, index_dir: str, docstore_path: str, top_k: int = 3,
+                 max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS,
+                 poll_seconds: float = INDEX_POLL_SECONDS):
         self.embedder = Embedder(embed_model)
         self.top_k = int(top_k)
+        self.search_mode = SEARCH_MODE
+        # Dense hits per query; fusion needs more candidates than the final top_k.
+        self.candidates = max(self.top_k, HYBRID_CANDIDATES)
         self.index_dir = Path(index_dir)
         self.docstore_path = Path(docstore_path)
-        self.index = None
-        self.dim = None
-        self.documents: List[Dict[str, Any]] = self.load_documents()
+        self.vectors_path = Path(VECTORS_PATH)
+        self.catalog = SegmentCatalog(self.index_dir)
+        self.embedding_cache = LRUCache(EMBED_CACHE_SIZE, CACHE_TTL_SECONDS)
+        self.result_cache = LRUCache(RESULT_CACHE_SIZE, CACHE_TTL_SECONDS)
+        self.selection_cache = LRUCache(FILTER_CACHE_SIZE, CACHE_TTL_SECONDS)
+        self.tombstones = TombstoneReader(self.docstore_path.with_suffix(".tombstones"))
+        self._tombstone_lock = threading.Lock()
+        self.pinned_version: Optional[str] = None
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._reload_lock = threading.RLock()
+        self.last_load: Dict[str, float] = {}
+        self.shards = None
+        if INDEX_SHARDS > 1:
+            from shards import ShardRouter
+            self.shards = ShardRouter(INDEX_SHARDS, index_dir, VECTORS_PATH, docstore_path, SHARD_ENDPOINTS,
+                                      SHARD_TIMEOUT_MS, SHARD_MIN_FRACTION)
+        # Seconds per startup phase; the embedder adds import/weights/warm-up times as they happen.
+        self.startup: Dict[str, float] = {}
+
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._pending = queue.Queue()
+        self._batch_worker = None
+        self.poll_seconds = float(poll_seconds)
+        self._watcher = None
+
+    def start(self) -> Dict[str, float]:
+        # Loads the latest index, warms up, then starts the batcher and index watcher. Safe to call
+        # again after a failure: the embedder keeps its weights and no thread has started yet.
         self.load_index()
+        self.startup = dict(self.last_load)
+        self.warm_up()
+        if self._batch_worker is None:
+            self._batch_worker = threading.Thread(target=self._batch_loop, name="retriever-batcher", daemon=True)
+            self._batch_worker.start()
+        if self.poll_seconds > 0 and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch_loop, name="retriever-index-watcher", daemon=True)
+            self._watcher.start()
+        return self.startup
 
-    def load_index(self):
-        versions = sorted(self.index_dir.glob("*.meta.json"))
-        if not versions:
-            raise FileNotFoundError(f"No index versions found in {self.index_dir}")
-
-        latest_meta_path = versions[-1]
-        meta = json.loads(latest_meta_path.read_text())
-        version = meta["version"]
-
-        index_path = self.index_dir / f"{version}.index"
-        if not index_path.exists():
-            raise FileNotFoundError(f"Index file for version {version} not found at {index_path}")
-        self.index = faiss.read_index(str(index_path))
-        self.dim = meta["dim"]
-        print(f"[Retriever] Loaded latest index version {version} with dimension {self.dim}")
-
-    def load_documents(self) -> List[Dict[str, Any]]:
-        if not self.docstore_path.exists():
-            print(f"No docstore found at {self.docstore_path}")
-            return []
-        with open(self.docstore_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+    # The live snapshot is replaced as a whole, so readers always see a matching index/docstore pair.
+    @property
+    def segments(self) -> List[Segment]:
+        return self._snapshot.segments if self._snapshot else []
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._snapshot.dim if self._snapshot else None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._snapshot.version if self._snapshot else None
+
+    @property
+    def content_version(self) -> Optional[str]:
+        return self._snapshot.content_version if self._snapshot else None
+
+    @property
+    def docstore(self) -> Optional[DocStoreReader]:
+        return self._snapshot.docstore if self._snapshot else None
+
+    def list_versions(self) -> List[str]:
+        return self.catalog.list_versions()
 
-    def search(self, query: str):
-        if not query or self.index is None:
+    def load_index(self, version: str = None) -> IndexSnapshot:
+        with self._reload_lock:
+            if version is None:
+                versions = self.list_versions()
+                if not versions:
+                    raise FileNotFoundError(f"No index versions found in {self.index_dir}")
+                version = versions[-1]
+
+            meta = self.catalog.meta(version)
+            if meta.get("embed_model", EMBED_MODEL) != self.embedder.variant:
+                print(f"[Retriever] Warning: {version} holds {meta.get('embed_model', EMBED_MODEL)} vectors but queries "
+                      f"are encoded with {self.embedder.variant}; set the same EMBED_MODEL, EMBED_BACKEND and "
+                      f"ONNX_QUANTIZE in both services")
+
+            # Keys only grow, so older versions map onto a prefix of the docstore, minus whatever
+            # compaction has dropped since.
+            started = time.perf_counter()
+            doc_count = int(meta["doc_count"]) if "doc_count" in meta else None
+            key_limit = meta.get("key_limit")
+            docstore = DocStoreReader(self.docstore_path, limit=doc_count, key_limit=key_limit)
+            if key_limit is None and doc_count is not None and len(docstore) < doc_count:
+                raise RuntimeError(f"Docstore has {len(docstore)} documents but {version} expects {doc_count}")
+            docstore_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            if self.shards is not None:
+                # Shards carry their own segments; the main index stays on disk for unsharded readers.
+                self.shards.load(version)
+                segments = []
+            else:
+                segments = self.catalog.segments(meta)
+            vectors = None
+            if any(segment.compression != "none" for segment in segments) or self.vectors_path.exists():
+                vectors = map_vectors(self.vectors_path, meta["dim"], len(docstore))
+            lexical_parts = self.catalog.parts(meta, "lexical", LexicalPart)
+            lexical = BM25Index(lexical_parts) if lexical_parts is not None else None
+            attribute_parts = self.catalog.parts(meta, "attributes", AttributePart)
+            attributes = AttributeIndex(attribute_parts) if attribute_parts is not None else None
+            snapshot = IndexSnapshot(version, segments, meta["dim"], docstore, meta, lexical, vectors, self.shards,
+                                     attributes)
+            with self._tombstone_lock:
+                self.tombstones.refresh()
+                snapshot.dead = self._deleted_keys(snapshot)
+            previous = self._snapshot
+            self._snapshot = snapshot
+            if previous is None or previous.version != version:
+                # Cached results point at rows of the previous index; embeddings stay valid.
+                self.result_cache.clear()
+                self.selection_cache.clear()
+            self.last_load = {"docstore_s": docstore_seconds, "index_s": time.perf_counter() - started}
+            print(f"[Retriever] Loaded index version {version} ({len(segments)} segments) with dimension {snapshot.dim} "
+                  f"in {self.last_load['index_s']:.3f}s (docstore {docstore_seconds:.3f}s)")
+            return snapshot
+
+    def pin_version(self, version: str) -> IndexSnapshot:
+        with self._reload_lock:
+            snapshot = self.load_index(version)
+            self.pinned_version = version
+        print(f"[Retriever] Pinned index version {version}")
+        return snapshot
+
+    def unpin(self) -> IndexSnapshot:
+        with self._reload_lock:
+            self.pinned_version = None
+            print("[Retriever] Unpinned index version, following latest")
+            return self.load_index()
+
+    def warm_up(self) -> Dict[str, float]:
+        # Loads the model and runs one query end to end, bypassing the caches, so the first user
+        # request doesn't pay for weight loading, kernel selection or faulting in index pages.
+        self.embedder.warm_up()
+        snapshot = self._snapshot
+        started = time.perf_counter()
+        vector = self.embedder.encode(["warm up"]).reshape(1, -1).astype("float32")
+        if snapshot.dim is not None and vector.shape[1] != snapshot.dim:
+            raise RuntimeError(f"Embedding dimension mismatch: query {vector.shape[1]} vs index {snapshot.dim}")
+        search_vectors(snapshot, vector, self.candidates)
+        self.startup.update(self.embedder.timings)
+        self.startup["warm_up_search_s"] = time.perf_counter() - started
+        return self.startup
+
+    def index_info(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "pinned": self.pinned_version,
+            "dim": snapshot.dim if snapshot else None,
+            "embed_model": snapshot.meta.get("embed_model", EMBED_MODEL) if snapshot else None,
+            "query_embedder": self.embedder.variant,
+            "doc_count": len(snapshot.docstore) if snapshot else 0,
+            "lexical": bool(snapshot and snapshot.lexical is not None),
+            "compression": snapshot.compression if snapshot else None,
+            "segments": [segment.info() for segment in snapshot.segments] if snapshot else [],
+            "search_mode": self.search_mode,
+            "shards": len(self.shards) if self.shards is not None else None,
+            "tombstoned": len(snapshot.dead) if snapshot else 0,
+            "filters": list(snapshot.attributes.fields) + list(RANGE_FILTERS) if snapshot and snapshot.attributes else [],
+            "available_versions": self.list_versions(),
+        }
+
+    def _watch_loop(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                with self._reload_lock:
+                    if self.pinned_version is not None:
+                        continue
+                    versions = self.list_versions()
+                    if versions and versions[-1] != self.version:
+                        self.load_index(versions[-1])
+            except Exception as e:
+                print(f"[Retriever] Background index reload failed, will retry: {e}")
+
+    def _deleted_keys(self, snapshot: IndexSnapshot) -> np.ndarray:
+        dead = self.tombstones.keys
+        return dead[snapshot.docstore.rows(dead) >= 0]
+
+    def _refresh_tombstones(self):
+        with self._tombstone_lock:
+            snapshot = self._snapshot
+            if self.tombstones.refresh() and snapshot is not None:
+                snapshot.dead = self._deleted_keys(snapshot)
+
+    def search(self, query: str, mode: str = None, filters: Dict[str, Any] = None, top_k: int = None):
+        if not query or self._snapshot is None:
+            return []
+        # Up to the candidates every search already fetches, so a larger top_k costs no extra search.
+        top_k = min(int(top_k or self.top_k), self.candidates)
+        self._refresh_tombstones()
+        snapshot = self._snapshot
+        selection = self._selection(snapshot, normalize_filters(filters))
+        if selection is not None and not selection.count:
             return []
+        mask = selection.mask if selection is not None else None
+        mode = mode or self.search_mode
+        if mode == "dense" or snapshot.lexical is None:
+            return self._dense(query, selection).result()[:top_k]
 
-        query_embedding = self.embedder.encode([query])
+        terms = tokenize(query)
+        if mode == "lexical" or len(terms) <= LEXICAL_FAST_PATH_MAX_TERMS:
+            # Short keyword queries skip the embedding forward pass entirely.
+            hits = self._lexical_hits(snapshot, terms, mask, top_k)
+            if hits or mode == "lexical":
+                return hits
+        dense = self._dense(query, selection)
+        # BM25 runs here while the batch worker embeds and searches the dense side.
+        lexical = snapshot.lexical.search(terms, self.candidates, mask)
+        return self._fuse(snapshot, dense.result(), lexical, top_k)
 
-        if query_embedding.ndim == 1:
-            query_embedding = query_embedding.reshape(1, -1)
-        query_embedding = query_embedding.astype("float32")
-        if self.dim is not None and query_embedding.shape[1] != self.dim:
-            raise RuntimeError(f"Embedding dimension mismatch: query {query_embedding.shape[1]} vs index {self.dim}")
-        k = max(1, int(self.top_k))
-        scores, indices = self.index.search(query_embedding, k)
+    def search_batch(self, queries: List[str], mode: str = None,
+                     filters: Dict[str, Any] = None) -> List[List[Dict[str, Any]]]:
+        if self._snapshot is None:
+            return [[] for _ in queries]
+        self._refresh_tombstones()
+        snapshot = self._snapshot
+        selection = self._selection(snapshot, normalize_filters(filters))
+        if selection is not None and not selection.count:
+            return [[] for _ in queries]
+        mask = selection.mask if selection is not None else None
+        mode = mode or self.search_mode
+        if mode == "dense" or snapshot.lexical is None:
+            return [hits[: self.top_k] for hits in self._search_many(list(queries), selection)]
 
-        results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < 0 or idx >= len(self.documents):
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        dense_rows, lexical = [], []
+        for i, query in enumerate(queries):
+            terms = tokenize(query or "")
+            if mode == "lexical" or len(terms) <= LEXICAL_FAST_PATH_MAX_TERMS:
+                results[i] = self._lexical_hits(snapshot, terms, mask)
+                if results[i] or mode == "lexical":
+                    continue
+            dense_rows.append(i)
+            lexical.append(snapshot.lexical.search(terms, self.candidates, mask))
+        if dense_rows:
+            dense = self._search_many([queries[i] for i in dense_rows], selection)
+            for i, dense_hits, lexical_hits in zip(dense_rows, dense, lexical):
+                results[i] = self._fuse(snapshot, dense_hits, lexical_hits)
+        return results
+
+    def with_embeddings(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Copies of the hits carrying their stored vectors, so callers can compare results (the
+        # generation service drops near-duplicate context with them). Cached hits stay untouched.
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.vectors is None or not hits:
+            return hits
+        rows = snapshot.docstore.rows(np.array([hit["key"] for hit in hits], dtype="int64"))
+        return [{**hit, "embedding": np.asarray(snapshot.vectors[row], dtype="float32").tolist()} if row >= 0 else hit
+                for hit, row in zip(hits, rows)]
+
+    def _selection(self, snapshot: IndexSnapshot, key: Optional[tuple]) -> Optional[Selection]:
+        if key is None and not len(snapshot.dead):
+            return None
+        if key is not None and snapshot.attributes is None:
+            raise FilterError(f"Index version {snapshot.version} has no attribute index; reindex to filter")
+        version = snapshot.content_version
+        selection = self.selection_cache.get((version, key))
+        if selection is None:
+            mask = np.zeros(snapshot.key_space, dtype=bool)
+            mask[snapshot.docstore.keys] = True
+            mask[snapshot.dead] = False
+            if key is not None:
+                admitted = snapshot.attributes.mask(key)
+                mask[:len(admitted)] &= admitted
+                mask[len(admitted):] = False
+            selection = Selection(version, key, mask, snapshot.docstore)
+            self.selection_cache.put((version, key), selection)
+        return selection
+
+    def _dense(self, query: str, selection: Optional[Selection] = None) -> Future:
+        # Concurrent callers are coalesced by the batch worker into one encode + one index.search.
+        future = Future()
+        self._pending.put((query, selection, future))
+        return future
+
+    def _lexical_hits(self, snapshot: IndexSnapshot, terms: List[str], mask: np.ndarray = None,
+                      top_k: int = None) -> List[Dict[str, Any]]:
+        hits = []
+        for key, score in snapshot.lexical.search(terms, top_k or self.top_k, mask):
+            doc = snapshot.docstore.get(key)
+            if doc is not None:
+                hits.append({"key": key, "score": score, "document": doc})
+        return hits
+
+    def _fuse(self, snapshot: IndexSnapshot, dense_hits: List[Dict[str, Any]],
+              lexical_hits: List[tuple], top_k: int = None) -> List[Dict[str, Any]]:
+        # Reciprocal rank fusion: rank-based, so cosine and BM25 scores need no calibration.
+        scores: Dict[int, float] = {}
+        documents: Dict[int, Dict[str, Any]] = {}
+        for rank, hit in enumerate(dense_hits):
+            scores[hit["key"]] = scores.get(hit["key"], 0.0) + 1.0 / (RRF_K + rank + 1)
+            documents[hit["key"]] = hit["document"]
+        for rank, (key, _) in enumerate(lexical_hits):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        hits = []
+        for key in sorted(scores, key=scores.get, reverse=True):
+            doc = documents.get(key) or snapshot.docstore.get(key)
+            if doc is None:
                 continue
-            doc = self.documents[idx]
-            results.append({"score": float(score), "document": doc})
+            hits.append({"key": key, "score": scores[key], "document": doc})
+            if len(hits) == (top_k or self.top_k):
+                break
+        return hits
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Queries sharing a filter share one search; each distinct filter needs its own selector.
+            groups: Dict[Any, tuple] = {}
+            for query, selection, future in batch:
+                key = selection.key if selection is not None else None
+                groups.setdefault(key, (selection, []))[1].append((query, future))
+            for selection, items in groups.values():
+                try:
+                    results = self._search_many([q for q, _ in items], selection)
+                except Exception as e:
+                    for _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(items, results):
+                    future.set_result(result)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "index_version": self.content_version,
+            "embeddings": self.embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+        }
+
+    def shard_stats(self) -> Optional[Dict[str, Any]]:
+        return self.shards.stats() if self.shards is not None else None
+
+    def embed(self, query: str) -> np.ndarray:
+        return self._embed([normalize_query(query)])[0]
+
+    def _embed(self, queries: List[str]) -> np.ndarray:
+        vectors = [self.embedding_cache.get(q) for q in queries]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            encoded = self.embedder.encode([queries[i] for i in missing])
+            if encoded.ndim == 1:
+                encoded = encoded.reshape(1, -1)
+            for i, vector in zip(missing, encoded.astype("float32")):
+                self.embedding_cache.put(queries[i], vector)
+                vectors[i] = vector
+        return np.ascontiguousarray(np.vstack(vectors), dtype="float32")
+
+    def _search_many(self, queries: List[str], selection: Optional[Selection] = None) -> List[List[Dict[str, Any]]]:
+        snapshot = self._snapshot
+        filter_key = selection.key if selection is not None else None
+        if selection is None or selection.version != snapshot.content_version:
+            selection = self._selection(snapshot, filter_key)
+        version = snapshot.content_version
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        k = self.candidates
+        normalized = [normalize_query(q) if q else "" for q in queries]
 
+        rows = []
+        for i, q in enumerate(normalized):
+            if not q:
+                continue
+            cached = self.result_cache.get((q, k, version, filter_key))
+            if cached is not None:
+                results[i] = cached
+            else:
+                rows.append(i)
+        if not rows:
+            return results
+
+        # Duplicate queries inside one batch are embedded and searched once.
+        unique = list(dict.fromkeys(normalized[i] for i in rows))
+        query_embeddings = self._embed(unique)
+        if snapshot.dim is not None and query_embeddings.shape[1] != snapshot.dim:
+            raise RuntimeError(f"Embedding dimension mismatch: query {query_embeddings.shape[1]} vs index {snapshot.dim}")
+        scores, indices, complete = search_vectors(snapshot, query_embeddings, k, selection)
+
+        fresh = {}
+        for q, row_scores, row_indices in zip(unique, scores, indices):
+            hits = []
+            for score, idx in zip(row_scores, row_indices):
+                if idx < 0:
+                    continue
+                doc = snapshot.docstore.get(int(idx))
+                if doc is None:
+                    continue
+                hits.append({"key": int(idx), "score": float(score), "document": doc})
+            fresh[q] = hits
+            if complete:
+                # Partial shard results are served but not cached, so the next request retries all shards.
+                self.result_cache.put((q, k, version, filter_key), hits)
+
+        for i in rows:
+            results[i] = fresh[normalized[i]]
         return results
+
+
+def map_vectors(vectors_path: Path, dim: int, count: int) -> np.ndarray:
+    # The indexing service appends vectors before the docstore rows they belong to.
+    available = vectors_path.stat().st_size // (4 * dim) if vectors_path.exists() else 0
+    if available < count:
+        raise RuntimeError(f"{vectors_path} has {available} vectors but re-scoring needs {count}")
+    return np.memmap(vectors_path, dtype="float32", mode="r", shape=(count, dim))
+
+
+def search_snapshot(snapshot: IndexSnapshot, queries: np.ndarray, k: int, selection: Optional[Selection] = None):
+    if selection is None:
+        return search_segments(snapshot.segments, queries, k, snapshot.vectors, snapshot.docstore.keys)
+    return search_segments(snapshot.segments, queries, k, snapshot.vectors, snapshot.docstore.keys,
+                           selection.bitmap(), selection.fraction)
+
+
+def search_vectors(snapshot: IndexSnapshot, queries: np.ndarray, k: int, selection: Optional[Selection] = None):
+    # Returns FAISS-style (scores, keys) plus whether every shard contributed.
+    if selection is not None and snapshot.vectors is not None and selection.count <= FILTER_EXACT_MAX_ROWS:
+        # Scoring a few thousand admitted rows directly beats walking the index past rejected ones.
+        scores, keys = exact_search(snapshot.vectors, queries, selection.rows, selection.keys, k)
+        return scores, keys, True
+    missing = []
+    if snapshot.shards is not None:
+        scores, keys, missing = snapshot.shards.search(queries, k, snapshot.version, selection)
+    else:
+        scores, keys = search_snapshot(snapshot, queries, k, selection)
+    if selection is not None and snapshot.vectors is not None:
+        # IVF probes and HNSW walks can run out of admitted candidates; top those rows up exactly
+        # so filtered queries still return a full k.
+        short = (keys >= 0).sum(axis=1) < min(k, selection.count)
+        if short.any():
+            scores[short], keys[short] = exact_search(snapshot.vectors, queries[short], selection.rows,
+                                                      selection.keys, k)
+    return scores, keys, not missing
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
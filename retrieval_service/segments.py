@@ -0,0 +1,181 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import faiss
+import numpy as np
+from docstore import key_rows
+from filters import search_parameters
+from config import INDEX_MMAP
+
+
+def version_number(version: str) -> int:
+    try:
+        return int(version.lstrip("v"))
+    except ValueError:
+        return -1
+
+
+def read_index(index_path: Path, binary: bool = False):
+    read = faiss.read_index_binary if binary else faiss.read_index
+    if INDEX_MMAP:
+        try:
+            return read(str(index_path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"[Retriever] Memory-mapped load not supported for {index_path.name}, reading fully: {e}")
+    return read(str(index_path))
+
+
+def apply_search_params(index, params: Dict[str, Any]):
+    # nprobe / efSearch chosen by the indexing service's build-time calibration.
+    space = faiss.ParameterSpace()
+    for name, value in (params or {}).items():
+        # rerank_overfetch is applied in search_segments, not a FAISS parameter.
+        if name != "rerank_overfetch":
+            space.set_index_parameter(index, name, value)
+    return index
+
+
+def rerank(vectors: np.ndarray, queries: np.ndarray, candidates: np.ndarray, k: int, keys: np.ndarray):
+    # candidates are docstore keys; keys (the docstore's, sorted) locates their vector rows.
+    scores = np.full((len(queries), k), -np.inf, dtype="float32")
+    ids = np.full((len(queries), k), -1, dtype="int64")
+    for i, (query, row) in enumerate(zip(queries, candidates)):
+        row = np.unique(row[row >= 0])
+        rows = key_rows(keys, row)
+        row, rows = row[rows >= 0], rows[rows >= 0]
+        if not len(row):
+            continue
+        exact = np.asarray(vectors[rows], dtype="float32") @ query
+        top = np.argsort(-exact)[:k]
+        scores[i, :len(top)] = exact[top]
+        ids[i, :len(top)] = row[top]
+    return scores, ids
+
+
+# One immutable index file: a segments/<id>.index written by the indexing service, or the whole
+# vN.index of a version from before segments.
+class Segment:
+    def __init__(self, segment_id: str, index, meta: Dict[str, Any]):
+        self.id = segment_id
+        self.index = index
+        self.meta = meta
+        self.compression = meta.get("build_params", {}).get("compression", "none")
+        self.rerank_overfetch = int(meta.get("search_params", {}).get("rerank_overfetch", 1))
+        self.labelled = isinstance(index, (faiss.IndexIDMap, faiss.IndexBinaryIDMap))
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def info(self) -> Dict[str, Any]:
+        return {"id": self.id, "rows": self.ntotal, "index_type": self.meta.get("index_type"),
+                "compression": self.compression}
+
+
+# Reads the version catalog (manifest.json) of one index directory and loads the segments a
+# version lists. Segments are immutable, so ones already loaded are reused across versions and
+# following a new version only reads the segments sealed since.
+class SegmentCatalog:
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        self.manifest_path = self.index_dir / "manifest.json"
+        self._loaded: Dict[str, Segment] = {}
+        self._parts: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _manifest(self) -> List[Dict[str, Any]]:
+        if not self.manifest_path.exists():
+            return []
+        return json.loads(self.manifest_path.read_text())["versions"]
+
+    def list_versions(self) -> List[str]:
+        versions = {entry["version"] for entry in self._manifest()}
+        for meta_path in self.index_dir.glob("v*.meta.json"):
+            version = meta_path.name[: -len(".meta.json")]
+            if (self.index_dir / f"{version}.index").exists():
+                versions.add(version)
+        return sorted(versions, key=version_number)
+
+    def meta(self, version: str) -> Dict[str, Any]:
+        entry = next((entry for entry in self._manifest() if entry["version"] == version), None)
+        if entry is not None:
+            return entry
+        meta_path = self.index_dir / f"{version}.meta.json"
+        if not meta_path.exists() or not (self.index_dir / f"{version}.index").exists():
+            raise FileNotFoundError(f"Index version {version} not found in {self.index_dir}")
+        return json.loads(meta_path.read_text())
+
+    def segments(self, meta: Dict[str, Any]) -> List[Segment]:
+        with self._lock:
+            if "segments" not in meta:
+                segment_ids = [meta["version"]]
+                paths = {meta["version"]: (self.index_dir / f"{meta['version']}.index", meta)}
+            else:
+                segment_ids = meta["segments"]
+                paths = {}
+                for segment_id in segment_ids:
+                    if segment_id not in self._loaded:
+                        segment_meta = json.loads((self.index_dir / "segments" / f"{segment_id}.json").read_text())
+                        paths[segment_id] = (self.index_dir / "segments" / f"{segment_id}.index", segment_meta)
+            loaded = {}
+            for segment_id in segment_ids:
+                segment = self._loaded.get(segment_id)
+                if segment is None:
+                    index_path, segment_meta = paths[segment_id]
+                    compression = segment_meta.get("build_params", {}).get("compression", "none")
+                    index = apply_search_params(read_index(index_path, binary=compression == "binary"),
+                                                segment_meta.get("search_params", {}))
+                    segment = Segment(segment_id, index, segment_meta)
+                loaded[segment_id] = segment
+            # Snapshots hold their own references; the cache only keeps what the newest load uses.
+            self._loaded = loaded
+            return [loaded[segment_id] for segment_id in segment_ids]
+
+    def parts(self, meta: Dict[str, Any], kind: str, load: Callable[[Path], Any]) -> Optional[List[Any]]:
+        # The version's lexical or attribute parts (segments/<id>.<kind>.npz), cached like segments.
+        # Versions from before parts have one vN.<kind>.npz; None when there is neither.
+        with self._lock:
+            if kind not in meta:
+                path = self.index_dir / f"{meta['version']}.{kind}.npz"
+                return [load(path)] if path.exists() else None
+            cached = self._parts.get(kind, {})
+            loaded = {}
+            for part in meta[kind]:
+                path = self.index_dir / "segments" / f"{part['id']}.{kind}.npz"
+                loaded[part["id"]] = cached.get(part["id"]) or load(path)
+            self._parts[kind] = loaded
+            return [loaded[part["id"]] for part in meta[kind]]
+
+
+def search_segments(segments: List[Segment], queries: np.ndarray, k: int, vectors: Optional[np.ndarray] = None,
+                    row_keys: Optional[np.ndarray] = None, bitmap: Optional[np.ndarray] = None, fraction: float = 1.0,
+                    unlabelled: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+    # Each segment answers its own top-k (a filter runs inside FAISS through the ID selector) and
+    # the lists are merged by score; keys are disjoint across segments.
+    parts = []
+    for segment in segments:
+        if not segment.ntotal:
+            continue
+        params = search_parameters(segment.index, bitmap, fraction) if bitmap is not None else None
+        if segment.compression == "none":
+            scores, ids = segment.index.search(queries, k, params=params)
+        else:
+            # The compressed codes only pick rerank_overfetch x k candidates; their scores are recomputed exactly.
+            codes = np.packbits(queries > 0, axis=1) if segment.compression == "binary" else queries
+            scores, ids = segment.index.search(codes, min(k * segment.rerank_overfetch, segment.ntotal), params=params)
+        if not segment.labelled and unlabelled is not None:
+            ids = np.where(ids >= 0, unlabelled(ids), -1)
+        if segment.compression != "none":
+            scores, ids = rerank(vectors, queries, ids, k, row_keys)
+        parts.append((np.where(ids >= 0, scores, -np.inf).astype("float32"), ids))
+    if not parts:
+        return np.full((len(queries), k), -np.inf, dtype="float32"), np.full((len(queries), k), -1, dtype="int64")
+    if len(parts) == 1:
+        return parts[0]
+    scores = np.hstack([part[0] for part in parts])
+    ids = np.hstack([part[1] for part in parts])
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
@@ -0,0 +1,112 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+# Serves one index shard over HTTP so a retrieval service on another process or node can fan out
+# to it (SHARD_ENDPOINTS). It only needs INDEX_DIR/shards/<id>/, plus VECTORS_PATH and the docstore
+# index for compressed shards, and follows the latest shard version the indexing service writes.
+#
+#   python shard_server.py --shard 1 --shards 2 --port 8102
+
+import argparse
+import base64
+import threading
+import time
+from typing import List, Optional
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from shards import LocalShard
+from config import INDEX_DIR, VECTORS_PATH, DOCSTORE_PATH, INDEX_POLL_SECONDS, INDEX_SHARDS
+
+app = FastAPI(
+    title="Kitty Cash Retrieval Shard",
+    description="Searches one partition of the FAISS index for a sharded retrieval service.",
+    version="1.0.0"
+)
+
+shard: Optional[LocalShard] = None
+load_error: Optional[str] = None
+
+
+class ShardSearchRequest(BaseModel):
+    vectors: List[List[float]]
+    k: int
+    version: Optional[str] = None
+    # Base64 of the selection's packed bitmap over global docstore keys.
+    bitmap: Optional[str] = None
+    fraction: float = 1.0
+
+
+def follow_latest(poll_seconds: float):
+    global load_error
+    while True:
+        try:
+            versions = shard.list_versions()
+            if not versions:
+                raise FileNotFoundError(f"No shard versions in {shard.shard_dir}")
+            if versions[-1] != shard.version:
+                shard.load(versions[-1])
+            load_error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if error != load_error:
+                print(f"[Shard {shard.shard_id}] Load failed, retrying every {poll_seconds}s: {error}")
+            load_error = error
+        time.sleep(poll_seconds)
+
+
+@app.on_event("startup")
+def startup_event():
+    threading.Thread(target=follow_latest, args=(max(INDEX_POLL_SECONDS, 1),), name="shard-index-watcher",
+                     daemon=True).start()
+
+
+@app.get("/health")
+@app.get("/health/live")
+def health_check():
+    return {"status": f"Retrieval shard {shard.shard_id} running"}
+
+
+@app.get("/health/ready")
+def readiness_check():
+    ready = shard.version is not None
+    body = {"ready": ready, "shard": shard.shard_id, "shards": shard.shards, "version": shard.version,
+            "rows": shard.rows, "error": load_error}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.post("/search")
+def search(req: ShardSearchRequest):
+    if shard.version is None:
+        raise HTTPException(status_code=503, detail="Shard index is still loading")
+    if not req.vectors or req.k < 1:
+        raise HTTPException(status_code=400, detail="vectors must be non-empty and k positive")
+    queries = np.ascontiguousarray(req.vectors, dtype="float32")
+    bitmap = np.frombuffer(base64.b64decode(req.bitmap), dtype=np.uint8).copy() if req.bitmap is not None else None
+    version = shard.version
+    scores, keys = shard.search(queries, req.k, bitmap=bitmap, fraction=req.fraction)
+    # -inf pads short result lists; JSON has no infinity, and key -1 already marks the slot empty.
+    scores = np.where(keys >= 0, scores, 0.0)
+    return {"shard": shard.shard_id, "version": version, "scores": scores.tolist(), "keys": keys.tolist()}
+
+
+def main():
+    global shard
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shard", type=int, required=True)
+    parser.add_argument("--shards", type=int, default=INDEX_SHARDS)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--vectors-path", default=VECTORS_PATH)
+    parser.add_argument("--docstore-path", default=DOCSTORE_PATH)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8102)
+    args = parser.parse_args()
+    if not 0 <= args.shard < args.shards:
+        parser.error(f"--shard must be in [0, {args.shards})")
+    shard = LocalShard(args.shard, args.shards, args.index_dir, args.vectors_path, args.docstore_path)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import base64
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import httpx
+import numpy as np
+from docstore import DocStoreReader
+from retriever import map_vectors
+from segments import SegmentCatalog, search_segments
+
+
+class ShardError(RuntimeError):
+    pass
+
+
+# One partition written by the indexing service under INDEX_DIR/shards/<id>/. Docstore key k lives
+# in shard k % N, and the shard's segments label it with k, so hits are already global keys.
+class LocalShard:
+    def __init__(self, shard_id: int, shards: int, index_dir: str, vectors_path: str, docstore_path: str):
+        self.shard_id = shard_id
+        self.shards = shards
+        self.kind = "local"
+        self.shard_dir = Path(index_dir) / "shards" / str(shard_id)
+        self.catalog = SegmentCatalog(self.shard_dir)
+        self.vectors_path = Path(vectors_path)
+        self.docstore_path = Path(docstore_path)
+        # (version, segments, vectors, row keys), replaced as a whole on reload.
+        self._state = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._state[0] if self._state else None
+
+    @property
+    def rows(self) -> int:
+        return sum(segment.ntotal for segment in self._state[1]) if self._state else 0
+
+    def list_versions(self) -> List[str]:
+        return self.catalog.list_versions()
+
+    def load(self, version: str) -> Dict[str, Any]:
+        with self._lock:
+            meta = self.catalog.meta(version)
+            if meta.get("shard") != self.shard_id or meta.get("shards") != self.shards:
+                raise RuntimeError(f"{self.shard_dir} {version} is shard {meta.get('shard')} of {meta.get('shards')}, "
+                                   f"expected {self.shard_id} of {self.shards}")
+            if self.version == version:
+                return meta
+            segments = self.catalog.segments(meta)
+            vectors = keys = None
+            if any(segment.compression != "none" for segment in segments):
+                # Compressed segments re-score against the shared float vectors; docstore.idx maps keys to rows.
+                keys = DocStoreReader(self.docstore_path, limit=int(meta["doc_count"]), key_limit=meta.get("key_limit")).keys
+                vectors = map_vectors(self.vectors_path, meta["dim"], len(keys))
+            self._state = (version, segments, vectors, keys)
+            print(f"[Shard {self.shard_id}] Loaded version {version} with {self.rows} rows in {len(segments)} segments")
+            return meta
+
+    def _global_keys(self, ids: np.ndarray) -> np.ndarray:
+        # Shards written before stable ids number rows locally: key k sat at row k // N.
+        return ids * self.shards + self.shard_id
+
+    def search(self, queries: np.ndarray, k: int, version: str = None, bitmap: np.ndarray = None,
+               fraction: float = 1.0):
+        _, segments, vectors, row_keys = self._state
+        # bitmap is the selection over global keys, shared by all shards.
+        return search_segments(segments, queries, k, vectors, row_keys, bitmap, fraction, self._global_keys)
+
+
+# A shard served by shard_server.py on another process or node. It follows that node's latest
+# shard version; keys are docstore prefixes, so a lagging shard still returns valid keys.
+class RemoteShard:
+    def __init__(self, shard_id: int, url: str, timeout: float):
+        self.shard_id = shard_id
+        self.kind = "remote"
+        self.url = url
+        self.version = None
+        self.client = httpx.Client(base_url=url, timeout=timeout)
+
+    def load(self, version: str):
+        return None
+
+    def search(self, queries: np.ndarray, k: int, version: str = None, bitmap: np.ndarray = None,
+               fraction: float = 1.0):
+        payload = {"vectors": queries.tolist(), "k": k, "version": version}
+        if bitmap is not None:
+            payload["bitmap"] = base64.b64encode(bitmap.tobytes()).decode("ascii")
+            payload["fraction"] = fraction
+        response = self.client.post("/search", json=payload)
+        response.raise_for_status()
+        body = response.json()
+        self.version = body["version"]
+        keys = np.asarray(body["keys"], dtype="int64").reshape(len(queries), -1)
+        scores = np.asarray(body["scores"], dtype="float32").reshape(len(queries), -1)
+        return np.where(keys >= 0, scores, -np.inf).astype("float32"), keys
+
+
+# Fans each query batch out to every shard in parallel and merges the per-shard top-k by score.
+# Shards that fail or miss the deadline are left out; fewer than SHARD_MIN_FRACTION answering is an
+# error, since results from a small slice of the corpus are worse than a retry.
+class ShardRouter:
+    def __init__(self, shards: int, index_dir: str, vectors_path: str, docstore_path: str, endpoints: Dict[int, str],
+                 timeout_ms: float, min_fraction: float):
+        self.timeout = max(0.001, float(timeout_ms) / 1000.0)
+        self.workers = [RemoteShard(i, endpoints[i], self.timeout) if i in endpoints
+                        else LocalShard(i, shards, index_dir, vectors_path, docstore_path) for i in range(shards)]
+        self.required = min(shards, max(1, math.ceil(shards * float(min_fraction))))
+        # Room for concurrent batches; FAISS releases the GIL, so local shards search in parallel.
+        self._pool = ThreadPoolExecutor(max_workers=shards * 2, thread_name_prefix="shard-search")
+        self._stats_lock = threading.Lock()
+        self._stats = [{"searches": 0, "failures": 0, "timeouts": 0, "seconds": 0.0, "last_error": None}
+                       for _ in range(shards)]
+        self.partial = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self.workers)
+
+    def load(self, version: str):
+        for worker in self.workers:
+            worker.load(version)
+
+    def _timed(self, worker, queries: np.ndarray, k: int, version: str, selection):
+        started = time.perf_counter()
+        if selection is None:
+            result = worker.search(queries, k, version)
+        else:
+            result = worker.search(queries, k, version, selection.bitmap(), selection.fraction)
+        return result, time.perf_counter() - started
+
+    def search(self, queries: np.ndarray, k: int, version: str = None, selection=None):
+        futures = [(worker, self._pool.submit(self._timed, worker, queries, k, version, selection))
+                   for worker in self.workers]
+        done, _ = wait([future for _, future in futures], timeout=self.timeout)
+
+        parts, missing = [], []
+        with self._stats_lock:
+            for worker, future in futures:
+                stats = self._stats[worker.shard_id]
+                stats["searches"] += 1
+                if future not in done:
+                    stats["timeouts"] += 1
+                    missing.append(worker.shard_id)
+                elif future.exception() is not None:
+                    stats["failures"] += 1
+                    stats["last_error"] = f"{type(future.exception()).__name__}: {future.exception()}"
+                    missing.append(worker.shard_id)
+                else:
+                    result, seconds = future.result()
+                    stats["seconds"] += seconds
+                    parts.append(result)
+            if len(parts) < self.required:
+                self.failed += 1
+            elif missing:
+                self.partial += 1
+        if len(parts) < self.required:
+            raise ShardError(f"Only {len(parts)} of {len(self.workers)} shards answered, need {self.required}")
+        if missing:
+            print(f"[ShardRouter] Partial results: shards {missing} timed out or failed")
+
+        scores = np.hstack([part[0] for part in parts])
+        keys = np.hstack([part[1] for part in parts])
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(keys, order, axis=1), missing
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            shards = []
+            for worker, stats in zip(self.workers, self._stats):
+                answered = stats["searches"] - stats["failures"] - stats["timeouts"]
+                shards.append({
+                    "shard": worker.shard_id,
+                    "kind": worker.kind,
+                    "url": getattr(worker, "url", None),
+                    "version": worker.version,
+                    "searches": stats["searches"],
+                    "failures": stats["failures"],
+                    "timeouts": stats["timeouts"],
+                    "avg_ms": round(1000 * stats["seconds"] / answered, 3) if answered else None,
+                    "last_error": stats["last_error"],
+                })
+            return {"shards": shards, "required": self.required, "timeout_ms": self.timeout * 1000,
+                    "partial_results": self.partial, "failed_searches": self.failed}
@@ -0,0 +1,179 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import json
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List
+import httpx
+import numpy as np
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+INDEXING_DIR = SERVICE_DIR.parent / "data_indexing_service"
+if str(SERVICE_DIR) not in sys.path:
+    sys.path.insert(0, str(SERVICE_DIR))
+
+from embedder import register_family
+
+HASHING_MODEL = "hashing-test"
+HASHING_DIM = 256
+WORD = re.compile(r"\w+")
+
+# Runs the indexing service (its modules share names with ours, so in its own process) against a
+# data directory, then sends it the given requests and prints their responses.
+INDEXING_SCRIPT = """
+import json, sys, time
+sys.path[:0] = [sys.argv[1], sys.argv[1] + "/tests"]
+from conftest import load_indexing_app
+from fastapi.testclient import TestClient
+app = load_indexing_app(sys.argv[2], int(sys.argv[3]))
+client = TestClient(app.app)
+responses = []
+for method, path, body in json.loads(sys.argv[4]):
+    response = client.request(method, path, json=body)
+    responses.append({"status": response.status_code, "body": response.json()})
+    while app.compactor.running or app.merger.running:
+        time.sleep(0.05)
+print("RESPONSES " + json.dumps(responses))
+"""
+
+
+def hashing_vectors(texts: List[str]) -> np.ndarray:
+    # Same encoder as data_indexing_service/tests/conftest.py, so queries land in the index's space.
+    out = np.zeros((len(texts), HASHING_DIM), dtype="float32")
+    for row, text in enumerate(texts):
+        for word in WORD.findall(text.lower()):
+            code = zlib.crc32(word.encode("utf-8"))
+            out[row, code % HASHING_DIM] += 1.0 if code & 0x80000000 else -1.0
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.where(norms > 0, norms, 1.0)
+
+
+class HashingBackend:
+    timings = {}
+
+    def encode(self, texts) -> np.ndarray:
+        return hashing_vectors(list(texts))
+
+
+@register_family("hashing")
+def load_hashing(model_name: str, backend: str):
+    return HashingBackend()
+
+
+def run_indexing(data_dir: Path, shards: int = 1, requests: List[tuple] = ()) -> List[Dict[str, Any]]:
+    result = subprocess.run(
+        [sys.executable, "-c", INDEXING_SCRIPT, str(INDEXING_DIR), str(data_dir), str(shards), json.dumps(requests)],
+        cwd=INDEXING_DIR, capture_output=True, text=True, timeout=300,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Indexing service failed:\n{result.stdout}\n{result.stderr}")
+    line = next(line for line in result.stdout.splitlines() if line.startswith("RESPONSES "))
+    return json.loads(line[len("RESPONSES "):])
+
+
+def write_kb(data_dir: Path, name: str, lines: List[str]):
+    kb_dir = Path(data_dir) / "kb_files"
+    kb_dir.mkdir(parents=True, exist_ok=True)
+    (kb_dir / name).write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def kb_lines(count: int, prefix: str) -> List[str]:
+    words = ["wallet", "group", "payout", "bid", "admin", "cashier", "member", "term", "bonus", "fee", "refund",
+             "profile", "password", "subscription", "invite", "approval", "settle", "ledger", "receipt", "transfer"]
+    rng = random.Random(prefix)
+    lines = []
+    for i in range(count):
+        topic = rng.sample(words, 4)
+        lines.append(f"How does the {topic[0]} {topic[1]} work for {prefix} case {i}? | "
+                     f"The {topic[2]} {topic[3]} applies in {prefix} step {i}.")
+    return lines
+
+
+def exact_scores(data_dir: Path, query: str, sources: List[str] = None) -> Dict[int, float]:
+    # Brute-force cosine of the query against every live docstore row.
+    from docstore import DocStoreReader, TombstoneReader
+    reader = DocStoreReader(str(Path(data_dir) / "docstore.jsonl"))
+    tombstones = TombstoneReader(str(Path(data_dir) / "docstore.tombstones"))
+    tombstones.refresh()
+    vectors = np.fromfile(Path(data_dir) / "faiss_index" / "vectors.f32", dtype="float32").reshape(-1, HASHING_DIM)
+    scores = vectors[:len(reader)] @ hashing_vectors([query])[0]
+    exact = {}
+    for key, score in zip(reader.keys.tolist(), scores.tolist()):
+        if key in tombstones.keys or (sources and reader.get(key)["source"] not in sources):
+            continue
+        exact[key] = score
+    return exact
+
+
+def assert_exact_top_k(hits: List[Dict[str, Any]], exact: Dict[int, float], k: int):
+    # The hashing encoder gives many rows equal scores, so keys are only compared where scores differ.
+    expected = sorted(exact.values(), reverse=True)[:k]
+    np.testing.assert_allclose([hit["score"] for hit in hits], expected, rtol=1e-5, atol=1e-6)
+    for hit in hits:
+        assert hit["key"] in exact
+        assert abs(exact[hit["key"]] - hit["score"]) < 1e-5
+    assert len({hit["key"] for hit in hits}) == len(hits)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def shard_servers(data_dir: Path, shards: int):
+    processes, endpoints = {}, {}
+    try:
+        for shard_id in range(shards):
+            port = free_port()
+            processes[shard_id] = subprocess.Popen(
+                [sys.executable, "shard_server.py", "--shard", str(shard_id), "--shards", str(shards),
+                 "--index-dir", str(data_dir / "faiss_index"), "--vectors-path", str(data_dir / "faiss_index" / "vectors.f32"),
+                 "--docstore-path", str(data_dir / "docstore.jsonl"), "--host", "127.0.0.1", "--port", str(port)],
+                cwd=SERVICE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            endpoints[shard_id] = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 60
+        for shard_id, url in endpoints.items():
+            while True:
+                try:
+                    if httpx.get(f"{url}/health/ready", timeout=1).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if processes[shard_id].poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"Shard server {shard_id} did not become ready")
+                time.sleep(0.2)
+        yield processes, endpoints
+    finally:
+        for process in processes.values():
+            process.terminate()
+            process.wait(timeout=10)
+
+
+@pytest.fixture
+def make_retriever(monkeypatch):
+    import retriever as retriever_module
+
+    def make(data_dir: Path, shards: int = 1, endpoints: Dict[int, str] = None, min_fraction: float = 0.5,
+             timeout_ms: float = 5000, top_k: int = 5):
+        monkeypatch.setattr(retriever_module, "INDEX_SHARDS", shards)
+        monkeypatch.setattr(retriever_module, "SHARD_ENDPOINTS", endpoints or {})
+        monkeypatch.setattr(retriever_module, "SHARD_MIN_FRACTION", min_fraction)
+        monkeypatch.setattr(retriever_module, "SHARD_TIMEOUT_MS", timeout_ms)
+        monkeypatch.setattr(retriever_module, "VECTORS_PATH", str(data_dir / "faiss_index" / "vectors.f32"))
+        loaded = retriever_module.Retriever(HASHING_MODEL, str(data_dir / "faiss_index"), str(data_dir / "docstore.jsonl"),
+                                            top_k, poll_seconds=0)
+        loaded.start()
+        return loaded
+
+    return make
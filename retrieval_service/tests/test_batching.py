@@ -0,0 +1,97 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from conftest import assert_exact_top_k, exact_scores, kb_lines, run_indexing, write_kb
+
+QUERIES = [f"how does the {a} {b} work" for a, b in [("wallet", "payout"), ("group", "bid"), ("admin", "fee"),
+                                                      ("refund", "receipt"), ("member", "bonus"),
+                                                      ("ledger", "transfer")]]
+
+
+@pytest.fixture(scope="module")
+def indexed(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("batching")
+    write_kb(data_dir, "kb_a.txt", kb_lines(60, "alpha"))
+    run_indexing(data_dir)
+    return data_dir
+
+
+@pytest.fixture
+def held_encoder(monkeypatch):
+    # Records the size of every encode call. While the gate is closed the batch worker blocks in
+    # the first encode, so the searches submitted meanwhile queue up for the next batch; with fail
+    # that batch's encode raises.
+    def install(retriever, fail=False):
+        gate, entered, calls = threading.Event(), threading.Event(), []
+        real_encode = retriever.embedder.encode
+
+        def encode(texts):
+            calls.append(len(texts))
+            if len(calls) == 1:
+                entered.set()
+                assert gate.wait(30)
+            elif fail and len(calls) == 2:
+                raise RuntimeError("encoder failed")
+            return real_encode(texts)
+
+        monkeypatch.setattr(retriever.embedder, "encode", encode)
+        # Long enough for every queued search to join the batch on a slow machine.
+        retriever.max_wait = 1.0
+        return gate, entered, calls
+
+    return install
+
+
+def submit_held(retriever, gate, entered, pool):
+    blocker = pool.submit(retriever.search, "held open by the first encode", "dense")
+    assert entered.wait(30)
+    futures = [pool.submit(retriever.search, query, "dense") for query in QUERIES]
+    # Every search is in the pending queue before the worker is released.
+    while retriever._pending.qsize() < len(QUERIES):
+        time.sleep(0.01)
+    gate.set()
+    return blocker, futures
+
+
+def test_concurrent_searches_share_one_encode(indexed, make_retriever, held_encoder):
+    retriever = make_retriever(indexed, top_k=5)
+    gate, entered, calls = held_encoder(retriever)
+    with ThreadPoolExecutor(len(QUERIES) + 1) as pool:
+        blocker, futures = submit_held(retriever, gate, entered, pool)
+        blocker.result(timeout=30)
+        results = [future.result(timeout=30) for future in futures]
+
+    assert calls == [1, len(QUERIES)]
+    # Each caller gets the hits for its own query, not a neighbour's in the batch.
+    for query, hits in zip(QUERIES, results):
+        assert_exact_top_k(hits, exact_scores(indexed, query), 5)
+    assert len({tuple(hit["key"] for hit in hits) for hits in results}) == len(QUERIES)
+
+
+def test_batch_error_reaches_every_waiter(indexed, make_retriever, held_encoder):
+    retriever = make_retriever(indexed, top_k=5)
+    gate, entered, calls = held_encoder(retriever, fail=True)
+    with ThreadPoolExecutor(len(QUERIES) + 1) as pool:
+        blocker, futures = submit_held(retriever, gate, entered, pool)
+        blocker.result(timeout=30)
+        for future in futures:
+            with pytest.raises(RuntimeError, match="encoder failed"):
+                future.result(timeout=30)
+    assert calls == [1, len(QUERIES)]
+    # The worker survives the failed batch and nothing failed was cached.
+    assert_exact_top_k(retriever.search(QUERIES[0], "dense"), exact_scores(indexed, QUERIES[0]), 5)
+
+
+def test_search_batch_encodes_once(indexed, make_retriever, monkeypatch):
+    retriever = make_retriever(indexed, top_k=5)
+    calls = []
+    real_encode = retriever.embedder.encode
+    monkeypatch.setattr(retriever.embedder, "encode", lambda texts: calls.append(len(texts)) or real_encode(texts))
+    # A repeated query is embedded once and answered for both positions.
+    results = retriever.search_batch(QUERIES + QUERIES[:1], "dense")
+    assert calls == [len(QUERIES)] and results[-1] == results[0]
+    for query, hits in zip(QUERIES, results):
+        assert_exact_top_k(hits, exact_scores(indexed, query), 5)
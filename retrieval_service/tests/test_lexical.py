@@ -0,0 +1,156 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import math
+from collections import Counter
+import numpy as np
+import pytest
+from conftest import kb_lines, run_indexing, write_kb
+from config import BM25_B, BM25_K1, RRF_K
+from filters import AttributeIndex, AttributePart
+from lexical import BM25Index, LexicalPart, tokenize
+
+TEXTS = ["wallet payout for refund receipts", "refund policy", "", "kc-1042 payout delay", "wallet top-up limits",
+         "refund refund refund", "", "payout schedule for merchants", "receipts and invoices", "wallet kc-1042",
+         "merchant refund receipts", "payout"]
+SOURCES = ["a.txt", "b.txt", None, "a.txt", "c.txt", "b.txt", None, "a.txt", "c.txt", "b.txt", "a.txt", "c.txt"]
+# Key ranges as the indexing service seals them: a base and upload deltas.
+SPLITS = [(0, 5), (5, 9), (9, 12)]
+
+
+def write_lexical_part(path, key_start, texts):
+    # Empty texts stand for keys compacted away.
+    postings, doc_lens = {}, []
+    for key, text in enumerate(texts, key_start):
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((key, tf))
+        doc_lens.append(sum(counts.values()))
+    terms = sorted(postings)
+    offsets = np.cumsum([0] + [len(postings[term]) for term in terms])
+    np.savez(path, terms=np.array(terms, dtype=str), offsets=offsets,
+             keys=np.array([key for term in terms for key, _ in postings[term]], dtype="int64"),
+             tfs=np.array([tf for term in terms for _, tf in postings[term]], dtype="int32"),
+             doc_lens=np.array(doc_lens, dtype="int32"), key_start=np.int64(key_start))
+    return LexicalPart(path)
+
+
+def write_attribute_part(path, key_start, sources, added_at):
+    postings = {}
+    for key, source in enumerate(sources, key_start):
+        if source is not None:
+            postings.setdefault(source, []).append(key)
+    values = sorted(postings)
+    np.savez(path, fields=np.array(["source"], dtype=str), key_start=np.int64(key_start),
+             added_at=np.array(added_at, dtype="int64"), **{
+                 "source.values": np.array(values, dtype=str),
+                 "source.offsets": np.cumsum([0] + [len(postings[value]) for value in values]),
+                 "source.keys": np.array([key for value in values for key in postings[value]], dtype="int64")})
+    return AttributePart(path)
+
+
+@pytest.fixture
+def lexical(tmp_path):
+    single = BM25Index([write_lexical_part(tmp_path / "all.lexical.npz", 0, TEXTS)])
+    parts = BM25Index([write_lexical_part(tmp_path / f"{start}.lexical.npz", start, TEXTS[start:end])
+                       for start, end in SPLITS])
+    return single, parts
+
+
+@pytest.mark.parametrize("query", ["refund receipts", "wallet payout kc-1042", "payout", "unknown terms"])
+@pytest.mark.parametrize("filtered", [False, True])
+def test_bm25_over_parts_matches_single_part(lexical, query, filtered):
+    single, parts = lexical
+    assert (parts.doc_count, parts.avg_len, parts.key_space) == (single.doc_count, single.avg_len, single.key_space)
+    mask = np.arange(len(TEXTS)) % 2 == 0 if filtered else None
+    expected = single.search(tokenize(query), 5, mask)
+    found = parts.search(tokenize(query), 5, mask)
+    assert [key for key, _ in found] == [key for key, _ in expected]
+    np.testing.assert_allclose([score for _, score in found], [score for _, score in expected], rtol=1e-6)
+
+
+def test_attribute_mask_over_parts_matches_single_part(tmp_path):
+    added_at = [-1 if source is None else 1000 + key for key, source in enumerate(SOURCES)]
+    single = AttributeIndex([write_attribute_part(tmp_path / "all.npz", 0, SOURCES, added_at)])
+    parts = AttributeIndex([write_attribute_part(tmp_path / f"{start}.npz", start, SOURCES[start:end],
+                                                 added_at[start:end]) for start, end in SPLITS])
+    assert parts.fields == single.fields == ("source",) and parts.key_space == single.key_space
+    for filters in [(("source", ("a.txt",)),), (("source", ("b.txt", "c.txt")),), (("added_after", 1004),),
+                    (("added_before", 1008), ("source", ("a.txt", "c.txt")))]:
+        assert np.array_equal(parts.mask(filters), single.mask(filters))
+    assert np.flatnonzero(parts.mask((("source", ("a.txt",)),))).tolist() == [0, 3, 7, 10]
+
+
+def test_bm25_scores_match_hand_computation(tmp_path):
+    texts = ["refund the wallet fee", "refund refund", "wallet payout schedule for group members", ""]
+    index = BM25Index([write_lexical_part(tmp_path / "part.lexical.npz", 0, texts)])
+    # Three stored documents of 4, 2 and 6 terms; the empty text is a compacted hole.
+    assert (index.doc_count, index.avg_len) == (3, 4.0)
+
+    def score(tf, doc_len, doc_freq):
+        idf = math.log(1 + (3 - doc_freq + 0.5) / (doc_freq + 0.5))
+        return idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len / 4.0))
+
+    expected = {1: score(2, 2, 2), 0: score(1, 4, 2) + score(1, 4, 2), 2: score(1, 6, 2)}
+    found = index.search(tokenize("refund wallet"), 3)
+    assert [key for key, _ in found] == sorted(expected, key=expected.get, reverse=True)
+    np.testing.assert_allclose([value for _, value in found], sorted(expected.values(), reverse=True), rtol=1e-6)
+    # Repeated query terms count once; unknown terms add nothing.
+    assert index.search(tokenize("refund refund unknown"), 3) == index.search(["refund"], 3)
+    assert index.search(["unknown"], 3) == []
+
+
+@pytest.fixture(scope="module")
+def indexed(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("lexical")
+    write_kb(data_dir, "kb_a.txt", kb_lines(60, "alpha"))
+    run_indexing(data_dir)
+    return data_dir
+
+
+def test_rrf_merges_by_rank(indexed, make_retriever):
+    retriever = make_retriever(indexed, top_k=5)
+    snapshot = retriever._snapshot
+    documents = {key: snapshot.docstore.get(key) for key in range(5)}
+    dense = [{"key": key, "score": 0.9 - key / 10, "document": documents[key]} for key in (0, 1, 2)]
+    lexical = [(2, 12.0), (3, 8.0), (4, 1.0)]
+    fused = retriever._fuse(snapshot, dense, lexical)
+    # Only ranks count: 2 is 3rd and 1st, ahead of the dense leader. 1 and 3 are both 2nd once
+    # and keep the dense side's order.
+    assert [hit["key"] for hit in fused] == [2, 0, 1, 3, 4]
+    np.testing.assert_allclose([hit["score"] for hit in fused], [1 / (RRF_K + 3) + 1 / (RRF_K + 1), 1 / (RRF_K + 1),
+                                                                 1 / (RRF_K + 2), 1 / (RRF_K + 2), 1 / (RRF_K + 3)])
+    assert fused[3]["document"] == documents[3]
+
+
+def test_hybrid_search_fuses_dense_and_bm25(indexed, make_retriever):
+    retriever = make_retriever(indexed, top_k=5)
+    query = "how does the wallet payout work for refund receipts"
+    dense = retriever.search(query, "dense", top_k=retriever.candidates)
+    bm25 = retriever._snapshot.lexical.search(tokenize(query), retriever.candidates)
+    ranks = {}
+    for rank, key in enumerate([hit["key"] for hit in dense]):
+        ranks[key] = ranks.get(key, 0.0) + 1 / (RRF_K + rank + 1)
+    for rank, (key, _) in enumerate(bm25):
+        ranks[key] = ranks.get(key, 0.0) + 1 / (RRF_K + rank + 1)
+    hits = retriever.search(query, "hybrid")
+    np.testing.assert_allclose([hit["score"] for hit in hits], sorted(ranks.values(), reverse=True)[:5])
+    assert all(hit["score"] == pytest.approx(ranks[hit["key"]]) for hit in hits)
+
+
+def test_lexical_fast_path_falls_back_to_hybrid(indexed, make_retriever, monkeypatch):
+    retriever = make_retriever(indexed, top_k=5)
+    calls = []
+    real_encode = retriever.embedder.encode
+    monkeypatch.setattr(retriever.embedder, "encode", lambda texts: calls.append(texts) or real_encode(texts))
+
+    # Short queries BM25 can answer skip the encoder and return BM25 scores.
+    assert retriever.search("wallet payout", "hybrid") == retriever.search("wallet payout", "lexical")
+    assert calls == []
+
+    # Nothing matches: lexical returns nothing, hybrid falls back to the dense ranking.
+    assert retriever.search("zebra quokka", "lexical") == []
+    hits = retriever.search("zebra quokka", "hybrid")
+    assert len(calls) == 1 and len(hits) == 5
+    dense = retriever.search("zebra quokka", "dense")
+    assert [hit["key"] for hit in hits] == [hit["key"] for hit in dense]
+    assert [hit["score"] for hit in hits] == pytest.approx([1 / (RRF_K + rank + 1) for rank in range(5)])
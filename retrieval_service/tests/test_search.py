@@ -0,0 +1,37 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import pytest
+from fastapi.testclient import TestClient
+from conftest import kb_lines, run_indexing, write_kb
+
+QUERY = "how does the wallet payout work for refund receipts"
+
+
+@pytest.fixture(scope="module")
+def indexed(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("search")
+    write_kb(data_dir, "kb_a.txt", kb_lines(60, "alpha"))
+    run_indexing(data_dir)
+    return data_dir
+
+
+@pytest.mark.parametrize("mode", ["dense", "lexical", "hybrid"])
+def test_top_k_extends_results_up_to_candidates(indexed, make_retriever, mode):
+    retriever = make_retriever(indexed, top_k=3)
+    default = retriever.search(QUERY, mode)
+    more = retriever.search(QUERY, mode, top_k=8)
+    assert len(default) == 3 and len(more) == 8
+    # The extra hits extend the default ranking rather than reorder it.
+    assert [hit["key"] for hit in more[:3]] == [hit["key"] for hit in default]
+    assert len(retriever.search(QUERY, mode, top_k=1000)) == retriever.candidates
+
+
+def test_search_endpoint_top_k(indexed, make_retriever, monkeypatch):
+    import app
+    monkeypatch.setattr(app, "retriever", make_retriever(indexed, top_k=3))
+    client = TestClient(app.app)
+    response = client.get("/search/", params={"query": QUERY, "mode": "dense", "top_k": 6, "with_embeddings": True})
+    results = response.json()["results"]
+    assert response.status_code == 200 and len(results) == 6
+    assert all(len(hit["embedding"]) == 256 for hit in results)
+    assert client.get("/search/", params={"query": QUERY, "top_k": 0}).status_code == 422
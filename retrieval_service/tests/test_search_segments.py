@@ -0,0 +1,96 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import faiss
+import numpy as np
+import pytest
+from filters import search_parameters
+from segments import Segment, search_segments
+
+DIM = 32
+ROWS = 300
+K = 10
+
+
+def flat_segment(segment_id, vectors, keys):
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(DIM))
+    index.add_with_ids(vectors, keys)
+    return Segment(segment_id, index, {"index_type": "flat"})
+
+
+def ivf_segment(segment_id, vectors, keys):
+    ivf = faiss.IndexIVFFlat(faiss.IndexFlatIP(DIM), DIM, 8, faiss.METRIC_INNER_PRODUCT)
+    ivf.train(vectors)
+    # Every list probed, so the segment is exact and comparable to a flat index.
+    ivf.nprobe = ivf.nlist
+    index = faiss.IndexIDMap(ivf)
+    index.add_with_ids(vectors, keys)
+    return Segment(segment_id, index, {"index_type": "ivf"})
+
+
+def binary_segment(segment_id, vectors, keys):
+    index = faiss.IndexBinaryIDMap(faiss.IndexBinaryFlat(DIM))
+    index.add_with_ids(np.packbits(vectors > 0, axis=1), keys)
+    # Overfetching the whole segment makes the exact re-scoring see every candidate.
+    return Segment(segment_id, index, {"index_type": "flat", "build_params": {"compression": "binary"},
+                                       "search_params": {"rerank_overfetch": len(keys)}})
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((ROWS, DIM)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = rng.standard_normal((12, DIM)).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    keys = np.arange(ROWS, dtype="int64")
+    # A trained base and upload deltas over adjacent key ranges, as the indexing service seals them.
+    segments = [ivf_segment("s0", vectors[:150], keys[:150]), flat_segment("s1", vectors[150:210], keys[150:210]),
+                binary_segment("s2", vectors[210:250], keys[210:250]), flat_segment("s3", vectors[250:], keys[250:])]
+    single = flat_segment("all", vectors, keys)
+    return vectors, queries, keys, segments, single
+
+
+def masks():
+    rng = np.random.default_rng(11)
+    keys = np.arange(ROWS)
+    dead = rng.random(ROWS) < 0.3
+    source = keys % 3 == 0
+    return {"filter": source, "tombstones": ~dead, "filter and tombstones": source & ~dead,
+            "few rows": np.isin(keys, [4, 160, 215, 290])}
+
+
+def single_index_top_k(single, queries, mask=None):
+    if mask is None:
+        return single.index.search(queries, K)
+    bitmap = np.packbits(mask, bitorder="little")
+    return single.index.search(queries, K, params=search_parameters(single.index, bitmap))
+
+
+def assert_same_top_k(found, expected, vectors, queries, mask):
+    scores, ids = found
+    expected_scores, expected_ids = expected
+    admitted = np.flatnonzero(mask) if mask is not None else np.arange(ROWS)
+    exact = queries @ vectors[admitted].T
+    for row in range(len(queries)):
+        count = min(K, len(admitted))
+        assert np.array_equal(ids[row, :count], expected_ids[row, :count])
+        assert set(ids[row, :count]) <= set(admitted)
+        np.testing.assert_allclose(scores[row, :count], expected_scores[row, :count], rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(scores[row, :count], np.sort(exact[row])[::-1][:count], rtol=1e-5, atol=1e-6)
+        # Short of k admitted rows, the rest of the row is empty.
+        assert (ids[row, count:] == -1).all()
+
+
+def test_search_segments_matches_single_index(corpus):
+    vectors, queries, keys, segments, single = corpus
+    found = search_segments(segments, queries, K, vectors, keys)
+    assert_same_top_k(found, single_index_top_k(single, queries), vectors, queries, None)
+
+
+@pytest.mark.parametrize("name", list(masks()))
+def test_search_segments_with_bitmap_matches_single_index(corpus, name):
+    vectors, queries, keys, segments, single = corpus
+    mask = masks()[name]
+    bitmap = np.packbits(mask, bitorder="little")
+    found = search_segments(segments, queries, K, vectors, keys, bitmap, mask.mean())
+    assert_same_top_k(found, single_index_top_k(single, queries, mask), vectors, queries, mask)
@@ -0,0 +1,65 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import pytest
+from fastapi.testclient import TestClient
+from conftest import assert_exact_top_k, exact_scores, kb_lines, run_indexing, shard_servers, write_kb
+
+QUERIES = ["how does the wallet payout work", "group admin approval", "refund receipt ledger",
+           "subscription password invite", "bonus fee for cashier members", "settle transfer step 7"]
+
+
+@pytest.fixture(scope="module")
+def sharded_data(tmp_path_factory):
+    # One docstore indexed both whole (the main index) and as 2 shards, as the indexing service writes it.
+    data_dir = tmp_path_factory.mktemp("sharded")
+    write_kb(data_dir, "kb_a.txt", kb_lines(40, "alpha"))
+    write_kb(data_dir, "kb_b.txt", kb_lines(40, "beta"))
+    run_indexing(data_dir, shards=2)
+    return data_dir
+
+
+def test_remote_shards_merge_to_unsharded_top_k(sharded_data, make_retriever):
+    unsharded = make_retriever(sharded_data)
+    with shard_servers(sharded_data, 2) as (_, endpoints):
+        sharded = make_retriever(sharded_data, shards=2, endpoints=endpoints, min_fraction=1.0)
+        for query in QUERIES:
+            for sources in (None, ["kb_b.txt"]):
+                filters = {"source": sources} if sources else None
+                exact = exact_scores(sharded_data, query, sources)
+                hits = sharded.search(query, "dense", filters)
+                expected = unsharded.search(query, "dense", filters)
+                assert len(hits) == 5
+                assert_exact_top_k(hits, exact, 5)
+                assert_exact_top_k(expected, exact, 5)
+                # Keys must agree wherever the rank is not decided by a tie.
+                scores = [round(score, 5) for score in exact.values()]
+                for hit, other in zip(hits, expected):
+                    if scores.count(round(other["score"], 5)) == 1:
+                        assert hit["key"] == other["key"], (query, filters)
+        stats = sharded.shard_stats()
+        assert [shard["kind"] for shard in stats["shards"]] == ["remote", "remote"]
+        assert stats["partial_results"] == 0 and stats["failed_searches"] == 0
+
+
+def test_search_returns_503_below_min_fraction(sharded_data, make_retriever, monkeypatch):
+    import app
+    with shard_servers(sharded_data, 2) as (processes, endpoints):
+        strict = make_retriever(sharded_data, shards=2, endpoints=endpoints, min_fraction=1.0)
+        lenient = make_retriever(sharded_data, shards=2, endpoints=endpoints, min_fraction=0.5)
+        processes[1].terminate()
+        processes[1].wait(timeout=10)
+        client = TestClient(app.app)
+
+        monkeypatch.setattr(app, "retriever", strict)
+        response = client.get("/search/", params={"query": QUERIES[0], "mode": "dense"})
+        assert response.status_code == 503
+        assert "Only 1 of 2 shards answered" in response.json()["detail"]
+        assert strict.shard_stats()["failed_searches"] == 1
+
+        # Half the shards still meets SHARD_MIN_FRACTION = 0.5: a partial answer from shard 0 only.
+        monkeypatch.setattr(app, "retriever", lenient)
+        response = client.get("/search/", params={"query": QUERIES[0], "mode": "dense"})
+        assert response.status_code == 200
+        keys = [hit["key"] for hit in response.json()["results"]]
+        assert keys and all(key % 2 == 0 for key in keys)
+        assert lenient.shard_stats()["partial_results"] == 1
@@ -0,0 +1,74 @@
+# © 2025 Kittycash Team. All rights reserved to Trustnet Systems LLP.
+
+import pytest
+from conftest import assert_exact_top_k, exact_scores, kb_lines, run_indexing, write_kb
+from docstore import DocStoreReader
+
+MODES = ("dense", "lexical", "hybrid")
+
+
+@pytest.fixture
+def indexed(tmp_path):
+    write_kb(tmp_path, "kb_a.txt", kb_lines(40, "alpha"))
+    write_kb(tmp_path, "kb_b.txt", kb_lines(40, "beta"))
+    run_indexing(tmp_path)
+    return tmp_path
+
+
+def doc_text(data_dir, key):
+    return DocStoreReader(str(data_dir / "docstore.jsonl")).get(key)["text"]
+
+
+def hit_keys(retriever, query, filters=None):
+    return {mode: [hit["key"] for hit in retriever.search(query, mode, filters)] for mode in MODES}
+
+
+def test_delete_hides_key_without_a_new_version(indexed, make_retriever):
+    retriever = make_retriever(indexed)
+    query = doc_text(indexed, 7)
+    assert all(keys[0] == 7 for keys in hit_keys(retriever, query).values())
+    before = retriever.content_version
+
+    [response] = run_indexing(indexed, requests=[("POST", "/index/delete", {"keys": [7, 45]})])
+    assert response["body"]["deleted"] == [7, 45]
+    # Deletes only append tombstones: the loaded version stays, its content_version moves on.
+    assert all(7 not in keys for keys in hit_keys(retriever, query).values())
+    assert all(45 not in keys for keys in hit_keys(retriever, doc_text(indexed, 45), {"source": ["kb_b.txt"]}).values())
+    assert retriever.version == before and retriever.content_version == f"{before}-2d"
+    assert_exact_top_k(retriever.search(query, "dense"), exact_scores(indexed, query), 5)
+
+
+def test_update_swaps_keys_across_versions(indexed, make_retriever):
+    retriever = make_retriever(indexed)
+    before = retriever.content_version
+    text = "How do cashier refunds settle? | Cashier refunds settle into the wallet ledger overnight."
+    [response] = run_indexing(indexed, requests=[("POST", "/index/update", {"key": 3, "text": text})])
+    new_key = response["body"]["new_key"]
+
+    # Until the new version loads, the old key is already gone and the new one not yet served.
+    assert all(3 not in keys and new_key not in keys for keys in hit_keys(retriever, text).values())
+    stale = retriever.content_version
+    assert stale == f"{before}-1d"
+
+    retriever.load_index()
+    assert retriever.content_version not in (before, stale)
+    assert all(keys[0] == new_key and 3 not in keys for keys in hit_keys(retriever, text).values())
+    assert retriever.search(text, "dense")[0]["document"]["replaces"] == 3
+
+
+def test_compaction_keeps_deleted_keys_hidden(indexed, make_retriever):
+    retriever = make_retriever(indexed)
+    deleted = list(range(0, 60, 2))
+    query = doc_text(indexed, 10)
+    run_indexing(indexed, requests=[("POST", "/index/delete", {"keys": deleted}),
+                                    ("POST", "/index/compact", None)])
+    compacted = retriever.content_version
+
+    retriever.load_index()
+    # Compaction writes a version without the deleted rows, so none are left to count.
+    assert retriever.version != compacted.split("-")[0]
+    assert retriever.content_version == retriever.version
+    for keys in hit_keys(retriever, query).values():
+        assert keys and not set(keys) & set(deleted)
+    assert len(DocStoreReader(str(indexed / "docstore.jsonl"))) == 80 - len(deleted)
+    assert_exact_top_k(retriever.search(query, "dense"), exact_scores(indexed, query), 5)